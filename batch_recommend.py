@@ -0,0 +1,263 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This is the offline batch recommendation job of the Netflix Movie Recommendation System. It computes the
+recommendations of every customer in a seed file at once, for example nightly.
+
+The graph is converted once into the flat arrays of the recommender, which are copied into shared
+memory with shared_arrays.SharedArrays, so every worker process of the pool runs the search of the
+recommender on the same copy instead of unpickling its own graph. The seed file is read in blocks of
+customers, each block is answered by a worker, and the results are written to the output file in the
+order of the seed file as soon as they are ready, with only a few blocks in flight at once.
+
+The seed file is a CSV file with no header, where each row is <custID, title, title, ...>: a customer
+and the titles of the movies their recommendations are based on. The output file has the same format,
+with the recommended titles from best to worst. Titles that are not in the graph are ignored.
+
+Usage:
+    python batch_recommend.py data/seeds.csv data/recommendations.csv --seeds-from-ratings --limit 10
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from collections import deque
+from multiprocessing import Pool
+from typing import Callable, Iterator
+import numpy as np
+import clustering
+import graph_cache
+import load_graph
+import movie_class
+import ratings_store
+import recommender
+from shared_arrays import SHARED_ARRAYS, SharedArrays, attach_shared_arrays
+
+
+def recommendation_arrays(graph: movie_class.Network, method: str) -> dict[str, np.ndarray]:
+    """Return the arrays needed by recommend_block to answer queries on graph (a Network or CompactNetwork)
+    with the given method, 'index' or 'pagerank': recommender.index_arrays or recommender.pagerank_arrays.
+
+    Raise a ValueError if method is not 'index' or 'pagerank'.
+    """
+    if method not in recommender.RECOMMENDATION_ARRAYS:
+        raise ValueError
+    return recommender.RECOMMENDATION_ARRAYS[method](graph)
+
+
+def recommend_block(task: tuple[str, int, list[tuple[str, list[int]]]]) -> list[tuple[str, list[int]]]:
+    """Return the (customer, recommended movie ids) of each (customer, seed movie ids) of a block, for a
+    (method, limit, block) task.
+
+    This is run by the worker processes, after attach_shared_arrays has attached them to the arrays
+    returned by recommendation_arrays for method, which are searched with recommender.SEARCHES[method].
+    A customer with no seeds gets no recommendations.
+    """
+    method, limit, block = task
+    search = recommender.SEARCHES[method]
+    return [(customer, search(SHARED_ARRAYS, seeds, limit) if seeds else []) for customer, seeds in block]
+
+
+def read_seed_blocks(seeds_file_path: str, title_indices: dict[str, int],
+                     block_size: int) -> Iterator[tuple[list[tuple[str, list[int]]], int]]:
+    """Read the seed file in blocks of at most block_size customers, and yield each block as a list of
+    (customer, seed movie ids), along with the number of titles of the block that are not in title_indices."""
+    with open(seeds_file_path, 'r', newline='') as seeds_file:
+        block, unknown = [], 0
+        for row in csv.reader(seeds_file):
+            if not row:
+                continue
+            seeds = [title_indices[title] for title in row[1:] if title in title_indices]
+            unknown += len(row) - 1 - len(seeds)
+            block.append((row[0], list(dict.fromkeys(seeds))))
+            if len(block) == block_size:
+                yield block, unknown
+                block, unknown = [], 0
+
+        if block:
+            yield block, unknown
+
+
+def run_batch(graph: movie_class.Network, seeds_file_path: str, output_file_path: str, limit: int = 10,
+              method: str = 'index', processes: int | None = None, block_size: int = 256,
+              report_interval: float = 10.0, report_progress: Callable[[str], None] | None = None) -> dict[str, float]:
+    """Write the limit best recommendations of every customer in the seed file to the output file, using
+    the recommender with the given method ('index' or 'pagerank') on a pool of processes, and return the
+    number of customers, recommendations and unknown titles, the seconds taken and the throughput.
+
+    If report_progress is not None, it is called with the number of customers done and the throughput
+    so far every report_interval seconds, and once more at the end.
+
+    Raise a ValueError if method is not 'index' or 'pagerank'.
+    """
+    titles = list(graph.get_movies())
+    title_indices = {title: i for i, title in enumerate(titles)}
+    arrays = SharedArrays(recommendation_arrays(graph, method))
+    processes = processes or os.cpu_count() or 1
+    report = report_progress if report_progress is not None else (lambda message: None)
+    totals = {'customers': 0, 'recommendations': 0, 'unknown_titles': 0}
+    start = last_report = time.perf_counter()
+
+    try:
+        with Pool(processes, initializer=attach_shared_arrays, initargs=(arrays.specs,)) as pool, \
+                open(output_file_path, 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            pending = deque()
+            blocks = read_seed_blocks(seeds_file_path, title_indices, block_size)
+
+            for block, unknown in blocks:
+                totals['unknown_titles'] += unknown
+                pending.append(pool.apply_async(recommend_block, ((method, limit, block),)))
+                # Keep a few blocks per process in flight, so the seed file is never read far ahead of the output
+                while pending and (len(pending) > processes * 2 or pending[0].ready()):
+                    write_results(writer, pending.popleft().get(), titles, totals)
+
+                if time.perf_counter() - last_report >= report_interval:
+                    report(throughput_line(totals, time.perf_counter() - start))
+                    last_report = time.perf_counter()
+
+            while pending:
+                write_results(writer, pending.popleft().get(), titles, totals)
+    finally:
+        arrays.close()
+
+    seconds = time.perf_counter() - start
+    report(throughput_line(totals, seconds))
+    return {**totals, 'seconds': seconds, 'customers_per_second': totals['customers'] / seconds if seconds else 0.0}
+
+
+def write_results(writer: csv.writer, results: list[tuple[str, list[int]]], titles: list[str],
+                  totals: dict[str, int]) -> None:
+    """Write the (customer, recommended movie ids) results of a block as rows of titles, and add them to
+    the totals."""
+    writer.writerows([customer, *(titles[index] for index in recommendations)] for customer, recommendations in results)
+    totals['customers'] += len(results)
+    totals['recommendations'] += sum(len(recommendations) for _, recommendations in results)
+
+
+def throughput_line(totals: dict[str, int], seconds: float) -> str:
+    """Return a description of the progress of a batch after the given number of seconds."""
+    rate = totals['customers'] / seconds if seconds else 0.0
+    return f"{totals['customers']} customers, {totals['recommendations']} recommendations in {seconds:.1f}s " \
+           f"({rate:.0f} customers/s)"
+
+
+def write_seed_file(reviews_file_path: str, movies_file_path: str, seeds_file_path: str, movie_limit: int = 1000,
+                    rating_limit: int | None = 1000000, max_seeds: int = 5, min_rating: int = 4) -> int:
+    """Write a seed file with every customer in the reviews file who gave at least one of the first
+    movie_limit movies a rating of at least min_rating, with the titles of up to max_seeds of their highest
+    rated movies as seeds, and return the number of customers written.
+
+    The ratings are counted towards rating_limit like in load_graph.load_movie_graph. reviews_file_path may
+    also be the directory of a ratings store, whose ratings are grouped by customer, so the seeds of each
+    customer are written as soon as they are read, in the order of the store.
+    """
+    movies_dict = load_graph.read_movies(movies_file_path, movie_limit)
+    if ratings_store.is_store(reviews_file_path):
+        seeds = store_seeds(reviews_file_path, movies_dict, rating_limit, max_seeds, min_rating)
+    else:
+        seeds = file_seeds(reviews_file_path, movies_dict, rating_limit, max_seeds, min_rating)
+
+    with open(seeds_file_path, 'w', newline='') as seeds_file:
+        writer = csv.writer(seeds_file)
+        customers = 0
+        for customer, titles in seeds:
+            writer.writerow([customer, *titles])
+            customers += 1
+
+    return customers
+
+
+def file_seeds(reviews_file_path: str, movies_dict: dict[int, str], rating_limit: int | None, max_seeds: int,
+               min_rating: int) -> Iterator[tuple[str, list[str]]]:
+    """Yield the (customer, seed titles) of write_seed_file from a reviews CSV file, in the order each
+    customer first gave a rating of at least min_rating.
+
+    The ratings of a customer can be anywhere in the file, so the file is read to the end first, but only
+    the max_seeds highest ratings of each customer are kept, rather than all of their ratings. Equal ratings
+    are kept in the order of the file.
+    """
+    best = {}
+    with open(reviews_file_path, 'r') as reviews_file:
+        counter = 0
+        for customer, rating, _, movie in csv.reader(reviews_file):
+            if int(movie) in movies_dict:
+                if int(rating) >= min_rating:
+                    ratings = best.setdefault(customer, [])
+                    position = next((i for i, (_, other) in enumerate(ratings) if other < int(rating)), len(ratings))
+                    if position < max_seeds:
+                        ratings.insert(position, (movies_dict[int(movie)], int(rating)))
+                        del ratings[max_seeds:]
+                counter += 1
+
+                if counter == rating_limit:
+                    break
+
+    for customer, ratings in best.items():
+        yield customer, list(dict.fromkeys(title for title, _ in ratings))
+
+
+def store_seeds(store_directory: str, movies_dict: dict[int, str], rating_limit: int | None, max_seeds: int,
+                min_rating: int) -> Iterator[tuple[str, list[str]]]:
+    """Yield the (customer, seed titles) of write_seed_file from a ratings store, one customer at a time, with
+    the same seeds as from the CSV file the store was converted from."""
+    store = ratings_store.RatingsStore(store_directory)
+    titles = list(movies_dict.values())
+    lookup = ratings_store.movie_lookup({movie_id: i for i, movie_id in enumerate(movies_dict)})
+    last_row = store.row_limit(lookup, rating_limit)
+
+    for user in range(len(store.users)):
+        first, last = int(store.offsets[user]), int(store.offsets[user + 1])
+        movies = ratings_store.movie_lookup_values(lookup, store.movies[first:last])
+        ratings, rows = store.ratings[first:last].astype(np.int64), store.rows[first:last]
+        keep = (movies >= 0) & (ratings >= min_rating)
+        if last_row is not None:
+            keep &= rows <= last_row
+
+        if keep.any():
+            order = np.lexsort((rows[keep], -ratings[keep]))[:max_seeds]
+            yield str(store.users[user]), list(dict.fromkeys(titles[i] for i in movies[keep][order].tolist()))
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        # the names (strs) of imported modules
+        'extra-imports': ['argparse', 'csv', 'json', 'os', 'time', 'collections', 'multiprocessing', 'typing',
+                          'numpy', 'clustering', 'graph_cache', 'load_graph', 'movie_class', 'ratings_store',
+                          'recommender', 'shared_arrays'],
+        # the names (strs) of functions that call print/open/input
+        'allowed-io': ['read_seed_blocks', 'run_batch', 'write_seed_file', 'file_seeds'],
+        'max-line-length': 120
+    })
+
+    parser = argparse.ArgumentParser(description='Compute the recommendations of every customer in a seed file.')
+    parser.add_argument('seeds', help='the seed file, with rows of the format <custID, title, title, ...>')
+    parser.add_argument('output', help='the file to write the recommendations to')
+    parser.add_argument('--seeds-from-ratings', action='store_true',
+                        help='first write the seed file from the highest rated movies of every customer')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--recommender', choices=['index', 'pagerank'], default='index')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--block-size', type=int, default=256)
+    parser.add_argument('--report-interval', type=float, default=10.0)
+    parser.add_argument('--reviews', default='data/shuffled_user_ratings.csv')
+    parser.add_argument('--movies', default='data/movies.csv')
+    parser.add_argument('--cache', default='data/cache/graph')
+    parser.add_argument('--movie-limit', type=int, default=1000)
+    parser.add_argument('--rating-limit', type=int, default=1000000)
+    parser.add_argument('--method', choices=list(clustering.CLUSTERING_METHODS), default='louvain')
+    parser.add_argument('--options', type=json.loads, help='the clustering options, as a JSON object')
+    args = parser.parse_args()
+
+    if args.seeds_from_ratings:
+        num_customers = write_seed_file(args.reviews, args.movies, args.seeds, args.movie_limit, args.rating_limit)
+        print(f"Wrote the seeds of {num_customers} customers")
+
+    if args.options is None:
+        args.options = {'epochs': 3} if args.method == 'louvain' else {}
+    parameters = {'movie_limit': args.movie_limit, 'rating_limit': args.rating_limit, 'method': args.method,
+                  'options': args.options}
+    movie_graph = graph_cache.load_or_build_graph(args.cache, args.reviews, args.movies, parameters, print)
+    run_batch(movie_graph, args.seeds, args.output, args.limit, args.recommender, args.processes, args.block_size,
+              args.report_interval, print)
@@ -0,0 +1,373 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This is the benchmark suite of the Netflix Movie Recommendation System. It generates deterministic
+synthetic datasets shaped like the Netflix Prize data and times each stage of the system on them:
+loading the graph, clustering it (also with the parallel Louvain's algorithm on several processes),
+recommending movies and searching titles.
+
+For every stage, the suite reports the throughput, the latency percentiles of single operations where
+they apply and, with --memory, the peak memory allocated. Results can be saved as a JSON baseline and
+later runs compared against it, so that performance regressions are caught. No baseline is kept in the
+repository, since timings depend on the machine: the first run with --compare records its results as the
+baseline, and every later run on the same machine is compared with it.
+
+Example:
+    python benchmark.py --tier small --save baseline_small.json
+    python benchmark.py --tier small --compare baseline_small.json
+    python benchmark.py --tier small --memory
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+import numpy as np
+import clustering
+import graph_cache
+import load_graph
+from metrics import percentile
+from recommender import RecommendationIndex
+from search import TitleIndex
+
+# The (number of movies, number of users, number of ratings) of each dataset size
+SIZE_TIERS = {
+    'tiny': (200, 2000, 50000),
+    'small': (1000, 20000, 500000),
+    'medium': (4000, 100000, 5000000),
+    'large': (17770, 480189, 100000000)
+}
+STAGES = ['load', 'cluster', 'cluster_parallel', 'recommend', 'recommend_index', 'search']
+BENCHMARK_DIRECTORY = 'data/benchmark'
+
+TITLE_WORDS = ['The', 'Last', 'Night', 'City', 'Love', 'War', 'Dark', 'Star', 'Man', 'Girl', 'Story', 'Blue',
+               'House', 'Dead', 'Return', 'King', 'Lost', 'World', 'Secret', 'Summer', 'Road', 'Fire', 'Life',
+               'American', 'Great', 'Little', 'Wild', 'Money', 'Dream', 'Ghost', 'Island', 'River', 'Señor']
+RATING_PROBABILITIES = [0.05, 0.1, 0.29, 0.34, 0.22]
+
+
+def power_law_weights(n: int, exponent: float, generator: np.random.Generator) -> np.ndarray:
+    """Return n probabilities proportional to rank ** -exponent, in a random order."""
+    weights = np.arange(1, n + 1, dtype=np.float64) ** -exponent
+    generator.shuffle(weights)
+    return weights / weights.sum()
+
+
+def generate_dataset(directory: str, num_movies: int, num_users: int, num_ratings: int, seed: int = 0,
+                     user_exponent: float = 0.8, movie_exponent: float = 1.0, users_per_chunk: int = 20000) -> None:
+    """Write a synthetic movies.csv and ratings.csv to directory, in the formats read by load_graph.
+
+    Both the number of ratings of each user and the popularity of each movie follow power laws, as in the
+    Netflix Prize data. There are exactly num_ratings ratings, every user rates between 1 and num_movies
+    movies, and each movie at most once. The same arguments always produce the same files. The ratings
+    are written users_per_chunk users at a time, shuffled within each chunk, so the dataset never has to
+    fit in memory.
+
+    Raise a ValueError if num_ratings is less than num_users or more than num_users * num_movies.
+    """
+    if not num_users <= num_ratings <= num_users * num_movies:
+        raise ValueError
+
+    generator = np.random.default_rng(seed)
+    word_generator = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, 'movies.csv'), 'w', encoding='utf-8') as movies_file:
+        movies_file.write('movieId,releaseYear,title\n')
+        for movie_id in range(1, num_movies + 1):
+            title = ' '.join(word_generator.choices(TITLE_WORDS, k=word_generator.randint(1, 4)))
+            movies_file.write(f'{movie_id},{word_generator.randint(1920, 2005)},"{title} {movie_id}"\n')
+
+    movie_probabilities = power_law_weights(num_movies, movie_exponent, generator)
+    degrees = user_degrees(num_movies, num_users, num_ratings, user_exponent, generator)
+    user_ids = generator.permutation(np.arange(1, 3 * num_users + 1))[:num_users]
+    first_day = np.datetime64('1999-11-11')
+
+    with open(os.path.join(directory, 'ratings.csv'), 'w', encoding='utf-8') as ratings_file:
+        for start in range(0, num_users, users_per_chunk):
+            keys = rated_movies(degrees[start:start + users_per_chunk], movie_probabilities, generator)
+            keys = keys[generator.permutation(len(keys))]
+            users = user_ids[start:start + users_per_chunk][keys // num_movies]
+            ratings = generator.choice(np.arange(1, 6), size=len(keys), p=RATING_PROBABILITIES)
+            dates = (first_day + generator.integers(0, 2240, size=len(keys))).astype(str)
+
+            ratings_file.writelines(f'{user},{rating},{date},{movie + 1}\n' for user, movie, rating, date in
+                                    zip(users.tolist(), (keys % num_movies).tolist(),
+                                        ratings.tolist(), dates.tolist()))
+
+
+def user_degrees(num_movies: int, num_users: int, num_ratings: int, exponent: float,
+                 generator: np.random.Generator) -> np.ndarray:
+    """Return the number of ratings of each user, following a power law with the given exponent, so that
+    every user has between 1 and num_movies ratings and there are num_ratings ratings in total.
+
+    Preconditions:
+        - num_users <= num_ratings <= num_users * num_movies
+    """
+    probabilities = power_law_weights(num_users, exponent, generator)
+    degrees = 1 + generator.multinomial(num_ratings - num_users, probabilities)
+    excess = int(np.maximum(degrees - num_movies, 0).sum())
+    while excess > 0:
+        # The ratings above num_movies are given to the other users, in proportion to their weight
+        degrees = np.minimum(degrees, num_movies)
+        room = degrees < num_movies
+        degrees[room] += generator.multinomial(excess, probabilities[room] / probabilities[room].sum())
+        excess = int(np.maximum(degrees - num_movies, 0).sum())
+    return degrees
+
+
+def rated_movies(degrees: np.ndarray, movie_probabilities: np.ndarray, generator: np.random.Generator,
+                 rounds: int = 8) -> np.ndarray:
+    """Return the sorted keys user * num_movies + movie of the movies rated by each user, where user is the
+    position of the user in degrees, so that user rates exactly degrees[user] distinct movies.
+
+    Movies are drawn with the given probabilities, and each user draws again the movies they already
+    rated, for the given number of rounds. The few users still short of movies after that, who rate most
+    of the movies, are given movies they have not rated uniformly at random.
+    """
+    num_movies = len(movie_probabilities)
+    users = np.arange(len(degrees))
+    keys = np.empty(0, dtype=np.int64)
+    missing = degrees
+    for _ in range(rounds):
+        if not missing.any():
+            return keys
+        rows = np.repeat(users, missing)
+        movies = generator.choice(num_movies, size=len(rows), p=movie_probabilities)
+        keys = np.union1d(keys, rows * num_movies + movies)
+        missing = degrees - np.bincount(keys // num_movies, minlength=len(degrees))
+
+    extra = [user * num_movies + generator.choice(np.setdiff1d(np.arange(num_movies),
+                                                               keys[keys // num_movies == user] % num_movies),
+                                                  size=missing[user], replace=False)
+             for user in np.flatnonzero(missing)]
+    return np.sort(np.concatenate([keys, *extra]))
+
+
+def prepare_dataset(tier: str, directory: str = BENCHMARK_DIRECTORY, seed: int = 0) -> tuple[str, str]:
+    """Return the (ratings file, movies file) paths of the dataset of the given size tier, generating it
+    first if it does not exist yet."""
+    tier_directory = os.path.join(directory, f'{tier}_{seed}')
+    reviews, movies = os.path.join(tier_directory, 'ratings.csv'), os.path.join(tier_directory, 'movies.csv')
+    if not (os.path.exists(reviews) and os.path.exists(movies)):
+        num_movies, num_users, num_ratings = SIZE_TIERS[tier]
+        generate_dataset(tier_directory + '.tmp', num_movies, num_users, num_ratings, seed)
+        os.replace(tier_directory + '.tmp', tier_directory)
+    return reviews, movies
+
+
+def count_lines(file_path: str) -> int:
+    """Return the number of lines in the given file."""
+    with open(file_path, 'rb') as file:
+        return sum(chunk.count(b'\n') for chunk in iter(lambda: file.read(1 << 20), b''))
+
+
+def measure(function: Callable, *args: Any, track_memory: bool = False) -> tuple[Any, float, float]:
+    """Return the return value of function(*args), the number of seconds it took and the peak number of
+    megabytes allocated while it ran, or 0.0 if track_memory is False.
+
+    Tracing allocations slows Python code down, so when track_memory is True the function is run a
+    second time under tracemalloc, and only the first run is timed. This doubles the time taken, which
+    is why memory is only measured on request.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+
+    peak_mb = 0.0
+    if track_memory:
+        tracemalloc.start()
+        function(*args)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result, seconds, peak_mb
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float]:
+    """Return the p50, p90 and p99 of the given latencies in seconds, in milliseconds."""
+    values = sorted(latency * 1000 for latency in latencies)
+    return {'p50_ms': percentile(values, 50), 'p90_ms': percentile(values, 90), 'p99_ms': percentile(values, 99)}
+
+
+def time_operations(operation: Callable[[Any], Any], inputs: list) -> tuple[float, list[float]]:
+    """Return the total number of seconds taken by operation(value) for every value in inputs,
+    and the latency of each call."""
+    latencies = []
+    for value in inputs:
+        start = time.perf_counter()
+        operation(value)
+        latencies.append(time.perf_counter() - start)
+    return sum(latencies), latencies
+
+
+def run_benchmarks(reviews_file_path: str, movies_file_path: str, stages: list[str] | None = None,
+                   num_queries: int = 1000, seed: int = 0, track_memory: bool = False,
+                   report_progress: Callable[[str], None] | None = None, method: str = 'louvain',
+                   options: dict | None = None, processes: int | None = None) -> dict[str, dict[str, float]]:
+    """Run the given stages (or every stage) on the given dataset and return the results of each stage.
+    The graph is clustered with clustering.cluster(graph, method, **options), where options defaults to
+    three epochs for louvain.
+
+    The cluster_parallel stage times the parallel Louvain's algorithm on the given number of processes
+    (by default, every CPU but at least two), and also contains its speedup over a single process.
+
+    The results of a stage always contain its number of seconds, its throughput and the unit of the
+    throughput, and its peak memory in megabytes, which is 0.0 unless track_memory is True, since
+    measuring it runs each stage a second time. The recommend and search stages also contain the
+    latency percentiles of a single recommendation or keystroke. The graph is always built, since every
+    other stage needs it, but it is only reported when 'load' is one of the stages.
+    """
+    stages = stages if stages is not None else STAGES
+    if options is None:
+        options = {'epochs': 3} if method == 'louvain' else {}
+    report = report_progress if report_progress is not None else (lambda message: None)
+    picker = random.Random(seed)
+    results = {}
+
+    report('load')
+    num_ratings, num_movies = count_lines(reviews_file_path), count_lines(movies_file_path) - 1
+    graph, seconds, peak_mb = measure(load_graph.load_movie_graph, reviews_file_path, movies_file_path, num_movies,
+                                      None, track_memory=track_memory and 'load' in stages)
+    num_edges = sum(movie.degree() for movie in graph.get_movies().values()) // 2
+    if 'load' in stages:
+        results['load'] = {'seconds': seconds, 'throughput': num_ratings / seconds, 'unit': 'ratings/s',
+                           'peak_mb': peak_mb, 'edges': num_edges}
+
+    unclustered = graph_cache.network_to_arrays(graph)
+    clustering.cluster(graph, method, **options)
+    if 'cluster' in stages:
+        report('cluster')
+        _, seconds, peak_mb = measure(lambda: clustering.cluster(graph_cache.arrays_to_network(unclustered),
+                                                                 method, **options), track_memory=track_memory)
+        results['cluster'] = {'seconds': seconds, 'throughput': num_edges / seconds, 'unit': 'edges/s',
+                              'peak_mb': peak_mb, 'communities': len(graph.get_communities())}
+
+    if 'cluster_parallel' in stages:
+        report('cluster_parallel')
+        processes = processes if processes is not None else max(os.cpu_count() or 1, 2)
+        _, serial_seconds, _ = measure(lambda: clustering.cluster(graph_cache.arrays_to_network(unclustered),
+                                                                  'parallel', processes=1))
+        _, seconds, peak_mb = measure(lambda: clustering.cluster(graph_cache.arrays_to_network(unclustered),
+                                                                 'parallel', processes=processes),
+                                      track_memory=track_memory)
+        results['cluster_parallel'] = {'seconds': seconds, 'throughput': num_edges / seconds, 'unit': 'edges/s',
+                                       'peak_mb': peak_mb, 'processes': processes,
+                                       'speedup': serial_seconds / seconds}
+
+    titles = list(graph.get_movies())
+    queries = [picker.sample(titles, picker.randint(1, 3)) for _ in range(num_queries)]
+    recommenders = {'recommend': lambda: graph.get_best_movies,
+                    'recommend_index': lambda: RecommendationIndex(graph).get_best_movies}
+    for stage, make_recommender in recommenders.items():
+        if stage in stages:
+            report(stage)
+            get_best_movies, build_seconds, _ = measure(make_recommender, track_memory=False)
+            _, _, peak_mb = measure(time_operations, lambda query: get_best_movies(query, 5), queries[:100],
+                                    track_memory=track_memory)
+            seconds, latencies = time_operations(lambda query: get_best_movies(query, 5), queries)
+            results[stage] = {'seconds': seconds, 'throughput': num_queries / seconds, 'unit': 'queries/s',
+                              'peak_mb': peak_mb, 'build_seconds': build_seconds, **latency_summary(latencies)}
+
+    if 'search' in stages:
+        report('search')
+        title_index, build_seconds, peak_mb = measure(TitleIndex, titles, track_memory=track_memory)
+        keystrokes = [typed[:length] for typed in picker.sample(titles, min(num_queries // 10, len(titles)) or 1)
+                      for length in range(1, len(typed) + 1)]
+        seconds, latencies = time_operations(title_index.search, keystrokes)
+        results['search'] = {'seconds': seconds, 'throughput': len(keystrokes) / seconds, 'unit': 'keystrokes/s',
+                             'peak_mb': peak_mb, 'build_seconds': build_seconds, **latency_summary(latencies)}
+
+    return results
+
+
+def compare_results(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]],
+                    tolerance: float = 0.25) -> list[str]:
+    """Return a description of every regression of results with respect to baseline.
+
+    A stage regresses when its throughput drops, or its latency percentiles or peak memory grow, by more
+    than the given fraction of the baseline. Stages missing from either side are not compared.
+    """
+    regressions = []
+    for stage in results.keys() & baseline.keys():
+        new, old = results[stage], baseline[stage]
+        if new['throughput'] < old['throughput'] * (1 - tolerance):
+            regressions.append(f"{stage}: throughput dropped from {old['throughput']:.1f} to "
+                               f"{new['throughput']:.1f} {new['unit']}")
+
+        for key in ('p50_ms', 'p90_ms', 'p99_ms', 'peak_mb'):
+            if key in new and key in old and old[key] > 0 and new[key] > old[key] * (1 + tolerance):
+                regressions.append(f'{stage}: {key} grew from {old[key]:.3f} to {new[key]:.3f}')
+    return sorted(regressions)
+
+
+def format_results(results: dict[str, dict[str, float]]) -> str:
+    """Return the given results as a table with one row per stage."""
+    lines = [f"{'stage':<16}{'seconds':>10}{'throughput':>16}  {'unit':<14}{'p50 ms':>10}{'p99 ms':>10}"
+             f"{'peak MB':>10}"]
+    for stage, result in results.items():
+        lines.append(f"{stage:<16}{result['seconds']:>10.3f}{result['throughput']:>16.1f}  {result['unit']:<14}"
+                     f"{result.get('p50_ms', float('nan')):>10.3f}{result.get('p99_ms', float('nan')):>10.3f}"
+                     f"{result['peak_mb']:>10.1f}")
+    return '\n'.join(lines)
+
+
+def main(arguments: list[str] | None = None) -> int:
+    """Run the benchmarks described by the given command line arguments and return the exit status,
+    which is 1 if a regression was found and 0 otherwise.
+
+    If the --compare file does not exist yet, the results are saved to it as the baseline instead."""
+    parser = argparse.ArgumentParser(description='Benchmark the movie recommendation system.')
+    parser.add_argument('--tier', choices=list(SIZE_TIERS), default='tiny')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--method', choices=list(clustering.CLUSTERING_METHODS), default='louvain')
+    parser.add_argument('--options', type=json.loads, help='the clustering options, as a JSON object')
+    parser.add_argument('--processes', type=int, help='the number of processes of the cluster_parallel stage')
+    parser.add_argument('--directory', default=BENCHMARK_DIRECTORY)
+    parser.add_argument('--memory', action='store_true',
+                        help='also measure peak memory, by running every stage a second time')
+    parser.add_argument('--save', help='save the results as a baseline to this JSON file')
+    parser.add_argument('--compare', help='compare the results to the baseline in this JSON file, '
+                                          'or record them there if it does not exist')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(arguments)
+
+    reviews, movies = prepare_dataset(args.tier, args.directory, args.seed)
+    results = run_benchmarks(reviews, movies, args.stages, args.queries, args.seed, args.memory,
+                             lambda stage: print(f'Running {stage}...', file=sys.stderr), args.method, args.options,
+                             args.processes)
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({'tier': args.tier, 'seed': args.seed, 'results': results}, baseline_file, indent=2)
+
+    if args.compare and not os.path.exists(args.compare):
+        with open(args.compare, 'w') as baseline_file:
+            json.dump({'tier': args.tier, 'seed': args.seed, 'results': results}, baseline_file, indent=2)
+        print(f'No baseline found, so these results were recorded as the baseline in {args.compare}')
+    elif args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            regressions = compare_results(results, json.load(baseline_file)['results'], args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        # the names (strs) of imported modules
+        'extra-imports': ['argparse', 'json', 'os', 'random', 'sys', 'time', 'tracemalloc', 'typing', 'numpy',
+                          'clustering', 'graph_cache', 'load_graph', 'metrics', 'recommender', 'search'],
+        # the names (strs) of functions that call print/open/input
+        'allowed-io': ['generate_dataset', 'count_lines', 'main'],
+        'max-line-length': 120
+    })
+
+    sys.exit(main())
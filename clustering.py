@@ -3,6 +3,10 @@
 This is the file for implementing the clustering functionality
 of the Netflix Movie Recommendation System.
 """
+import time
+from collections import deque
+from typing import Iterable
+import instrumentation
 import movie_class
 
 
@@ -56,40 +60,82 @@ def m_func(graph: movie_class.Network) -> float:
     return all_edge_weight / 2
 
 
+def modularity_gain(sum_in: float, sum_total: float, ki: float, kin: float, m: float) -> float:
+    """Return the change in modularity from moving a vertex with total edge weight ki into a community
+    with the given sigma_in and sigma_total, where kin is the weight of the edges between the vertex
+    and the community and m is the sum of weighted edges of the entire graph."""
+    return (((sum_in + kin) / (2 * m)) - (((sum_total + ki) / (2 * m)) ** 2)
+            ) - ((sum_in / (2 * m)) - ((sum_total / (2 * m)) ** 2) - (ki / (2 * m)) ** 2)
+
+
 def calculate_delta_q(community: list[set[movie_class.Movie] | float], vertex: movie_class.Movie, m: float) -> float:
     """Used to calculate delta_q, this is an implementation of the formula given in the paper to
     efficiently calculate the change in modularity"""
-    sum_in = sigma_in(community)
-    sum_total = sigma_total(community)
-    ki = k_i(vertex)
-    kin = k_i_in(vertex, community)
-    return (((sum_in + kin) / (2 * m)) - (((sum_total + ki) / (2 * m)) ** 2)
-            ) - ((sum_in / (2 * m)) - ((sum_total / (2 * m)) ** 2) - (ki / (2 * m)) ** 2)
+    return modularity_gain(sigma_in(community), sigma_total(community), k_i(vertex), k_i_in(vertex, community), m)
+
+
+def community_degrees(graph: movie_class.Network) -> dict[str, float]:
+    """Return a mapping from each community of graph to the sum of the weighted degrees of its vertices.
+
+    sigma_total of a community is its value in this mapping minus its sigma_in, so keeping this mapping
+    up to date as vertices move lets sigma_total be computed in constant time.
+    """
+    return {community: sum(vertex.sum_weights for vertex in members)
+            for community, (members, _) in graph.get_communities().items()}
+
+
+def neighbour_items(graph: movie_class.Network, vertex: movie_class.Movie) -> Iterable[tuple[movie_class.Movie, float]]:
+    """Return the (neighbour, weight) pairs of the given vertex of graph.
 
+    The neighbours of a vertex of a compact_network.CompactNetwork are read with its neighbour_arrays
+    method, rather than building the neighbours dict of the vertex.
+    """
+    if hasattr(graph, 'neighbour_arrays'):
+        indices, weights = graph.neighbour_arrays(vertex.index)
+        views = graph.get_views()
+        return zip([views[j] for j in indices.tolist()], weights.tolist())
+    return vertex.neighbours.items()
 
-def louvain_helper(graph: movie_class.Network, vertex: movie_class.Movie, m: float) -> None:
+
+def louvain_helper(graph: movie_class.Network, vertex: movie_class.Movie, m: float,
+                   degrees: dict[str, float]) -> bool:
     """Helper function to help simplify the Louvain's method.
     For a given vertex, iterate over its neighbours and check the modularity gain from assigning
     a vertex to its neighbors community. If the size of the community is less than 25 and the
-    modularity gain is greater than 0, assign the vertex to its neighbouring community"""
+    modularity gain is greater than 0, assign the vertex to its neighbouring community.
+
+    The weight of the edges from vertex to each neighbouring community (k_i_in) is found in a single
+    pass over its neighbours, and degrees (as returned by community_degrees) is updated when the
+    vertex moves, so each call takes time proportional to the degree of vertex.
+
+    Return whether vertex moved to another community."""
+    communities = graph.get_communities()
+    links = {}
+    for neighbour, weight in neighbour_items(graph, vertex):
+        links[neighbour.community] = links.get(neighbour.community, 0) + weight
+
     max_q = 0
     best_community = vertex.community
-    for neighbour in vertex.neighbours:
-        community = graph.get_communities()[neighbour.community]
-        delta_q = calculate_delta_q(community, vertex, m)
+    ki = k_i(vertex)
+    for community_name, kin in links.items():
+        community = communities[community_name]
+        delta_q = modularity_gain(sigma_in(community), degrees[community_name] - sigma_in(community), ki, kin, m)
 
         if max_q < delta_q and len(community[0]) < 25:
             max_q = delta_q
-            best_community = neighbour.community
+            best_community = community_name
 
     # If modularity gain is greater than 0, reassign communities
     if max_q > 0:
-        neighbour_community = graph.get_communities()[best_community]
-        old_community = graph.get_communities()[vertex.community]
-        best_k_i_in = k_i_in(vertex, neighbour_community)
-        best_k_i_out = k_i_out(vertex, old_community)
-        graph.change_communities(vertex, best_community, best_k_i_in, best_k_i_out)
+        old_community = vertex.community
+        graph.change_communities(vertex, best_community, links[best_community], links.get(old_community, 0))
         vertex.community = best_community
+        degrees[old_community] -= ki
+        degrees[best_community] += ki
+
+    if instrumentation.ENABLED:
+        instrumentation.increment('cluster.delta_q_evaluations', len(links))
+    return max_q > 0
 
 
 def louvain(graph: movie_class.Network, epochs: int) -> None:
@@ -99,16 +145,384 @@ def louvain(graph: movie_class.Network, epochs: int) -> None:
     we insist the size of a community is less than 25, in order to make more balanced calculations
     with respect to the dataset so the majority of the dataset doesn't fall under a single community."""
     m = m_func(graph)
+    if m == 0:
+        return
+
+    degrees = community_degrees(graph)
+    for _ in range(epochs):
+        moves = 0
+        for vertex in graph.get_movies().values():
+            moves += louvain_helper(graph, vertex, m, degrees)
+        instrumentation.observe('cluster.moves_per_epoch', moves)
+        instrumentation.increment('cluster.moves', moves)
+    graph.remove_empty_communities()
+
+
+def recluster(graph: movie_class.Network, titles: set[str], epochs: int = 1) -> None:
+    """Re-run the moves of louvain for the movies with the given titles and their neighbours only, for
+    the given number of epochs.
+
+    This is used after the edges of a few movies have changed, such as after Network.ingest_ratings,
+    so the communities can be updated without clustering the whole graph again.
+    """
+    m = m_func(graph)
+    if m == 0:
+        return
+
+    movies = graph.get_movies()
+    affected = dict.fromkeys(movies[title] for title in titles)
+    for title in titles:
+        affected.update(dict.fromkeys(neighbour for neighbour, _ in neighbour_items(graph, movies[title])))
+
+    degrees = community_degrees(graph)
     for _ in range(epochs):
-        for vertex_name in graph.get_movies():
-            louvain_helper(graph, graph.get_movies()[vertex_name], m)
+        for vertex in affected:
+            louvain_helper(graph, vertex, m, degrees)
     graph.remove_empty_communities()
 
 
+def graph_to_lists(graph: movie_class.Network) -> tuple[list[str], list[dict[int, float]]]:
+    """Return the titles of the movies in graph and the adjacency of the graph as a list, where
+    adjacency[i] maps the index of each neighbour of the i-th movie to the weight of their edge."""
+    titles = list(graph.get_movies())
+    title_indices = {title: i for i, title in enumerate(titles)}
+    adjacency = [{title_indices[neighbour.title]: weight for neighbour, weight in neighbour_items(graph, movie)}
+                 for movie in graph.get_movies().values()]
+    return titles, adjacency
+
+
+def partition_modularity(adjacency: list[dict[int, float]], loops: list[float], labels: list[int],
+                         m: float) -> float:
+    """Return the modularity of the partition of the given graph where vertex i is in community labels[i].
+
+    loops[i] is the weight of the self-loop of vertex i and m is the sum of weighted edges of the graph.
+    """
+    inside, total = {}, {}
+    for i, neighbours in enumerate(adjacency):
+        community = labels[i]
+        inside[community] = inside.get(community, 0) + 2 * loops[i] + sum(
+            weight for j, weight in neighbours.items() if labels[j] == community)
+        total[community] = total.get(community, 0) + 2 * loops[i] + sum(neighbours.values())
+
+    return sum(inside[c] / (2 * m) - (total[c] / (2 * m)) ** 2 for c in total)
+
+
+def local_moving(adjacency: list[dict[int, float]], loops: list[float], sizes: list[int], m: float,
+                 max_size: int = 25, tolerance: float = 1e-6, max_passes: int = 100) -> tuple[list[int], int]:
+    """Run phase 1 of the Louvain's algorithm on the given graph, starting with every vertex in its
+    own community, and return the community of each vertex and the number of passes made.
+
+    Each vertex i counts as sizes[i] movies, and a vertex is never moved into a community that would
+    then contain more than max_size movies. Passes stop once a pass moves no vertex or increases the
+    modularity by less than tolerance.
+    """
+    degrees = [2 * loops[i] + sum(neighbours.values()) for i, neighbours in enumerate(adjacency)]
+    labels = list(range(len(adjacency)))
+    totals = degrees.copy()
+    community_sizes = sizes.copy()
+    modularity = partition_modularity(adjacency, loops, labels, m)
+
+    for passes in range(1, max_passes + 1):
+        moves = 0
+        for i, neighbours in enumerate(adjacency):
+            links = {}
+            for j, weight in neighbours.items():
+                links[labels[j]] = links.get(labels[j], 0) + weight
+
+            old = labels[i]
+            totals[old] -= degrees[i]
+            community_sizes[old] -= sizes[i]
+            best, best_gain = old, links.get(old, 0) - totals[old] * degrees[i] / (2 * m)
+
+            for community, weight in links.items():
+                gain = weight - totals[community] * degrees[i] / (2 * m)
+                if gain > best_gain and community_sizes[community] + sizes[i] <= max_size:
+                    best, best_gain = community, gain
+
+            labels[i] = best
+            totals[best] += degrees[i]
+            community_sizes[best] += sizes[i]
+            moves += best != old
+
+        new_modularity = partition_modularity(adjacency, loops, labels, m)
+        if moves == 0 or new_modularity - modularity < tolerance:
+            return labels, passes
+        modularity = new_modularity
+
+    return labels, max_passes
+
+
+def aggregate(adjacency: list[dict[int, float]], loops: list[float], sizes: list[int],
+              labels: list[int]) -> tuple[list[dict[int, float]], list[float], list[int], list[int]]:
+    """Run phase 2 of the Louvain's algorithm, merging each community of the given graph into a single vertex.
+
+    Return the adjacency, self-loop weights and sizes of the aggregated graph, and the vertex of the
+    aggregated graph that each vertex of the given graph was merged into.
+    """
+    renumbered = {}
+    for label in labels:
+        renumbered.setdefault(label, len(renumbered))
+    merged = [renumbered[label] for label in labels]
+
+    new_adjacency = [{} for _ in renumbered]
+    new_loops = [0.0] * len(renumbered)
+    new_sizes = [0] * len(renumbered)
+    for i, neighbours in enumerate(adjacency):
+        community = merged[i]
+        new_loops[community] += loops[i]
+        new_sizes[community] += sizes[i]
+        for j, weight in neighbours.items():
+            if merged[j] == community:
+                # Each inside edge is seen from both of its endpoints
+                new_loops[community] += weight / 2
+            else:
+                new_adjacency[community][merged[j]] = new_adjacency[community].get(merged[j], 0) + weight
+
+    return new_adjacency, new_loops, new_sizes, merged
+
+
+def apply_partition(graph: movie_class.Network, titles: list[str], labels: list[int]) -> None:
+    """Move the movie titles[i] of graph to community labels[i] for every i. Each community is named after
+    its first movie in titles."""
+    names = {}
+    for title, label in zip(titles, labels):
+        names.setdefault(label, title)
+    graph.set_communities({title: names[label] for title, label in zip(titles, labels)})
+
+
+def louvain_multilevel(graph: movie_class.Network, tolerance: float = 1e-6, max_levels: int = 10,
+                       max_size: int = 25, verbose: bool = False) -> list[dict[str, float]]:
+    """Full Louvain's algorithm for community detection, with both phases.
+
+    Phase 1 (local_moving) is repeated until it stops improving the modularity by at least tolerance,
+    then phase 2 (aggregate) merges each community into a single vertex and the process is repeated on
+    the aggregated graph. Levels stop once a level merges no vertices or improves the modularity by less
+    than tolerance. Like louvain, no community ever contains more than max_size movies.
+
+    Return the number of vertices, passes, modularity and running time of each level, which are also
+    printed if verbose is True.
+    """
+    titles, adjacency = graph_to_lists(graph)
+    loops = [0.0] * len(titles)
+    sizes = [1] * len(titles)
+    m = sum(sum(neighbours.values()) for neighbours in adjacency) / 2
+    labels = list(range(len(titles)))
+    if m == 0:
+        apply_partition(graph, titles, labels)
+        return []
+
+    modularity = partition_modularity(adjacency, loops, labels, m)
+    report = []
+    for level in range(max_levels):
+        start = time.perf_counter()
+        level_labels, passes = local_moving(adjacency, loops, sizes, m, max_size, tolerance)
+        new_modularity = partition_modularity(adjacency, loops, level_labels, m)
+        adjacency, loops, sizes, merged = aggregate(adjacency, loops, sizes, level_labels)
+        labels = [merged[label] for label in labels]
+
+        report.append({'level': level, 'vertices': len(merged), 'passes': passes,
+                       'modularity': new_modularity, 'seconds': time.perf_counter() - start})
+        if verbose:
+            print(f"Level {level}: {len(merged)} vertices -> {len(adjacency)} communities in {passes} passes, "
+                  f"modularity {new_modularity:.6f} ({report[-1]['seconds']:.3f}s)")
+
+        if len(adjacency) == len(merged) or new_modularity - modularity < tolerance:
+            break
+        modularity = new_modularity
+
+    apply_partition(graph, titles, labels)
+    return report
+
+
+def fast_local_moving(adjacency: list[dict[int, float]], loops: list[float], sizes: list[int], m: float,
+                      labels: list[int], max_size: int = 25) -> tuple[list[int], int]:
+    """Run the queue-based local moving phase of the Leiden algorithm on the given graph, starting from
+    the communities in labels, and return the new community of each vertex and the number of vertices
+    evaluated.
+
+    Every vertex is evaluated once, then a vertex is only evaluated again if one of its neighbours
+    moved out of its community, so vertices whose neighbourhood did not change are never revisited.
+    A vertex is never moved into a community that would then contain more than max_size movies.
+    """
+    degrees = [2 * loops[i] + sum(neighbours.values()) for i, neighbours in enumerate(adjacency)]
+    labels = labels.copy()
+    totals, community_sizes = {}, {}
+    for i, label in enumerate(labels):
+        totals[label] = totals.get(label, 0) + degrees[i]
+        community_sizes[label] = community_sizes.get(label, 0) + sizes[i]
+
+    queue = deque(range(len(adjacency)))
+    queued = [True] * len(adjacency)
+    evaluations = 0
+    while queue:
+        i = queue.popleft()
+        queued[i] = False
+        evaluations += 1
+
+        links = {}
+        for j, weight in adjacency[i].items():
+            links[labels[j]] = links.get(labels[j], 0) + weight
+
+        old = labels[i]
+        totals[old] -= degrees[i]
+        community_sizes[old] -= sizes[i]
+        best, best_gain = old, links.get(old, 0) - totals[old] * degrees[i] / (2 * m)
+        for community, weight in links.items():
+            gain = weight - totals[community] * degrees[i] / (2 * m)
+            if gain > best_gain and community_sizes[community] + sizes[i] <= max_size:
+                best, best_gain = community, gain
+
+        labels[i] = best
+        totals[best] += degrees[i]
+        community_sizes[best] += sizes[i]
+
+        if best != old:
+            for j in adjacency[i]:
+                if not queued[j] and labels[j] != best:
+                    queue.append(j)
+                    queued[j] = True
+
+    return labels, evaluations
+
+
+def refine_partition(adjacency: list[dict[int, float]], loops: list[float], m: float,
+                     labels: list[int]) -> list[int]:
+    """Run the refinement phase of the Leiden algorithm and return the refined community of each vertex.
+
+    Every community in labels is split into well-connected sub-communities: starting from singletons,
+    a vertex that is still alone and well connected to its community is merged into the sub-community of
+    the same community that gives the largest modularity gain, provided that sub-community is itself well
+    connected to the rest of the community. Refined communities are subsets of the communities in labels,
+    so they also respect the community size limit.
+    """
+    degrees = [2 * loops[i] + sum(neighbours.values()) for i, neighbours in enumerate(adjacency)]
+    community_totals = {}
+    for i, label in enumerate(labels):
+        community_totals[label] = community_totals.get(label, 0) + degrees[i]
+
+    refined = list(range(len(adjacency)))
+    totals = degrees.copy()
+    counts = [1] * len(adjacency)
+    # external[r] is the weight of the edges between refined community r and the rest of its community
+    external = [sum(weight for j, weight in neighbours.items() if labels[j] == labels[i] and j != i)
+                for i, neighbours in enumerate(adjacency)]
+
+    for i, neighbours in enumerate(adjacency):
+        community_total = community_totals[labels[i]]
+        if counts[refined[i]] > 1 or external[i] < degrees[i] * (community_total - degrees[i]) / (2 * m):
+            continue
+
+        links = {}
+        for j, weight in neighbours.items():
+            if labels[j] == labels[i] and j != i:
+                links[refined[j]] = links.get(refined[j], 0) + weight
+
+        best, best_gain = refined[i], 0.0
+        for community, weight in links.items():
+            well_connected = external[community] >= totals[community] * (community_total - totals[community]) / (2 * m)
+            gain = weight - totals[community] * degrees[i] / (2 * m)
+            if well_connected and gain >= best_gain:
+                best, best_gain = community, gain
+
+        if best != refined[i]:
+            old = refined[i]
+            external[best] += external[old] - 2 * links[best]
+            totals[best] += totals[old]
+            counts[best] += 1
+            counts[old], totals[old], external[old] = 0, 0.0, 0.0
+            refined[i] = best
+
+    return refined
+
+
+def leiden(graph: movie_class.Network, tolerance: float = 1e-6, max_levels: int = 10,
+           max_size: int = 25, verbose: bool = False) -> list[dict[str, float]]:
+    """Leiden-style algorithm for community detection, an alternative to louvain_multilevel.
+
+    Each level runs fast_local_moving, which only re-evaluates vertices whose neighbourhood changed,
+    then refine_partition, which splits the communities into well-connected sub-communities. The graph is
+    aggregated on the refined communities, but every aggregated vertex starts the next level in the
+    community it was found in, so no work is lost. Levels stop once the local moving phase leaves every
+    vertex in its own community or improves the modularity by less than tolerance. Like louvain, no
+    community ever contains more than max_size movies.
+
+    Return the number of vertices, evaluations, modularity and running time of each level, which are also
+    printed if verbose is True.
+    """
+    titles, adjacency = graph_to_lists(graph)
+    loops = [0.0] * len(titles)
+    sizes = [1] * len(titles)
+    m = sum(sum(neighbours.values()) for neighbours in adjacency) / 2
+    nodes = list(range(len(titles)))
+    labels = list(range(len(titles)))
+    if m == 0:
+        apply_partition(graph, titles, labels)
+        return []
+
+    modularity = partition_modularity(adjacency, loops, labels, m)
+    report = []
+    for level in range(max_levels):
+        start = time.perf_counter()
+        labels, evaluations = fast_local_moving(adjacency, loops, sizes, m, labels, max_size)
+        new_modularity = partition_modularity(adjacency, loops, labels, m)
+        num_communities = len(set(labels))
+
+        report.append({'level': level, 'vertices': len(adjacency), 'evaluations': evaluations,
+                       'modularity': new_modularity, 'seconds': time.perf_counter() - start})
+        if verbose:
+            print(f"Level {level}: {len(adjacency)} vertices -> {num_communities} communities after "
+                  f"{evaluations} evaluations, modularity {new_modularity:.6f} ({report[-1]['seconds']:.3f}s)")
+
+        if num_communities == len(adjacency) or new_modularity - modularity < tolerance:
+            break
+        modularity = new_modularity
+
+        refined = refine_partition(adjacency, loops, m, labels)
+        adjacency, loops, sizes, merged = aggregate(adjacency, loops, sizes, refined)
+        aggregated_labels = [0] * len(adjacency)
+        for i, node in enumerate(merged):
+            aggregated_labels[node] = labels[i]
+        nodes = [merged[node] for node in nodes]
+        labels = aggregated_labels
+
+    apply_partition(graph, titles, [labels[node] for node in nodes])
+    return report
+
+
+def louvain_parallel(graph: movie_class.Network, processes: int | None = None, **options: float) -> int:
+    """Run phase 1 of the Louvain's algorithm on a pool of processes with parallel_clustering.parallel_louvain,
+    passing on processes and options, and return the number of passes made."""
+    # Imported here, since parallel_clustering itself imports this module
+    import parallel_clustering
+    return parallel_clustering.parallel_louvain(graph, processes, **options)
+
+
+CLUSTERING_METHODS = {
+    'louvain': louvain,
+    'multilevel': louvain_multilevel,
+    'leiden': leiden,
+    'parallel': louvain_parallel
+}
+
+
+def cluster(graph: movie_class.Network, method: str = 'louvain', **options: float) -> None:
+    """Assign the movies in graph to communities with the given clustering method, one of the keys
+    of CLUSTERING_METHODS. options are passed on to the chosen function, for example the number of
+    processes of 'parallel' as options['processes'].
+
+    Raise a ValueError if method is not a known clustering method.
+    """
+    if method not in CLUSTERING_METHODS:
+        raise ValueError
+    with instrumentation.timer(f'cluster.{method}'):
+        CLUSTERING_METHODS[method](graph, **options)
+
+
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['movie_class'],  # the names (strs) of imported modules
-        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        # the names (strs) of imported modules
+        'extra-imports': ['time', 'collections', 'typing', 'instrumentation', 'movie_class', 'parallel_clustering'],
+        'allowed-io': ['louvain_multilevel', 'leiden'],  # the names (strs) of functions that call print/open/input
         'max-line-length': 120
     })
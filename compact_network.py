@@ -0,0 +1,322 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains a compact, array-backed implementation of the movie network graph
+of the Netflix Movie Recommendation System. It supports the same queries as
+movie_class.Network while using an order of magnitude less memory per edge.
+"""
+from __future__ import annotations
+import heapq
+import numpy as np
+import graph_cache
+import movie_class
+
+
+class MovieView:
+    """A vertex of a CompactNetwork, used to represent a movie.
+
+    This has the same attributes as movie_class.Movie, but the neighbours of the movie are read
+    from the arrays of its network when they are requested instead of being stored in the vertex.
+    Code that only needs ids and weights should use CompactNetwork.neighbour_arrays, which never
+    builds a dict.
+
+    Instance Attributes:
+        - title: The movie title stored in this vertex.
+        - community: A value used to group this movie into a group of similar movies.
+        - sum_weights: The sum of the weights of the edges incident to this vertex.
+        - index: The integer id of this vertex in its network.
+
+    Representation Invariants:
+        - self.network.get_movies()[self.title] is self
+    """
+    __slots__ = ('title', 'community', 'sum_weights', 'index', 'network')
+    title: str
+    community: str
+    sum_weights: float
+    index: int
+    network: CompactNetwork
+
+    def __init__(self, network: CompactNetwork, index: int, title: str, community: str,
+                 sum_weights: float) -> None:
+        """Initialize a view of the vertex with the given index in network."""
+        self.network = network
+        self.index = index
+        self.title = title
+        self.community = community
+        self.sum_weights = sum_weights
+
+    @property
+    def neighbours(self) -> dict[MovieView, float]:
+        """The vertices that are adjacent to this vertex and their corresponding edge weights.
+
+        A new dict is built from the arrays of the network every time this is read, so that no vertex
+        keeps a copy of its row.
+        """
+        indices, weights = self.network.neighbour_arrays(self.index)
+        views = self.network.get_views()
+        return {views[j]: weight for j, weight in zip(indices.tolist(), weights.tolist())}
+
+    def degree(self) -> int:
+        """Return the degree of this vertex."""
+        return len(self.network.neighbour_arrays(self.index)[0])
+
+
+class CompactNetwork:
+    """An implementation of a movie network graph that stores its edges in CSR arrays.
+
+    Titles are interned to integer ids, and the neighbours of the movie with id i are
+    _indices[_indptr[i]:_indptr[i + 1]], sorted by id, with edge weights stored as 32-bit floats.
+    Weights that only differ beyond 32-bit precision become equal, and like every other tie between
+    equal weights, they are broken by title.
+    The edges cannot be modified, but communities can be changed like in movie_class.Network.
+
+    Private Instance Attributes:
+        - _titles: The title of each movie id.
+        - _title_indices: Maps each title to its movie id.
+        - _indptr: The offsets of the neighbours of each movie in _indices and _weights.
+        - _indices: The movie ids of the neighbours of every movie.
+        - _weights: The weights of the edges to the neighbours in _indices.
+        - _views: The MovieView of each movie id.
+        - _communities: A collection of vertices within a given community and the community density.
+        - _version: A counter that is incremented every time a community changes.
+
+    Representation Invariants:
+        - len(self._titles) == len(self._views) == len(self._indptr) - 1
+        - len(self._indices) == len(self._weights) == self._indptr[-1]
+    """
+    _titles: list[str]
+    _title_indices: dict[str, int]
+    _indptr: np.ndarray
+    _indices: np.ndarray
+    _weights: np.ndarray
+    _views: list[MovieView]
+    _movies: dict[str, MovieView] | None
+    _communities: dict[str, list[set[MovieView] | float]]
+    _version: int
+
+    def __init__(self, arrays: dict[str, np.ndarray]) -> None:
+        """Initialize a network from the arrays returned by graph_cache.network_to_arrays or
+        graph_cache.load_arrays."""
+        self._titles = graph_cache.decode_strings(arrays['title_data'], arrays['title_offsets'])
+        self._title_indices = {title: i for i, title in enumerate(self._titles)}
+        self._indptr = np.asarray(arrays['indptr'], dtype=np.int64)
+
+        # The neighbours of every movie must be sorted by id so get_weight can use a binary search. Snapshots
+        # written by graph_cache.save_graph are already sorted, so their memory-mapped arrays are used as they are.
+        indices = np.asarray(arrays['indices'], dtype=np.int32)
+        weights = np.asarray(arrays['weights'], dtype=np.float32)
+        if is_sorted_by_row(self._indptr, indices):
+            self._indices, self._weights = indices, weights
+        else:
+            rows = np.repeat(np.arange(len(self._titles), dtype=np.int32), np.diff(self._indptr))
+            order = np.lexsort((indices, rows))
+            self._indices, self._weights = indices[order], weights[order]
+
+        community_names = graph_cache.decode_strings(arrays['community_data'], arrays['community_offsets'])
+        self._views = [MovieView(self, i, title, community_names[community], sum_weights)
+                       for i, (title, community, sum_weights) in
+                       enumerate(zip(self._titles, arrays['communities'].tolist(), arrays['sum_weights'].tolist()))]
+        self._movies = None
+        self._version = 0
+
+        self._communities = {community: [set(), density] for community, density in
+                             zip(community_names, arrays['community_density'].tolist())}
+        for view in self._views:
+            self._communities[view.community][0].add(view)
+
+    @classmethod
+    def from_network(cls, graph: movie_class.Network) -> CompactNetwork:
+        """Return a compact copy of the given graph, including its communities."""
+        return cls(graph_cache.network_to_arrays(graph))
+
+    @classmethod
+    def load(cls, directory: str, source_paths: list[str], parameters: dict | None = None) -> CompactNetwork | None:
+        """Return the graph saved by graph_cache.save_graph in directory without building any Movie objects,
+        or None if there is no snapshot there or if it is out of date."""
+        if not graph_cache.is_snapshot_valid(directory, source_paths, parameters):
+            return None
+        return cls(graph_cache.load_arrays(directory))
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """Return the same arrays as graph_cache.network_to_arrays, reusing the edge arrays of this network
+        instead of building the neighbours of every MovieView."""
+        communities = list(self._communities)
+        community_indices = {community: i for i, community in enumerate(communities)}
+        title_data, title_offsets = graph_cache.encode_strings(self._titles)
+        community_data, community_offsets = graph_cache.encode_strings(communities)
+        return {
+            'title_data': title_data,
+            'title_offsets': title_offsets,
+            'indptr': self._indptr,
+            'indices': self._indices,
+            'weights': self._weights,
+            'sum_weights': np.array([view.sum_weights for view in self._views], dtype=np.float64),
+            'communities': np.array([community_indices[view.community] for view in self._views], dtype=np.int32),
+            'community_data': community_data,
+            'community_offsets': community_offsets,
+            'community_density': np.array([self._communities[community][1] for community in communities],
+                                          dtype=np.float64)
+        }
+
+    def neighbour_arrays(self, index: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (movie ids, weights) arrays of the neighbours of the movie with the given id."""
+        start, end = self._indptr[index], self._indptr[index + 1]
+        return self._indices[start:end], self._weights[start:end]
+
+    def get_version(self) -> int:
+        """Return the number of times the communities of this graph have changed."""
+        return self._version
+
+    def get_views(self) -> list[MovieView]:
+        """Return the MovieView of every movie id."""
+        return self._views
+
+    def memory_usage(self) -> int:
+        """Return the number of bytes used by the adjacency arrays of this graph."""
+        return self._indptr.nbytes + self._indices.nbytes + self._weights.nbytes
+
+    def get_weight(self, title1: str, title2: str) -> float:
+        """Return the weight of the edge between the given movies.
+
+        Return 0 if title1 and title2 are not adjacent.
+
+        Raise a ValueError if title1 or title2 do not appear as movies in this graph.
+        """
+        if title1 in self._title_indices and title2 in self._title_indices:
+            indices, weights = self.neighbour_arrays(self._title_indices[title1])
+            position = np.searchsorted(indices, self._title_indices[title2])
+            if position < len(indices) and indices[position] == self._title_indices[title2]:
+                return float(weights[position])
+            return 0
+        else:
+            raise ValueError
+
+    def adjacent(self, title1: str, title2: str) -> bool:
+        """Return whether title1 and title2 are adjacent movies in this graph.
+
+        Return False if title1 or title2 do not appear as movies in this graph.
+        """
+        if title1 in self._title_indices and title2 in self._title_indices:
+            return self.get_weight(title1, title2) != 0
+        else:
+            return False
+
+    def get_neighbours(self, title: str) -> set:
+        """Return a set of the titles of the neighbours of the given movie.
+
+        Raise a ValueError if title does not appear as a movie in this graph.
+        """
+        if title in self._title_indices:
+            return {self._titles[j] for j in self.neighbour_arrays(self._title_indices[title])[0].tolist()}
+        else:
+            raise ValueError
+
+    def get_movies(self) -> dict[str, MovieView]:
+        """A getter method that returns the movies (vertices) found in the graph."""
+        if self._movies is None:
+            self._movies = {view.title: view for view in self._views}
+        return self._movies
+
+    def get_communities(self) -> dict[str, list[set[MovieView] | float]]:
+        """A getter method that returns the communities found in the graph."""
+        return self._communities
+
+    def change_communities(self, vertex: MovieView, new_community: str, add_density: float,
+                           rem_density: float) -> None:
+        """Moves a movie to a new community and update its density"""
+        self._communities[vertex.community][0].remove(vertex)
+        self._communities[vertex.community][1] -= rem_density
+        self._communities[new_community][0].add(vertex)
+        self._communities[new_community][1] += add_density
+        self._version += 1
+
+    def set_communities(self, assignment: dict[str, str], densities: dict[str, float] | None = None) -> None:
+        """Replace the communities of this graph, so that each movie with title t is moved to the
+        community assignment[t]. Movies whose title is not in assignment keep their community.
+
+        If densities is None, the density of every community is recomputed as the sum of the weights
+        of the edges strictly inside it. Otherwise, densities maps each community to its density.
+
+        Raise a ValueError if a title in assignment does not appear as a movie in this graph.
+        """
+        if any(title not in self._title_indices for title in assignment):
+            raise ValueError
+
+        for title, community in assignment.items():
+            self._views[self._title_indices[title]].community = community
+        self._version += 1
+
+        self._communities = {}
+        for view in self._views:
+            self._communities.setdefault(view.community, [set(), 0.0])[0].add(view)
+
+        if densities is not None:
+            for community, density in densities.items():
+                self._communities.setdefault(community, [set(), 0.0])[1] = density
+        else:
+            names = [view.community for view in self._views]
+            rows = np.repeat(np.arange(len(self._views)), np.diff(self._indptr))
+            for i, j, weight in zip(rows.tolist(), self._indices.tolist(), self._weights.tolist()):
+                if i < j and names[i] == names[j]:
+                    self._communities[names[i]][1] += weight
+
+    def remove_empty_communities(self) -> None:
+        """Get rid of communities without any members"""
+        for community in [community for community in self._communities if not self._communities[community][0]]:
+            self._communities.pop(community)
+
+    def get_best_movies(self, movies_titles: list[str], limit: int) -> list[str]:
+        """Return a maximum length limit of the best movie titles connected to the given movies
+        and in the same community, following the same best-first search as movie_class.Network.
+
+        Like recommender.RecommendationIndex, and unlike movie_class.Network, only distinct titles count
+        towards limit.
+
+        Raise a ValueError if a title does not appear as a movie in this graph.
+        """
+        if any(title not in self._title_indices for title in movies_titles):
+            raise ValueError
+
+        heap = []
+        list_of_movies = []
+        visited = {self._title_indices[title] for title in movies_titles}
+
+        for index in visited:
+            self._push_community_neighbours(heap, index, visited)
+
+        while heap and len(list_of_movies) < limit:
+            _, title, index = heapq.heappop(heap)
+            if index in visited:
+                continue
+
+            list_of_movies.append(title)
+            visited.add(index)
+            self._push_community_neighbours(heap, index, visited)
+
+        return list_of_movies
+
+    def _push_community_neighbours(self, heap: list, index: int, visited: set[int]) -> None:
+        """Push the unvisited neighbours of the given movie that are in its community onto heap,
+        keyed by their negated edge weight."""
+        community = self._views[index].community
+        indices, weights = self.neighbour_arrays(index)
+        for j, weight in zip(indices.tolist(), weights.tolist()):
+            if j not in visited and self._views[j].community == community:
+                heapq.heappush(heap, (-weight, self._titles[j], j))
+
+
+def is_sorted_by_row(indptr: np.ndarray, indices: np.ndarray) -> bool:
+    """Return whether indices[indptr[i]:indptr[i + 1]] is strictly increasing for every row i."""
+    increasing = np.diff(indices.astype(np.int64)) > 0
+    row_starts = indptr[1:-1]
+    row_starts = row_starts[(row_starts > 0) & (row_starts < len(indices))]
+    increasing[row_starts - 1] = True
+    return bool(increasing.all())
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['heapq', 'numpy', 'graph_cache', 'movie_class'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
@@ -0,0 +1,413 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains the batched edge accumulation engine used when building
+the weighted movie graph of the Netflix Movie Recommendation System.
+"""
+from typing import Callable
+import numpy as np
+
+# The number of decimals the accumulated weights are rounded to. Floating point sums depend on the order of
+# their terms, so without rounding, how the ratings are split into chunks could change which edges reach
+# min_weight or are among the top_k of a movie.
+WEIGHT_DECIMALS = 9
+
+
+class EdgeAccumulator:
+    """Accumulates the weights of co-rating edges between movies identified by integer ids.
+
+    Instead of updating the graph one pair at a time, the pairs of movies rated by each user are
+    generated as NumPy arrays and buffered. Buffered pairs are merged into the running totals in
+    large batches, either into a dense weight matrix (for small graphs) or into a sorted array of
+    unique pair keys (for large graphs).
+
+    The edges can be sparsified: edges() drops the edges with a weight below min_weight or co-rated by
+    fewer than min_support users, and, if top_k is not None, keeps only the edges that are among the
+    top_k heaviest edges of at least one of their movies. In sparse mode, max_edges bounds the memory
+    used while accumulating: whenever more than max_edges distinct edges are held, the lightest are
+    dropped (keeping the top 2 * top_k edges of each movie first, if top_k is not None) until half of
+    max_edges remain. Since a dropped edge loses the weight it had so far, this pruning is approximate,
+    and the result is exact whenever the number of distinct edges never exceeds max_edges.
+
+    Heavy raters can be sampled: when a single call to add_user or add_pair_product would generate more
+    than pair_budget pairs, only about pair_budget pairs are drawn at random and each is weighted by the
+    inverse of its probability of being drawn, so the expected weight of every edge is unchanged. With
+    the 'uniform' sampling strategy every pair is equally likely to be drawn, and with the 'stratified'
+    strategy the budget is split between the pairs of each combination of ratings in proportion to their
+    number, so every level of agreement between ratings keeps its share of the pairs. Supports count the
+    drawn pairs, without weighting.
+
+    Instance Attributes:
+        - num_movies: the number of movie ids, so every id is in range(num_movies).
+        - batch_size: the number of buffered pairs at which the buffer is merged into the totals.
+        - num_pairs: the total number of pairs with a positive weight added so far.
+        - num_pruned: the number of edges dropped so far to stay under max_edges.
+        - top_k: the number of heaviest edges kept for each movie, or None to keep every edge.
+        - min_weight: the minimum weight of a kept edge.
+        - min_support: the minimum number of users who rated both movies of a kept edge.
+        - max_edges: the maximum number of distinct edges held in sparse mode, or None for no maximum.
+        - pair_budget: the maximum number of pairs generated by one call of add_user or add_pair_product,
+            or None for no maximum.
+        - strategy: how pairs are sampled when there are more than pair_budget, 'uniform' or 'stratified'.
+        - num_skipped_pairs: the number of pairs that were not generated because of pair_budget.
+        - num_sampled_calls: the number of calls of add_user or add_pair_product that were sampled.
+
+    Private Instance Attributes:
+        - _weight_function: the function used to compute the weight of a pair from its two ratings.
+            It is called with NumPy arrays of ratings.
+        - _dense: the flattened num_movies x num_movies weight matrix, or None in sparse mode.
+        - _keys: the sorted unique pair keys accumulated so far in sparse mode.
+        - _weights: the summed weight of each key in _keys.
+        - _supports: the number of pairs added for each key in _keys (or for each entry of _dense),
+            or None if min_support is 0.
+        - _pending_keys: the buffered pair keys that have not been merged yet.
+        - _pending_weights: the weights of the buffered pair keys.
+        - _pending_count: the total number of buffered pairs.
+        - _generator: the random number generator used to sample pairs.
+
+    Representation Invariants:
+        - self.num_movies >= 0
+        - self.batch_size > 0
+        - self._dense is not None or self._keys.shape == self._weights.shape
+        - self.max_edges is None or self.max_edges > 0
+        - self.pair_budget is None or self.pair_budget > 0
+        - self.strategy in {'uniform', 'stratified'}
+    """
+    num_movies: int
+    batch_size: int
+    num_pairs: int
+    num_pruned: int
+    top_k: int | None
+    min_weight: float
+    min_support: int
+    max_edges: int | None
+    pair_budget: int | None
+    strategy: str
+    num_skipped_pairs: int
+    num_sampled_calls: int
+    _weight_function: Callable
+    _dense: np.ndarray | None
+    _keys: np.ndarray
+    _weights: np.ndarray
+    _supports: np.ndarray | None
+    _pending_keys: list[np.ndarray]
+    _pending_weights: list[np.ndarray]
+    _pending_count: int
+    _generator: np.random.Generator
+
+    def __init__(self, num_movies: int, weight_function: Callable, batch_size: int = 4000000,
+                 dense_limit: int = 1 << 22, top_k: int | None = None, min_weight: float = 0.0,
+                 min_support: int = 0, max_edges: int | None = None, pair_budget: int | None = None,
+                 strategy: str = 'uniform', seed: int = 0) -> None:
+        """Initialize an accumulator with no edges.
+
+        A dense weight matrix is used when num_movies ** 2 is at most dense_limit. seed seeds the sampling
+        of the pairs of heavy raters, so the same ratings always give the same edges.
+
+        Raise a ValueError if strategy is not 'uniform' or 'stratified'.
+        """
+        if strategy not in {'uniform', 'stratified'}:
+            raise ValueError
+        self.num_movies = num_movies
+        self.batch_size = batch_size
+        self.num_pairs, self.num_pruned = 0, 0
+        self.top_k, self.min_weight, self.min_support, self.max_edges = top_k, min_weight, min_support, max_edges
+        self.pair_budget, self.strategy = pair_budget, strategy
+        self.num_skipped_pairs, self.num_sampled_calls = 0, 0
+        self._generator = np.random.default_rng(seed)
+        self._weight_function = weight_function
+        if num_movies * num_movies <= dense_limit:
+            self._dense = np.zeros(num_movies * num_movies, dtype=np.float64)
+        else:
+            self._dense = None
+        self._keys = np.empty(0, dtype=np.int64)
+        self._weights = np.empty(0, dtype=np.float64)
+        self._supports = None
+        if min_support > 0:
+            self._supports = np.zeros(num_movies * num_movies if self._dense is not None else 0, dtype=np.int32)
+        self._pending_keys = []
+        self._pending_weights = []
+        self._pending_count = 0
+
+    def add_user(self, movie_ids: np.ndarray, ratings: np.ndarray) -> None:
+        """Add the contribution of every pair of movies rated by a single user.
+
+        movie_ids[i] is the id of a movie the user rated and ratings[i] is the rating given to it.
+        Pairs are generated in row blocks so a user with many ratings never materializes more than
+        about batch_size pairs at once. If there are more than pair_budget pairs, they are sampled.
+        """
+        k = len(movie_ids)
+        if k < 2:
+            return
+
+        if self.pair_budget is not None and k * (k - 1) // 2 > self.pair_budget:
+            self._sample_pairs(movie_ids, ratings, None, None)
+            return
+
+        if k * (k - 1) // 2 <= self.batch_size:
+            first, second = np.triu_indices(k, 1)
+            self.add_pairs(movie_ids[first], movie_ids[second], ratings[first], ratings[second])
+            return
+
+        for i in range(k - 1):
+            self.add_pairs(np.full(k - i - 1, movie_ids[i]), movie_ids[i + 1:],
+                           np.full(k - i - 1, ratings[i]), ratings[i + 1:])
+
+    def add_pair_product(self, movies1: np.ndarray, ratings1: np.ndarray, movies2: np.ndarray,
+                         ratings2: np.ndarray) -> None:
+        """Add the contribution of every pair of a movie in movies1 and a movie in movies2, all rated by
+        a single user, where ratings1 and ratings2 are the ratings given to them.
+
+        If there are more than pair_budget pairs, they are sampled.
+        """
+        if self.pair_budget is not None and len(movies1) * len(movies2) > self.pair_budget:
+            self._sample_pairs(movies1, ratings1, movies2, ratings2)
+        elif len(movies1) * len(movies2) <= self.batch_size:
+            self.add_pairs(np.repeat(movies1, len(movies2)), np.tile(movies2, len(movies1)),
+                           np.repeat(ratings1, len(movies2)), np.tile(ratings2, len(movies1)))
+        else:
+            for movie_id, rating in zip(movies1, ratings1):
+                self.add_pairs(np.full(len(movies2), movie_id), movies2, np.full(len(movies2), rating), ratings2)
+
+    def _sample_pairs(self, movies1: np.ndarray, ratings1: np.ndarray, movies2: np.ndarray | None,
+                      ratings2: np.ndarray | None) -> None:
+        """Add a sample of pair_budget pairs of the pairs of movies in movies1 if movies2 is None,
+        and of the pairs of a movie in movies1 and a movie in movies2 otherwise, following strategy."""
+        if self.strategy == 'uniform':
+            strata = [(np.arange(len(movies1)), None if movies2 is None else np.arange(len(movies2)))]
+        else:
+            values = np.unique(ratings1 if movies2 is None else np.concatenate((ratings1, ratings2))).tolist()
+            groups1 = [np.flatnonzero(ratings1 == value) for value in values]
+            if movies2 is None:
+                strata = [(groups1[a], None) if a == b else (groups1[a], groups1[b])
+                          for a in range(len(values)) for b in range(a, len(values))]
+            else:
+                groups2 = [np.flatnonzero(ratings2 == value) for value in values]
+                strata = [(group1, group2) for group1 in groups1 for group2 in groups2]
+
+        if movies2 is None:
+            movies2, ratings2 = movies1, ratings1
+            total = len(movies1) * (len(movies1) - 1) // 2
+        else:
+            total = len(movies1) * len(movies2)
+
+        # Split pair_budget between the strata in proportion to their sizes, by largest remainder, so the
+        # counts add up to exactly pair_budget
+        sizes = np.array([len(first) * (len(first) - 1) // 2 if second is None else len(first) * len(second)
+                          for first, second in strata], dtype=np.int64)
+        counts, remainders = np.divmod(self.pair_budget * sizes, total)
+        counts[np.argsort(-remainders, kind='stable')[:self.pair_budget - counts.sum()]] += 1
+
+        generated = 0
+        for (first, second), size, count in zip(strata, sizes.tolist(), counts.tolist()):
+            if count == 0:
+                continue
+
+            if count >= size and second is None:
+                i, j = np.triu_indices(len(first), 1)
+                i, j, scale = first[i], first[j], 1.0
+            elif count >= size:
+                i, j, scale = np.repeat(first, len(second)), np.tile(second, len(first)), 1.0
+            elif second is None:
+                i = self._generator.integers(len(first), size=count)
+                j = self._generator.integers(len(first) - 1, size=count)
+                i, j, scale = first[i], first[j + (j >= i)], size / count
+            else:
+                i = first[self._generator.integers(len(first), size=count)]
+                j = second[self._generator.integers(len(second), size=count)]
+                scale = size / count
+            self.add_pairs(movies1[i], movies2[j], ratings1[i], ratings2[j], scale)
+            generated += len(i)
+
+        self.num_skipped_pairs += total - generated
+        self.num_sampled_calls += 1
+
+    def add_pairs(self, movies1: np.ndarray, movies2: np.ndarray,
+                  ratings1: np.ndarray, ratings2: np.ndarray, scale: float = 1.0) -> None:
+        """Add the contribution of the pairs (movies1[i], movies2[i]) rated ratings1[i] and ratings2[i],
+        multiplied by scale.
+
+        Pairs of a movie with itself and pairs with a non-positive weight are ignored.
+        """
+        weights = np.asarray(self._weight_function(ratings1, ratings2), dtype=np.float64)
+        if scale != 1.0:
+            weights *= scale
+        keep = (movies1 != movies2) & (weights > 0)
+        movies1, movies2, weights = movies1[keep], movies2[keep], weights[keep]
+
+        low = np.minimum(movies1, movies2).astype(np.int64)
+        high = np.maximum(movies1, movies2).astype(np.int64)
+        self._pending_keys.append(low * self.num_movies + high)
+        self._pending_weights.append(weights)
+        self._pending_count += len(weights)
+        self.num_pairs += len(weights)
+
+        if self._pending_count >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Merge every buffered pair into the accumulated totals."""
+        if not self._pending_keys:
+            return
+
+        keys = np.concatenate(self._pending_keys)
+        weights = np.concatenate(self._pending_weights)
+        self._pending_keys, self._pending_weights, self._pending_count = [], [], 0
+
+        if self._dense is not None:
+            self._dense += np.bincount(keys, weights=weights, minlength=len(self._dense))
+            if self._supports is not None:
+                self._supports += np.bincount(keys, minlength=len(self._dense)).astype(np.int32)
+        else:
+            num_new = len(keys)
+            keys = np.concatenate((self._keys, keys))
+            weights = np.concatenate((self._weights, weights))
+            self._keys, inverse = np.unique(keys, return_inverse=True)
+            self._weights = np.bincount(inverse.ravel(), weights=weights, minlength=len(self._keys))
+            if self._supports is not None:
+                supports = np.concatenate((self._supports, np.ones(num_new, dtype=np.int32)))
+                self._supports = np.bincount(inverse.ravel(), weights=supports,
+                                             minlength=len(self._keys)).astype(np.int32)
+
+            if self.max_edges is not None and len(self._keys) > self.max_edges:
+                self._prune()
+
+    def _prune(self) -> None:
+        """Drop the lightest edges until at most half of max_edges remain, keeping the top 2 * top_k
+        edges of each movie first if top_k is not None."""
+        keep = np.ones(len(self._keys), dtype=np.bool_)
+        if self.top_k is not None:
+            keep = top_k_mask(self._keys // self.num_movies, self._keys % self.num_movies, self._weights,
+                              2 * self.top_k)
+
+        target = max(self.max_edges // 2, 1)
+        if np.count_nonzero(keep) > target:
+            kept_weights = self._weights[keep]
+            threshold = np.partition(kept_weights, len(kept_weights) - target)[len(kept_weights) - target]
+            keep &= self._weights >= threshold
+
+        self.num_pruned += len(keep) - int(np.count_nonzero(keep))
+        self._keys, self._weights = self._keys[keep], self._weights[keep]
+        if self._supports is not None:
+            self._supports = self._supports[keep]
+
+    def edges(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the accumulated edges as (movies1, movies2, weights) arrays with movies1 < movies2,
+        sparsified with top_k, min_weight and min_support.
+
+        The weights are rounded to WEIGHT_DECIMALS decimals first, so the same ratings give the same edges
+        whatever order they were added in."""
+        self.flush()
+
+        if self._dense is not None:
+            keys = np.flatnonzero(self._dense)
+            weights = np.round(self._dense[keys], WEIGHT_DECIMALS)
+        else:
+            keys, weights = self._keys, np.round(self._weights, WEIGHT_DECIMALS)
+
+        keep = weights >= self.min_weight
+        if self._supports is not None:
+            keep &= (self._supports[keys] if self._dense is not None else self._supports) >= self.min_support
+        keys, weights = keys[keep], weights[keep]
+        movies1, movies2 = keys // self.num_movies, keys % self.num_movies
+
+        if self.top_k is not None:
+            keep = top_k_mask(movies1, movies2, weights, self.top_k)
+            movies1, movies2, weights = movies1[keep], movies2[keep], weights[keep]
+
+        return movies1, movies2, weights
+
+
+def top_k_mask(movies1: np.ndarray, movies2: np.ndarray, weights: np.ndarray, k: int) -> np.ndarray:
+    """Return a mask of the edges (movies1[i], movies2[i]) with weight weights[i] that are among the k
+    heaviest edges of movies1[i] or of movies2[i]. Ties are broken by the order of the edges."""
+    endpoints = np.concatenate((movies1, movies2))
+    edge_ids = np.tile(np.arange(len(weights)), 2)
+    order = np.lexsort((-np.concatenate((weights, weights)), endpoints))
+    sorted_endpoints = endpoints[order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_endpoints[1:] != sorted_endpoints[:-1]])
+    ranks = np.arange(len(order)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(order)]))
+
+    mask = np.zeros(len(weights), dtype=np.bool_)
+    mask[edge_ids[order][ranks < k]] = True
+    return mask
+
+
+class RatingHistory:
+    """The ratings seen so far for every user, stored compactly so ratings can be streamed in chunks.
+
+    Each rating is packed into a single 32-bit integer (movie_id * 8 + rating). When a chunk of new
+    ratings is added, only the pairs involving at least one new rating are sent to the accumulator,
+    so streaming a file chunk by chunk adds exactly the same pairs as processing every user at once.
+    The history keeps every rating it is given, so it grows by 4 bytes per rating read.
+
+    Private Instance Attributes:
+        - _ratings: maps a user id to the packed array of every rating that user has given so far.
+        - _num_ratings: the total number of ratings stored.
+
+    Representation Invariants:
+        - self._num_ratings == sum(len(packed) for packed in self._ratings.values())
+    """
+    _ratings: dict[int, np.ndarray]
+    _num_ratings: int
+
+    def __init__(self) -> None:
+        """Initialize a history with no users."""
+        self._ratings = {}
+        self._num_ratings = 0
+
+    def add_chunk(self, accumulator: EdgeAccumulator, users: np.ndarray, movie_ids: np.ndarray,
+                  ratings: np.ndarray) -> None:
+        """Add a chunk of ratings, where user users[i] gave movie movie_ids[i] the rating ratings[i],
+        and add the contribution of every new pair of movies to the accumulator.
+
+        Preconditions:
+            - len(users) == len(movie_ids) == len(ratings)
+            - all(1 <= rating <= 5 for rating in ratings)
+        """
+        if len(users) == 0:
+            return
+
+        order = np.argsort(users, kind='stable')
+        users, movie_ids, ratings = users[order], movie_ids[order], ratings[order]
+        boundaries = np.flatnonzero(users[1:] != users[:-1]) + 1
+
+        for start, end in zip(np.concatenate(([0], boundaries)).tolist(),
+                              np.concatenate((boundaries, [len(users)])).tolist()):
+            self.add_user_ratings(accumulator, int(users[start]), movie_ids[start:end], ratings[start:end])
+
+    def add_user_ratings(self, accumulator: EdgeAccumulator, user: int, movie_ids: np.ndarray,
+                         ratings: np.ndarray) -> None:
+        """Add new ratings given by a single user and add the contribution of every new pair of movies
+        to the accumulator: the pairs among the new ratings and the pairs of a new and an old rating."""
+        accumulator.add_user(movie_ids, ratings)
+        packed = movie_ids.astype(np.int32) * 8 + ratings
+        previous = self._ratings.get(user)
+
+        if previous is not None:
+            accumulator.add_pair_product(movie_ids, ratings, previous >> 3, previous & 7)
+            packed = np.concatenate((previous, packed))
+
+        self._ratings[user] = packed
+        self._num_ratings += len(movie_ids)
+
+    def num_users(self) -> int:
+        """Return the number of users with at least one stored rating."""
+        return len(self._ratings)
+
+    def num_ratings(self) -> int:
+        """Return the total number of stored ratings."""
+        return self._num_ratings
+
+    def get_ratings(self, user: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (movie_ids, ratings) arrays of every rating given by user so far."""
+        packed = self._ratings.get(user, np.empty(0, dtype=np.int32))
+        return packed >> 3, packed & 7
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'numpy'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
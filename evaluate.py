@@ -0,0 +1,253 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This is the offline evaluation harness of the Netflix Movie Recommendation System. It measures both the
+quality and the speed of the recommendations, so that a change to the graph or the clustering can be
+judged on both.
+
+A fraction of the ratings of every user is held out, and the graph is built and clustered from the
+remaining ratings only. Each test user is then given recommendations seeded with their highest rated
+training movies, and these are compared with the movies they rated highly in the held-out ratings.
+The queries are answered by a pool of processes sharing the graph arrays, like batch_recommend, and the
+report contains precision@k and recall@k, the latency percentiles of a single query and the wall time of
+each step.
+
+Example:
+    python evaluate.py --holdout 0.2 --k 10 --save evaluation.json
+    python evaluate.py --method leiden --options '{"tolerance": 1e-4}'
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+from typing import Callable
+import numpy as np
+import batch_recommend
+import clustering
+import load_graph
+from metrics import percentile
+from recommender import SEARCHES
+from shared_arrays import SHARED_ARRAYS, SharedArrays, attach_shared_arrays
+
+EVALUATION_DIRECTORY = 'data/evaluation'
+
+
+def split_ratings(reviews_file_path: str, movies_dict: dict[int, str], train_file_path: str, holdout: float,
+                  rating_limit: int | None = None, seed: int = 0) -> dict[str, list[tuple[str, int]]]:
+    """Hold out each rating of the given movies in the reviews file with probability holdout, write the other
+    ratings to train_file_path in the same format, and return a mapping from each customer to the
+    (title, rating) tuples of their held-out ratings.
+
+    The ratings are counted towards rating_limit like in load_graph.load_movie_graph, and the split only
+    depends on seed and the order of the reviews file.
+    """
+    picker = random.Random(seed)
+    held_out = {}
+    with open(reviews_file_path, 'r') as reviews_file, open(train_file_path, 'w', newline='') as train_file:
+        writer = csv.writer(train_file)
+        counter = 0
+        for row in csv.reader(reviews_file):
+            customer, rating, _, movie = row
+            if int(movie) in movies_dict:
+                if picker.random() < holdout:
+                    held_out.setdefault(customer, []).append((movies_dict[int(movie)], int(rating)))
+                else:
+                    writer.writerow(row)
+                counter += 1
+
+                if counter == rating_limit:
+                    break
+
+    return held_out
+
+
+def make_queries(held_out: dict[str, list[tuple[str, int]]], train_ratings: dict[str, list[tuple[str, int]]],
+                 min_rating: int, max_seeds: int) -> list[tuple[str, list[str], set[str]]]:
+    """Return the (customer, seed titles, relevant titles) of every customer with at least one training and
+    one held-out rating of at least min_rating.
+
+    The seeds are up to max_seeds of the customer's highest rated training movies, and the relevant titles
+    are the held-out movies they rated at least min_rating that are not seeds.
+    """
+    queries = []
+    for customer, ratings in train_ratings.items():
+        liked = sorted((rating for rating in ratings if rating[1] >= min_rating), key=lambda rating: -rating[1])
+        seeds = list(dict.fromkeys(title for title, _ in liked))[:max_seeds]
+        relevant = {title for title, rating in held_out.get(customer, []) if rating >= min_rating} - set(seeds)
+        if seeds and relevant:
+            queries.append((customer, seeds, relevant))
+    return queries
+
+
+def evaluate_block(task: tuple[str, int, list[tuple[str, list[int]]]]) -> list[tuple[str, list[int], float]]:
+    """Return the (customer, recommended movie ids, seconds taken) of each (customer, seed movie ids) of a
+    block, for a (method, k, block) task.
+
+    This is run by the worker processes, after attach_shared_arrays has attached them to the arrays
+    returned by batch_recommend.recommendation_arrays for method, which are searched with
+    recommender.SEARCHES[method].
+    """
+    method, k, block = task
+    search = SEARCHES[method]
+    results = []
+    for customer, seeds in block:
+        start = time.perf_counter()
+        recommendations = search(SHARED_ARRAYS, seeds, k)
+        results.append((customer, recommendations, time.perf_counter() - start))
+    return results
+
+
+def score_recommendations(queries: list[tuple[str, list[str], set[str]]], recommendations: dict[str, list[str]],
+                          k: int) -> dict[str, float]:
+    """Return the mean precision@k and recall@k over the given queries, the fraction of queries with at least
+    one relevant recommendation, and the fraction of queries with any recommendation at all.
+
+    Precision@k is the number of relevant titles in the top k recommendations divided by k, and recall@k
+    is that number divided by the number of relevant titles.
+    """
+    precisions, recalls, hits, answered = [], [], 0, 0
+    for customer, _, relevant in queries:
+        found = len(relevant.intersection(recommendations[customer][:k]))
+        precisions.append(found / k)
+        recalls.append(found / len(relevant))
+        hits += found > 0
+        answered += len(recommendations[customer]) > 0
+
+    count = max(len(queries), 1)
+    return {f'precision@{k}': float(np.mean(precisions)) if precisions else 0.0,
+            f'recall@{k}': float(np.mean(recalls)) if recalls else 0.0,
+            'hit_rate': hits / count, 'coverage': answered / count}
+
+
+def run_evaluation(reviews_file_path: str, movies_file_path: str, holdout: float = 0.2, k: int = 10,
+                   movie_limit: int = 1000, rating_limit: int | None = 1000000, method: str = 'louvain',
+                   options: dict | None = None, recommender: str = 'index', max_users: int | None = 1000,
+                   min_rating: int = 4, max_seeds: int = 5, processes: int | None = None, block_size: int = 64,
+                   directory: str = EVALUATION_DIRECTORY, seed: int = 0,
+                   report_progress: Callable[[str], None] | None = None) -> dict[str, float]:
+    """Evaluate the recommendations of the graph built from the given datasets with a fraction holdout of the
+    ratings held out, and return the results.
+
+    The graph is built from the first movie_limit movies and rating_limit ratings and clustered with
+    clustering.cluster(graph, method, **options), where options defaults to three epochs for louvain.
+    At most max_users test users, chosen at random, are given k recommendations by the given recommender
+    ('index' or 'pagerank') on a pool of processes. The training ratings are written to a file in directory.
+
+    The results contain the quality metrics of score_recommendations, the number of test users, the
+    p50, p90, p99 and maximum latency of a single query in milliseconds, the throughput of the queries,
+    and the seconds taken by each step and in total.
+    """
+    if options is None:
+        options = {'epochs': 3} if method == 'louvain' else {}
+    report = report_progress if report_progress is not None else (lambda message: None)
+    picker = random.Random(seed)
+    start = time.perf_counter()
+    results = {}
+
+    report('Splitting the ratings...')
+    os.makedirs(directory, exist_ok=True)
+    train_file_path = os.path.join(directory, 'train_ratings.csv')
+    movies_dict = load_graph.read_movies(movies_file_path, movie_limit)
+    held_out = split_ratings(reviews_file_path, movies_dict, train_file_path, holdout, rating_limit, seed)
+    candidates = sorted(customer for customer, ratings in held_out.items()
+                        if any(rating >= min_rating for _, rating in ratings))
+    if max_users is not None and len(candidates) > max_users:
+        candidates = picker.sample(candidates, max_users)
+    train_ratings = load_graph.load_user_ratings(train_file_path, movies_dict, set(candidates))
+    queries = make_queries(held_out, train_ratings, min_rating, max_seeds)
+    results['split_seconds'] = time.perf_counter() - start
+
+    report('Building the graph...')
+    step = time.perf_counter()
+    graph = load_graph.load_movie_graph(train_file_path, movies_file_path, movie_limit, None)
+    results['build_seconds'] = time.perf_counter() - step
+
+    report('Clustering the graph...')
+    step = time.perf_counter()
+    clustering.cluster(graph, method, **options)
+    results['cluster_seconds'] = time.perf_counter() - step
+
+    report(f'Recommending for {len(queries)} users...')
+    step = time.perf_counter()
+    titles = list(graph.get_movies())
+    title_indices = {title: i for i, title in enumerate(titles)}
+    tasks = [(recommender, k, [(customer, [title_indices[title] for title in seeds])
+                               for customer, seeds, _ in queries[i:i + block_size]])
+             for i in range(0, len(queries), block_size)]
+    arrays = SharedArrays(batch_recommend.recommendation_arrays(graph, recommender))
+    try:
+        with Pool(processes or os.cpu_count() or 1, initializer=attach_shared_arrays,
+                  initargs=(arrays.specs,)) as pool:
+            answers = [answer for block in pool.map(evaluate_block, tasks) for answer in block]
+    finally:
+        arrays.close()
+    results['recommend_seconds'] = time.perf_counter() - step
+
+    recommendations = {customer: [titles[index] for index in indices] for customer, indices, _ in answers}
+    latencies = sorted(seconds * 1000 for _, _, seconds in answers)
+    results.update(score_recommendations(queries, recommendations, k))
+    results['users'] = len(queries)
+    if latencies:
+        results.update({'p50_ms': percentile(latencies, 50), 'p90_ms': percentile(latencies, 90),
+                        'p99_ms': percentile(latencies, 99), 'max_ms': latencies[-1]})
+    results['queries_per_second'] = len(queries) / results['recommend_seconds']
+    results['total_seconds'] = time.perf_counter() - start
+    return results
+
+
+def format_results(results: dict[str, float]) -> str:
+    """Return the given results with one line per metric."""
+    return '\n'.join(f'{name:<20}{value:>14.4f}' if isinstance(value, float) else f'{name:<20}{value:>14}'
+                     for name, value in results.items())
+
+
+def main(arguments: list[str] | None = None) -> int:
+    """Run the evaluation described by the given command line arguments and return the exit status."""
+    parser = argparse.ArgumentParser(description='Evaluate the quality and latency of the movie recommendations.')
+    parser.add_argument('--reviews', default='data/shuffled_user_ratings.csv')
+    parser.add_argument('--movies', default='data/movies.csv')
+    parser.add_argument('--movie-limit', type=int, default=1000)
+    parser.add_argument('--rating-limit', type=int, default=1000000)
+    parser.add_argument('--holdout', type=float, default=0.2)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--method', choices=list(clustering.CLUSTERING_METHODS), default='louvain')
+    parser.add_argument('--options', type=json.loads, help='the clustering options, as a JSON object')
+    parser.add_argument('--recommender', choices=['index', 'pagerank'], default='index')
+    parser.add_argument('--max-users', type=int, default=1000)
+    parser.add_argument('--min-rating', type=int, default=4)
+    parser.add_argument('--max-seeds', type=int, default=5)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--directory', default=EVALUATION_DIRECTORY)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='save the results to this JSON file')
+    args = parser.parse_args(arguments)
+
+    results = run_evaluation(args.reviews, args.movies, args.holdout, args.k, args.movie_limit, args.rating_limit,
+                             args.method, args.options, args.recommender,
+                             args.max_users, args.min_rating, args.max_seeds, args.processes,
+                             directory=args.directory, seed=args.seed,
+                             report_progress=lambda message: print(message, file=sys.stderr))
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump({'arguments': vars(args), 'results': results}, results_file, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        # the names (strs) of imported modules
+        'extra-imports': ['argparse', 'csv', 'json', 'os', 'random', 'sys', 'time', 'multiprocessing', 'typing',
+                          'numpy', 'batch_recommend', 'clustering', 'load_graph', 'metrics', 'recommender',
+                          'shared_arrays'],
+        'allowed-io': ['split_ratings', 'main'],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
+
+    sys.exit(main())
@@ -3,7 +3,13 @@
 This is a file for formatting the reviews dataset of the Netflix Movie Recommendation System.
 """
 import csv
+import math
+import os
 import random
+import shutil
+import tempfile
+from multiprocessing import Pool
+import numpy as np
 
 
 def create_formatted_dataset(file_path: str) -> None:
@@ -21,40 +27,100 @@ def create_formatted_dataset(file_path: str) -> None:
         csv.writer(write_file).writerows(shuffled_values)
 
 
-def create_large_formatted_dataset(file_path: str) -> None:
+# Approximate number of bytes of memory used by each byte of a line held in a Python list of bytes objects
+BYTES_PER_LINE_BYTE = 4
+
+
+def scatter_lines(file_path: str, bucket_paths: list[str], seed: int, block_size: int = 1 << 26) -> None:
+    """Append every line of the given file except the first (the header) to a uniformly random one of the
+    bucket files, reading the file in blocks of about block_size bytes.
+
+    Preconditions:
+        - file_path is the file path of a csv file with no newlines inside its fields
+        - bucket_paths != []
+    """
+    generator = np.random.default_rng(seed)
+    buckets = [open(path, 'wb') for path in bucket_paths]
+    try:
+        with open(file_path, 'rb') as read_file:
+            next(read_file)
+            while True:
+                lines = read_file.readlines(block_size)
+                if not lines:
+                    break
+                if not lines[-1].endswith(b'\n'):
+                    lines[-1] += b'\n'
+
+                assignment = generator.integers(len(buckets), size=len(lines))
+                order = np.argsort(assignment, kind='stable').tolist()
+                bounds = np.cumsum(np.bincount(assignment, minlength=len(buckets))).tolist()
+                start = 0
+                for bucket, end in zip(buckets, bounds):
+                    bucket.write(b''.join([lines[i] for i in order[start:end]]))
+                    start = end
+    finally:
+        for bucket in buckets:
+            bucket.close()
+
+
+def shuffle_bucket(task: tuple[str, int]) -> str:
+    """Shuffle the lines of the bucket file at path in place, where task is (path, seed), and return path.
+
+    This is run by the worker processes of create_large_formatted_dataset.
+    """
+    path, seed = task
+    with open(path, 'rb') as bucket:
+        lines = bucket.readlines()
+    random.Random(seed).shuffle(lines)
+    with open(path, 'wb') as bucket:
+        bucket.writelines(lines)
+    return path
+
+
+def create_large_formatted_dataset(file_path: str, output_path: str = 'data/shuffled_user_ratings.csv',
+                                   memory_limit_mb: int = 1024, processes: int | None = None,
+                                   seed: int | None = None) -> None:
     """This function takes in the file of a very large csv file and saves a formatted version of it to
-    data/shuffled_user_ratings.csv. This includes deleting the header of the file and shuffling
-    the rest of the lines. This is only to be used on functions with over a hundred million lines.
+    output_path. This includes deleting the header of the file and shuffling the rest of the lines.
+
+    The file is shuffled without being loaded into memory: each line is first sent to a random bucket
+    file, then the buckets are shuffled in parallel by a pool of processes and concatenated. Since every
+    line lands in each bucket with the same probability and each bucket is shuffled uniformly, the output
+    is a uniformly random permutation of the lines. There are enough buckets that all the processes
+    together hold at most about memory_limit_mb megabytes of lines at once. The same seed always produces
+    the same output for the same number of buckets.
 
     Preconditions:
-        - file_path is the file path of a csv file
-        - file_path is the file path of a file with over a hundred million lines
+        - file_path is the file path of a csv file with no newlines inside its fields
+        - memory_limit_mb > 0
     """
-    with open(file_path, 'r') as read_file, open('data/shuffled_user_ratings.csv', 'w', newline='') as write_file:
-        next(read_file)
-        reader, writer = csv.reader(read_file), csv.writer(write_file)
-        for _ in range(10):
-            values = []
-            index = 0
-            while index < 10000000:
-                values.append(next(reader))
-                index += 1
+    processes = processes or os.cpu_count() or 1
+    seed = seed if seed is not None else random.randrange(2 ** 32)
+    memory_limit = memory_limit_mb * 1024 * 1024
+    num_buckets = max(math.ceil(os.path.getsize(file_path) * BYTES_PER_LINE_BYTE * processes / memory_limit), 1)
 
-            random.shuffle(values)
-            writer.writerows(values)
+    temporary = tempfile.mkdtemp(prefix='shuffle_', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        bucket_paths = [os.path.join(temporary, f'bucket_{i}') for i in range(num_buckets)]
+        scatter_lines(file_path, bucket_paths, seed, max(memory_limit // BYTES_PER_LINE_BYTE // 2, 1 << 20))
 
-        values = []
-        for line in reader:
-            values.append(line)
-        random.shuffle(values)
-        writer.writerows(values)
+        tasks = [(path, seed + i + 1) for i, path in enumerate(bucket_paths)]
+        with Pool(min(processes, num_buckets)) as pool, open(output_path, 'wb') as write_file:
+            for path in pool.imap(shuffle_bucket, tasks):
+                with open(path, 'rb') as bucket:
+                    shutil.copyfileobj(bucket, write_file)
+                os.remove(path)
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
 
 
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['csv', 'random'],  # the names (strs) of imported modules
-        'allowed-io': ['create_formatted_dataset', 'create_large_formatted_dataset'],
+        # the names (strs) of imported modules
+        'extra-imports': ['csv', 'math', 'os', 'random', 'shutil', 'tempfile', 'multiprocessing', 'numpy'],
+        'allowed-io': ['create_formatted_dataset', 'create_large_formatted_dataset', 'scatter_lines',
+                       'shuffle_bucket'],
         'max-line-length': 120
     })
     create_large_formatted_dataset('data/user_ratings.csv')
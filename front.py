@@ -4,8 +4,12 @@ This is the frontend file of the Netflix Movie Recommendation System.
 It is responsible for setting up and handling the Tkinter GUI.
 """
 import tkinter as tk
-from typing import Any
+from tkinter import ttk
+from typing import Any, Callable
 import movie_class
+from recommender import RecommendationCache
+from search import TitleIndex
+from tasks import TaskRunner
 from visualization import visualize_weighted_graph
 
 
@@ -21,13 +25,23 @@ class TkinterApp:
     spinbox: tk.Spinbox
     selected_movies_listbox: tk.Listbox
     graph: movie_class.Network
+    recommender: RecommendationCache
+    title_index: TitleIndex
+    search_job: str | None
+    tasks: TaskRunner
     movie_recommendations: tk.Listbox
 
-    def __init__(self, window_root: tk.Tk, graph: movie_class.Network) -> None:
-        """Function to create our user interface window. Includes all tkinter widgets."""
+    def __init__(self, window_root: tk.Tk, graph: movie_class.Network, tasks: TaskRunner | None = None) -> None:
+        """Function to create our user interface window. Includes all tkinter widgets.
+
+        Recommendations and plots are computed by the given task runner, or by a new one if tasks is None."""
         self.graph = graph
+        self.tasks = tasks if tasks is not None else TaskRunner(window_root)
+        self.recommender = RecommendationCache(graph)
         self.selected_movies = set()
         self.list_of_movies = list(self.graph.get_movies().keys())
+        self.title_index = TitleIndex(self.list_of_movies)
+        self.search_job = None
         self.root = window_root
         self.root.configure(background='#3B3B3B')
 
@@ -95,18 +109,21 @@ class TkinterApp:
         if not self.movie_entry.get():  # make our dropdown empty at first
             return
         self.movies.delete(0, tk.END)  # clear dropdown menu so it updates
-        for movie in lst:
-            self.movies.insert(tk.END, movie)  # add each movie
+        if lst:
+            self.movies.insert(tk.END, *lst)  # add every movie at once
 
     def verify(self, event: tk.Event) -> Any:
-        """Match the user's text to movie titles in our movies.csv file"""
+        """Schedule a search for the user's text, replacing any search that has not run yet, so that
+        the titles are only searched once the user pauses typing."""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(150, self.search)
+
+    def search(self) -> None:
+        """Match the user's text to movie titles in our movies.csv file, showing the best matches"""
+        self.search_job = None
         if self.movie_entry.get() != '':  # if there is text,
-            lst = []
-            for i in self.list_of_movies:
-                correct = self.movie_entry.get()
-                if correct.lower() in i.lower():
-                    lst.append(i)  # add each corresponding movie to lst
-            self.modify(lst)  # update
+            self.modify(self.title_index.search(self.movie_entry.get()))  # update
 
     def display_recommendations(self, movie_list: list) -> None:
         """Add the recommendations to our GUI"""
@@ -114,12 +131,23 @@ class TkinterApp:
         for movie in movie_list[:int(self.spinbox.get())]:
             self.movie_recommendations.insert(0, movie)
 
+    def display_error(self, error: BaseException) -> None:
+        """Show that the recommendations could not be made in our GUI"""
+        self.movie_recommendations.delete(0, tk.END)
+        self.movie_recommendations.insert(0, f'Could not recommend movies: {error!r}')
+
     def recommend_movies(self) -> None:
         """Function to update recommended movies when recommended is pressed
-        and reset several visual elements."""
-        recommendations = self.graph.get_best_movies(list(self.selected_movies), 5)
-        self.display_recommendations(recommendations)
-        visualize_weighted_graph(self.graph, list(self.selected_movies))
+        and reset several visual elements.
+
+        The recommendations and the plot are computed in the background, and the recommendations
+        are displayed once they are ready, so the window never freezes."""
+        selected = list(self.selected_movies)
+        self.movie_recommendations.delete(0, tk.END)
+        self.movie_recommendations.insert(0, 'Finding recommendations...')
+        self.tasks.submit(self.recommender.get_best_movies, selected, 5,
+                          on_done=self.display_recommendations, on_error=self.display_error)
+        self.tasks.submit(visualize_weighted_graph, self.graph, selected)
         self.movie_entry.delete(0, tk.END)  # clear search bar
         self.selected_movies_listbox.delete(0, tk.END)  # clear selected movies box
         self.selected_movies = set()  # empty selected movies set
@@ -136,11 +164,62 @@ class TkinterApp:
         self.root.mainloop()
 
 
+class LoadingScreen:
+    """Class that shows a progress indicator in our window while the graph is loaded in the background,
+    then replaces it with the TkinterApp once the graph is ready."""
+    root: tk.Tk
+    tasks: TaskRunner
+    frame: tk.Frame
+    status: tk.Label
+    progress: ttk.Progressbar
+
+    def __init__(self, window_root: tk.Tk, loader: Callable[[Callable[[str], None]], movie_class.Network],
+                 tasks: TaskRunner | None = None) -> None:
+        """Show the loading screen and start loader on a worker thread.
+
+        loader is called with a function it can call from the worker thread to report its progress."""
+        self.root = window_root
+        self.tasks = tasks if tasks is not None else TaskRunner(window_root)
+        self.root.configure(background='#3B3B3B')
+        self.root.geometry("1920x1080")
+        self.root.title("Project 2 Window")
+
+        self.frame = tk.Frame(self.root, bg='#3B3B3B')
+        self.frame.pack(expand=True)
+        tk.Label(self.frame, text="Movie Recommender", font=('Courier New', 80), bg='#3B3B3B',
+                 fg="white").pack(padx=20, pady=20)
+        self.status = tk.Label(self.frame, text="Loading...", font=('Courier New', 25), bg='#3B3B3B', fg="white")
+        self.status.pack(pady=10)
+        self.progress = ttk.Progressbar(self.frame, mode='indeterminate', length=600)
+        self.progress.pack(pady=10)
+        self.progress.start(15)
+
+        self.tasks.submit(loader, lambda message: self.tasks.post(self.set_status, message),
+                          on_done=self.show_app, on_error=self.show_error)
+
+    def set_status(self, message: str) -> None:
+        """Display the given progress message"""
+        self.status.configure(text=message)
+
+    def show_error(self, error: BaseException) -> None:
+        """Display that the graph could not be loaded"""
+        self.progress.stop()
+        self.set_status(f"Could not load the graph: {error!r}")
+
+    def show_app(self, graph: movie_class.Network) -> None:
+        """Replace the loading screen with the movie recommender for the loaded graph"""
+        self.progress.stop()
+        self.frame.destroy()
+        TkinterApp(self.root, graph, self.tasks)
+
+
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['csv', 'tkinter', 'movie_class', 'visualization'],  # the names (strs) of imported modules
+        # the names (strs) of imported modules
+        'extra-imports': ['csv', 'tkinter', 'typing', 'movie_class', 'recommender', 'search', 'tasks',
+                          'visualization'],
         'allowed-io': [],  # the names (strs) of functions that call print/open/input
         'max-line-length': 120
     })
@@ -0,0 +1,274 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains functions for saving a built and clustered graph of the
+Netflix Movie Recommendation System to disk and loading it back, so the graph
+only has to be rebuilt when the datasets change.
+
+A snapshot is a directory of .npy arrays, which are memory-mapped when loaded,
+and a manifest.json file describing the datasets the graph was built from.
+"""
+import csv
+import json
+import os
+import shutil
+from typing import Callable
+import numpy as np
+import clustering
+import load_graph as graph_loader
+import movie_class
+
+SNAPSHOT_VERSION = 1
+
+
+def encode_strings(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Return the given strings as a (data, offsets) pair of arrays, where the UTF-8 encoding
+    of strings[i] is data[offsets[i]:offsets[i + 1]]."""
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(data: np.ndarray, offsets: np.ndarray) -> list[str]:
+    """Return the list of strings encoded by encode_strings as (data, offsets)."""
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+def network_to_arrays(graph: movie_class.Network) -> dict[str, np.ndarray]:
+    """Return the arrays describing the given graph in CSR form.
+
+    The neighbours of the i-th movie of graph.get_movies() are the movies indices[indptr[i]:indptr[i + 1]],
+    in the same order as in its neighbours dictionary, with the corresponding edge weights. The arrays of
+    a CompactNetwork are returned by its to_arrays method, without building any neighbours dictionary.
+    """
+    # Imported here, since compact_network itself imports this module
+    from compact_network import CompactNetwork
+    if isinstance(graph, CompactNetwork):
+        return graph.to_arrays()
+
+    movies = graph.get_movies()
+    titles = list(movies)
+    title_indices = {title: i for i, title in enumerate(titles)}
+    communities = list(graph.get_communities())
+    community_indices = {community: i for i, community in enumerate(communities)}
+
+    degrees = [movie.degree() for movie in movies.values()]
+    indptr = np.zeros(len(titles) + 1, dtype=np.int64)
+    np.cumsum(degrees, out=indptr[1:])
+    indices = np.fromiter((title_indices[neighbour.title] for movie in movies.values()
+                           for neighbour in movie.neighbours), dtype=np.int32, count=int(indptr[-1]))
+    weights = np.fromiter((weight for movie in movies.values() for weight in movie.neighbours.values()),
+                          dtype=np.float64, count=int(indptr[-1]))
+
+    title_data, title_offsets = encode_strings(titles)
+    community_data, community_offsets = encode_strings(communities)
+    return {
+        'title_data': title_data,
+        'title_offsets': title_offsets,
+        'indptr': indptr,
+        'indices': indices,
+        'weights': weights,
+        'sum_weights': np.array([getattr(movie, 'sum_weights', 0.0) for movie in movies.values()],
+                                dtype=np.float64),
+        'communities': np.array([community_indices[movie.community] for movie in movies.values()],
+                                dtype=np.int32),
+        'community_data': community_data,
+        'community_offsets': community_offsets,
+        'community_density': np.array([graph.get_communities()[community][1] for community in communities],
+                                      dtype=np.float64)
+    }
+
+
+def arrays_to_network(arrays: dict[str, np.ndarray]) -> movie_class.Network:
+    """Return the graph described by the arrays returned by network_to_arrays."""
+    graph = movie_class.Network()
+    titles = decode_strings(arrays['title_data'], arrays['title_offsets'])
+    for title in titles:
+        graph.add_movie(title)
+
+    movies = [graph.get_movies()[title] for title in titles]
+    indptr, indices, weights = arrays['indptr'].tolist(), arrays['indices'].tolist(), arrays['weights'].tolist()
+    for i, movie in enumerate(movies):
+        movie.neighbours = {movies[j]: weight for j, weight in
+                            zip(indices[indptr[i]:indptr[i + 1]], weights[indptr[i]:indptr[i + 1]])}
+
+    for movie, sum_weights in zip(movies, arrays['sum_weights'].tolist()):
+        movie.sum_weights = sum_weights
+
+    communities = decode_strings(arrays['community_data'], arrays['community_offsets'])
+    graph.set_communities({title: communities[i] for title, i in zip(titles, arrays['communities'].tolist())},
+                          dict(zip(communities, arrays['community_density'].tolist())))
+    return graph
+
+
+def source_signature(source_paths: list[str]) -> dict[str, list[int]]:
+    """Return the [size, modification time in nanoseconds] of each of the given files."""
+    signature = {}
+    for path in source_paths:
+        stat = os.stat(path)
+        signature[os.path.abspath(path)] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def save_graph(graph: movie_class.Network, directory: str, source_paths: list[str],
+               parameters: dict | None = None) -> None:
+    """Save a snapshot of graph to the given directory, replacing any previous snapshot.
+
+    source_paths are the datasets the graph was built from and parameters are the (JSON-serializable)
+    arguments used to build and cluster it. Both are recorded so load_graph can tell when the snapshot
+    is out of date. The edge weights are saved as 32-bit floats, like the weights of a CompactNetwork.
+    """
+    temporary = directory.rstrip('/\\') + '.tmp'
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+
+    # Sort the neighbours of every movie by index and store the weights as 32-bit floats, so CompactNetwork
+    # can use the mapped arrays without a copy
+    arrays = network_to_arrays(graph)
+    rows = np.repeat(np.arange(len(arrays['indptr']) - 1), np.diff(arrays['indptr']))
+    order = np.lexsort((arrays['indices'], rows))
+    arrays['indices'] = arrays['indices'][order]
+    arrays['weights'] = arrays['weights'][order].astype(np.float32)
+    for name, array in arrays.items():
+        np.save(os.path.join(temporary, name + '.npy'), array)
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'num_movies': len(arrays['sum_weights']),
+        'num_edges': len(arrays['indices']) // 2,
+        'sources': source_signature(source_paths),
+        'parameters': parameters or {}
+    }
+    with open(os.path.join(temporary, 'manifest.json'), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(temporary, directory)
+
+
+def is_snapshot_valid(directory: str, source_paths: list[str], parameters: dict | None = None) -> bool:
+    """Return whether directory holds a snapshot built from the current versions of source_paths
+    with the given parameters."""
+    try:
+        with open(os.path.join(directory, 'manifest.json'), 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        return (manifest['version'] == SNAPSHOT_VERSION
+                and manifest['sources'] == source_signature(source_paths)
+                and manifest['parameters'] == json.loads(json.dumps(parameters or {})))
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def load_arrays(directory: str) -> dict[str, np.ndarray]:
+    """Return the arrays of the snapshot in directory, memory-mapped rather than read into memory."""
+    arrays = {}
+    for file_name in os.listdir(directory):
+        if file_name.endswith('.npy'):
+            arrays[file_name[:-4]] = np.load(os.path.join(directory, file_name), mmap_mode='r')
+    return arrays
+
+
+def load_graph(directory: str, source_paths: list[str], parameters: dict | None = None) -> movie_class.Network | None:
+    """Return the graph saved in directory, or None if there is no snapshot there or if it is out of date
+    with respect to source_paths and parameters.
+
+    This builds a full movie_class.Network, which copies every edge of the snapshot into Movie objects, so
+    it is only needed when the edges will be modified. compact_network.CompactNetwork.load reads the same
+    snapshot without copying its arrays.
+    """
+    if not is_snapshot_valid(directory, source_paths, parameters):
+        return None
+    return arrays_to_network(load_arrays(directory))
+
+
+def load_or_build_graph(directory: str, reviews_file_path: str, movies_file_path: str, parameters: dict,
+                        report_progress: Callable[[str], None] | None = None,
+                        compact: bool = True) -> movie_class.Network:
+    """Return the graph saved in directory if it is up to date, and otherwise build, cluster and save a new graph.
+
+    parameters has the keys 'movie_limit' and 'rating_limit' (and optionally 'sparsification', 'sampling'
+    and 'approximate') passed to load_graph.load_movie_graph, and 'method' and 'options' passed to
+    clustering.cluster. If report_progress is not None, it is called with a description of each step.
+
+    If compact is True, the graph is returned as a compact_network.CompactNetwork over the memory-mapped
+    arrays of the snapshot, so no Movie objects are kept. Otherwise, it is returned as a movie_class.Network,
+    whose edges can be modified.
+    """
+    # Imported here, since compact_network itself imports this module
+    from compact_network import CompactNetwork
+
+    report = report_progress if report_progress is not None else (lambda message: None)
+    sources = [reviews_file_path, movies_file_path]
+
+    report("Loading the saved graph...")
+    if compact:
+        graph = CompactNetwork.load(directory, sources, parameters)
+    else:
+        graph = load_graph(directory, sources, parameters)
+
+    if graph is None:
+        report("Loading the graph... Please be patient :)")
+        graph = graph_loader.load_movie_graph(reviews_file_path, movies_file_path, parameters['movie_limit'],
+                                              parameters['rating_limit'],
+                                              sparsification=parameters.get('sparsification'),
+                                              sampling=parameters.get('sampling'),
+                                              approximate=parameters.get('approximate'))
+        report("Clustering the graph... Please be patient :)")
+        clustering.cluster(graph, parameters['method'], **parameters['options'])
+        report("Saving the graph...")
+        save_graph(graph, directory, sources, parameters)
+        if compact:
+            graph = CompactNetwork.load(directory, sources, parameters)
+
+    return graph
+
+
+def load_or_update_graph(directory: str, updated_directory: str, reviews_file_path: str, movies_file_path: str,
+                         updates_file_path: str, parameters: dict,
+                         report_progress: Callable[[str], None] | None = None) -> movie_class.Network:
+    """Return the graph of load_or_build_graph with the new ratings in the given updates file added to it
+    by load_graph.apply_rating_updates, as a compact_network.CompactNetwork.
+
+    Adding ratings changes the edges, so this needs the movie_class.Network of the snapshot in directory.
+    The updated graph is then saved to updated_directory, with the updates file recorded among its sources,
+    so the updates are only applied again once the updates file, a dataset or parameters change. The
+    snapshot in directory is left as it is, so a changed updates file is applied to the graph built from
+    the reviews file alone.
+    """
+    # Imported here, since compact_network itself imports this module
+    from compact_network import CompactNetwork
+
+    report = report_progress if report_progress is not None else (lambda message: None)
+    sources = [reviews_file_path, movies_file_path, updates_file_path]
+
+    report("Loading the saved graph...")
+    graph = CompactNetwork.load(updated_directory, sources, parameters)
+    if graph is not None:
+        return graph
+
+    graph = load_or_build_graph(directory, reviews_file_path, movies_file_path, parameters, report_progress,
+                                compact=False)
+    report("Applying the new ratings...")
+    with open(updates_file_path, 'r') as updates_file:
+        customers = {row[0] for row in csv.reader(updates_file) if row}
+    movies_dict = graph_loader.read_movies(movies_file_path, parameters['movie_limit'])
+    user_ratings = graph_loader.load_user_ratings(reviews_file_path, movies_dict, customers,
+                                                  parameters['rating_limit'])
+    graph_loader.apply_rating_updates(graph, updates_file_path, movies_dict, user_ratings)
+    report("Saving the graph...")
+    save_graph(graph, updated_directory, sources, parameters)
+    return CompactNetwork.load(updated_directory, sources, parameters)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        # the names (strs) of imported modules
+        'extra-imports': ['csv', 'json', 'os', 'shutil', 'typing', 'numpy', 'clustering', 'compact_network',
+                          'load_graph', 'movie_class'],
+        # the names (strs) of functions that call print/open/input
+        'allowed-io': ['save_graph', 'is_snapshot_valid', 'load_or_update_graph'],
+        'max-line-length': 120
+    })
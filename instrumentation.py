@@ -0,0 +1,197 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains the opt-in instrumentation of the Netflix Movie Recommendation System. It records
+counters (such as rows parsed or delta-Q evaluations), observed values (such as recommendation latencies
+or moves per epoch) and the time spent in each stage, and exports them as JSON or periodic log lines.
+
+Instrumentation is disabled by default. Hot code checks the ENABLED flag before recording anything, and
+counts in bulk (per chunk, per user or per vertex) rather than per pair, so it costs a single global
+lookup when disabled.
+
+Example:
+    instrumentation.enable()
+    graph = load_graph.load_movie_graph(...)
+    print(instrumentation.to_json())
+"""
+import functools
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Iterator
+from contextlib import contextmanager
+
+ENABLED = False
+
+_lock = threading.Lock()
+_counters: dict[str, float] = {}
+_observations: dict[str, deque] = {}
+_observation_counts: dict[str, int] = {}
+_timings: dict[str, list[float]] = {}
+MAX_OBSERVATIONS = 10000
+
+
+def enable() -> None:
+    """Start recording."""
+    global ENABLED
+    ENABLED = True
+
+
+def disable() -> None:
+    """Stop recording, keeping what has been recorded so far."""
+    global ENABLED
+    ENABLED = False
+
+
+def reset() -> None:
+    """Forget everything recorded so far."""
+    with _lock:
+        _counters.clear()
+        _observations.clear()
+        _observation_counts.clear()
+        _timings.clear()
+
+
+def increment(name: str, amount: float = 1) -> None:
+    """Add amount to the counter with the given name, if instrumentation is enabled."""
+    if ENABLED:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+
+def observe(name: str, value: float) -> None:
+    """Record one value of the quantity with the given name, if instrumentation is enabled.
+
+    Only the MAX_OBSERVATIONS most recent values are kept for the percentiles of the summary.
+    """
+    if ENABLED:
+        with _lock:
+            _observations.setdefault(name, deque(maxlen=MAX_OBSERVATIONS)).append(value)
+            _observation_counts[name] = _observation_counts.get(name, 0) + 1
+
+
+@contextmanager
+def timer(name: str) -> Iterator[None]:
+    """Record the time spent in the body of a with statement as one call of the stage with the given name,
+    if instrumentation is enabled."""
+    if not ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        with _lock:
+            _timings.setdefault(name, [0, 0.0])
+            _timings[name][0] += 1
+            _timings[name][1] += seconds
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Return a decorator recording every call of the decorated function as a call of the stage with
+    the given name, if instrumentation is enabled when it is called."""
+    def decorator(function: Callable) -> Callable:
+        """Return function, wrapped in a timer."""
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            """Call function, timing it if instrumentation is enabled."""
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with timer(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summary() -> dict[str, dict]:
+    """Return everything recorded so far.
+
+    The result maps 'counters' to the value of each counter, 'observations' to the count, mean, minimum,
+    p50, p90, p99 and maximum of each observed quantity, and 'timings' to the number of calls and total
+    and mean seconds of each stage.
+    """
+    with _lock:
+        counters = dict(_counters)
+        observations = {name: (sorted(values), _observation_counts[name]) for name, values in _observations.items()}
+        timings = {name: tuple(timing) for name, timing in _timings.items()}
+
+    observed = {}
+    for name, (values, count) in observations.items():
+        observed[name] = {'count': count, 'mean': sum(values) / len(values), 'min': values[0],
+                          'p50': values[(len(values) - 1) // 2], 'p90': values[int((len(values) - 1) * 0.9)],
+                          'p99': values[int((len(values) - 1) * 0.99)], 'max': values[-1]}
+
+    return {'counters': counters,
+            'observations': observed,
+            'timings': {name: {'calls': calls, 'seconds': seconds, 'mean_seconds': seconds / calls}
+                        for name, (calls, seconds) in timings.items()}}
+
+
+def to_json(indent: int | None = 2) -> str:
+    """Return the summary of everything recorded so far as JSON."""
+    return json.dumps(summary(), indent=indent, sort_keys=True)
+
+
+def export_json(file_path: str) -> None:
+    """Write the summary of everything recorded so far to the given file as JSON."""
+    with open(file_path, 'w') as summary_file:
+        summary_file.write(to_json())
+
+
+def log_line() -> str:
+    """Return the counters and stage timings recorded so far as a single line of text."""
+    recorded = summary()
+    parts = [f'{name}={value:g}' for name, value in sorted(recorded['counters'].items())]
+    parts += [f"{name}={timing['seconds']:.3f}s" for name, timing in sorted(recorded['timings'].items())]
+    parts += [f"{name}.p50={observed['p50']:g}" for name, observed in sorted(recorded['observations'].items())]
+    return ' '.join(parts)
+
+
+class PeriodicLogger:
+    """Writes a log line of everything recorded so far at a fixed interval, on a daemon thread.
+
+    Instance Attributes:
+        - interval: The number of seconds between two log lines.
+        - log: The function each log line is passed to.
+
+    Private Instance Attributes:
+        - _stopped: Set when the logger should stop.
+        - _thread: The thread writing the log lines.
+    """
+    interval: float
+    log: Callable[[str], Any]
+    _stopped: threading.Event
+    _thread: threading.Thread
+
+    def __init__(self, interval: float = 10.0, log: Callable[[str], Any] = print) -> None:
+        """Initialize and start a logger calling log with a log line every interval seconds."""
+        self.interval = interval
+        self.log = log
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop logging, after writing a final log line."""
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        """Write a log line every interval seconds until stop is called, and once more afterwards."""
+        while not self._stopped.wait(self.interval):
+            self.log(log_line())
+        self.log(log_line())
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        # the names (strs) of imported modules
+        'extra-imports': ['functools', 'json', 'threading', 'time', 'collections', 'typing', 'contextlib'],
+        'allowed-io': ['export_json'],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
@@ -4,7 +4,14 @@ This file contains functions for loading the graph used for
 the Netflix Movie Recommendation System.
 """
 import csv
+from typing import Iterator
+import numpy as np
+import clustering
+import edge_builder
+import instrumentation
+import minhash
 import movie_class
+import ratings_store
 
 
 def determine_edge_weight(rating1: int | float, rating2: int | float) -> float:
@@ -20,6 +27,7 @@ def determine_edge_weight(rating1: int | float, rating2: int | float) -> float:
 def modify_weighted_edge(graph: movie_class.Network, movies_rated: list) -> None:
     """Given a graph and a list of movies rated by a user, adjust the weight of the edges between each
     of the movies, or create a new weighted edge if one is not already present."""
+    created, incremented = 0, 0
     for i in range(len(movies_rated)):
         for j in range(i + 1, len(movies_rated)):
             movie1, movie2 = movies_rated[i][0], movies_rated[j][0]
@@ -27,48 +35,348 @@ def modify_weighted_edge(graph: movie_class.Network, movies_rated: list) -> None
 
             if weight > 0 and graph.adjacent(movie1, movie2):
                 graph.increment_edge(movie1, movie2, weight)
+                incremented += 1
             elif weight > 0:
                 graph.add_edge(movie1, movie2, weight)
+                created += 1
 
+    if instrumentation.ENABLED:
+        instrumentation.increment('load.pairs_generated', created + incremented)
+        instrumentation.increment('load.edges_created', created)
+        instrumentation.increment('load.edges_incremented', incremented)
+
+
+# Approximate number of bytes used by a parsed rating row, by a buffered pair of movies and by an
+# accumulated edge, including the temporary arrays created while they are converted and merged.
+BYTES_PER_ROW = 64
+BYTES_PER_PAIR = 64
+BYTES_PER_EDGE = 48
 
-def load_movie_graph(reviews_file_path: str, movies_file_path: str, movie_limit: int = 1000,
-                     rating_limit: int = 1000000) -> movie_class.Network:
-    """Returns a movie review weighted graph corresponding to the given datasets.
+
+def read_movies(movies_file_path: str, movie_limit: int) -> dict[int, str]:
+    """Return a mapping from the movie id of each of the first movie_limit movies of the given movies file
+    to its title.
 
     Preconditions:
-        - reviews_file_path is the path to a CSV file corresponding to the movie review data
-        of the format <custID, rating, date, movieID>. The file should also have no header.
         - movies_file_path is the path to a CSV file corresponding to the movie data
         of the format <movieId, releaseYear, title>. The file should have a header.
     """
-    graph = movie_class.Network()
-
-    with open(reviews_file_path, 'r') as reviews_file, open(movies_file_path, 'r') as movies_file:
+    with open(movies_file_path, 'r') as movies_file:
         next(movies_file)
         movies_dict: dict[int, str] = {}
         counter = 0
         for line in csv.reader(movies_file):
             movies_dict[int(line[0])] = line[2]
-            graph.add_movie(movies_dict[int(line[0])])
             counter += 1
             if counter == movie_limit:
                 break
 
-        user_ratings = {}
-        counter = 0
-        for line in csv.reader(reviews_file):
-            customer, rating, _, movie = line
+    return movies_dict
 
-            if int(movie) in movies_dict:
-                if customer not in user_ratings:
-                    user_ratings[customer] = []
 
-                user_ratings[customer].append((movies_dict[int(movie)], int(rating)))
+def load_movies(graph: movie_class.Network, movies_file_path: str, movie_limit: int) -> dict[int, str]:
+    """Add the first movie_limit movies of the given movies file to graph and return a mapping from
+    each of their movie ids to their title."""
+    movies_dict = read_movies(movies_file_path, movie_limit)
+    for title in movies_dict.values():
+        graph.add_movie(title)
+
+    return movies_dict
+
+
+def read_rating_chunks(reviews_file_path: str, movie_indices: dict[int, int], chunk_size: int,
+                       rating_limit: int | None = None) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Read the reviews file in chunks of at most chunk_size ratings and yield (users, movie_indices, ratings)
+    arrays for each chunk.
+
+    Ratings of movies that are not in movie_indices are skipped, and the movie id of every other rating is
+    replaced by movie_indices[movie_id]. Stop after rating_limit ratings have been read, unless rating_limit
+    is None.
+
+    Preconditions:
+        - reviews_file_path is the path to a CSV file corresponding to the movie review data
+        of the format <custID, rating, date, movieID>. The file should also have no header.
+        - chunk_size > 0
+    """
+    with open(reviews_file_path, 'r') as reviews_file:
+        users, movies, ratings = [], [], []
+        counter = 0
+        reader = csv.reader(reviews_file)
+        for customer, rating, _, movie in reader:
+            if int(movie) in movie_indices:
+                users.append(int(customer))
+                movies.append(movie_indices[int(movie)])
+                ratings.append(int(rating))
                 counter += 1
 
+                if len(users) == chunk_size:
+                    instrumentation.increment('load.ratings_kept', len(users))
+                    yield (np.array(users, dtype=np.int64), np.array(movies, dtype=np.int32),
+                           np.array(ratings, dtype=np.int8))
+                    users, movies, ratings = [], [], []
+
                 if counter == rating_limit:
                     break
 
+        instrumentation.increment('load.rows_parsed', reader.line_num)
+        if users:
+            instrumentation.increment('load.ratings_kept', len(users))
+            yield np.array(users, dtype=np.int64), np.array(movies, dtype=np.int32), np.array(ratings, dtype=np.int8)
+
+
+def read_store_chunks(store_directory: str, movie_indices: dict[int, int], chunk_size: int,
+                      rating_limit: int | None = None) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield the same (users, movie_indices, ratings) chunks as read_rating_chunks, from the ratings store
+    in store_directory instead of the CSV file it was converted from. The chunks are grouped by user
+    rather than in the order of the file.
+
+    Preconditions:
+        - ratings_store.is_store(store_directory)
+        - chunk_size > 0
+    """
+    store = ratings_store.RatingsStore(store_directory)
+    lookup = ratings_store.movie_lookup(movie_indices)
+    last_row = store.row_limit(lookup, rating_limit)
+
+    for start, end in store.user_blocks(chunk_size):
+        first, last = int(store.offsets[start]), int(store.offsets[end])
+        movies = ratings_store.movie_lookup_values(lookup, store.movies[first:last])
+        keep = movies >= 0
+        if last_row is not None:
+            keep &= store.rows[first:last] <= last_row
+        users = np.repeat(store.users[start:end], np.diff(store.offsets[start:end + 1]))
+        instrumentation.increment('load.ratings_kept', int(np.count_nonzero(keep)))
+        yield users[keep], movies[keep].astype(np.int32), np.asarray(store.ratings[first:last][keep])
+
+
+def approximate_weighted_edges(graph: movie_class.Network, reviews_file_path: str, movies_dict: dict[int, str],
+                               rating_limit: int | None = None, chunk_size: int = 1000000,
+                               options: dict[str, int | float] | None = None) -> None:
+    """Add approximate weighted edges to graph, found with minhash.approximate_edges from the ratings in
+    the given reviews file or ratings store, which is read once for the signatures and once for each batch
+    of candidate pairs. options are passed on to minhash.approximate_edges.
+
+    Every edge that is added has the weight it would have in the exact graph, but the edges between movies
+    whose sets of raters are not similar enough to be found by LSH are left out.
+
+    Preconditions:
+        - every title in movies_dict is a movie in graph
+        - chunk_size > 0
+    """
+    titles = list(graph.get_movies())
+    title_indices = {title: i for i, title in enumerate(titles)}
+    movie_indices = {movie_id: title_indices[title] for movie_id, title in movies_dict.items()}
+
+    read_chunks = read_store_chunks if ratings_store.is_store(reviews_file_path) else read_rating_chunks
+
+    def chunks() -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Return a new iterator over the chunks of ratings."""
+        return read_chunks(reviews_file_path, movie_indices, chunk_size, rating_limit)
+
+    movies1, movies2, weights = minhash.approximate_edges(len(titles), chunks, determine_edge_weight,
+                                                          **(options or {}))
+    graph.add_weighted_edges((titles[i], titles[j], weight)
+                             for i, j, weight in zip(movies1.tolist(), movies2.tolist(), weights.tolist()))
+    instrumentation.increment('load.edges_created', len(weights))
+
+
+def make_accumulator(num_movies: int, memory_limit: int, sparsification: dict[str, float] | None = None,
+                     sampling: dict[str, int | str] | None = None) -> edge_builder.EdgeAccumulator:
+    """Return an EdgeAccumulator for num_movies movies using at most about memory_limit bytes.
+
+    sparsification may have the keys 'top_k', 'min_weight', 'min_support' and 'max_edges' of the
+    EdgeAccumulator. If sparsification is not None but has no 'max_edges', the number of edges held while
+    accumulating is bounded by memory_limit, so the whole catalogue can be loaded with predictable memory.
+
+    sampling may have the keys 'pair_budget', 'strategy' and 'seed' of the EdgeAccumulator, to sample the
+    pairs of heavy raters.
+    """
+    options = dict(sparsification or {})
+    if sparsification is not None:
+        options.setdefault('max_edges', max(memory_limit // 4 // BYTES_PER_EDGE, 1))
+    options.update(sampling or {})
+    return edge_builder.EdgeAccumulator(num_movies, determine_edge_weight,
+                                        batch_size=max(memory_limit // 2 // BYTES_PER_PAIR, 1),
+                                        dense_limit=memory_limit // 4 // 16, **options)
+
+
+def stream_weighted_edges(graph: movie_class.Network, reviews_file_path: str, movies_dict: dict[int, str],
+                          rating_limit: int | None = None, chunk_size: int = 1000000,
+                          memory_limit_mb: int = 512, sparsification: dict[str, float] | None = None,
+                          sampling: dict[str, int | str] | None = None) -> edge_builder.RatingHistory:
+    """Add the weighted edges produced by modify_weighted_edge for every user in the reviews file to graph,
+    reading the file in chunks. Return the history of the ratings that were read.
+
+    Each chunk is converted to arrays of integer movie ids, and the pairs made by its new ratings are
+    accumulated in batches by an EdgeAccumulator. memory_limit_mb caps the memory used by the parsed
+    chunk, the buffered pairs and the dense weight matrix (if one is used). It is not a ceiling on the
+    whole load: the rating history keeps every rating read (4 bytes per rating, and every rating of a
+    single user at once), and a sparse accumulator keeps every distinct edge found so far unless
+    sparsification bounds them with max_edges.
+
+    sparsification and sampling configure the EdgeAccumulator, as described in make_accumulator. When
+    sampling is used, pair_budget bounds the pairs generated for each user in each chunk: the pairs among
+    its new ratings, and the pairs of its new and previous ratings.
+
+    Preconditions:
+        - every title in movies_dict is a movie in graph
+        - chunk_size > 0
+        - memory_limit_mb > 0
+    """
+    titles = list(graph.get_movies())
+    title_indices = {title: i for i, title in enumerate(titles)}
+    movie_indices = {movie_id: title_indices[title] for movie_id, title in movies_dict.items()}
+
+    memory_limit = memory_limit_mb * 1024 * 1024
+    accumulator = make_accumulator(len(titles), memory_limit, sparsification, sampling)
+    history = edge_builder.RatingHistory()
+    chunk_size = max(min(chunk_size, memory_limit // 4 // BYTES_PER_ROW), 1)
+
+    chunks = read_rating_chunks(reviews_file_path, movie_indices, chunk_size, rating_limit)
+    while True:
+        with instrumentation.timer('load.parse'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        with instrumentation.timer('load.pairs'):
+            history.add_chunk(accumulator, *chunk)
+
+    with instrumentation.timer('load.edges'):
+        movies1, movies2, weights = accumulator.edges()
+        graph.add_weighted_edges((titles[i], titles[j], weight)
+                                 for i, j, weight in zip(movies1.tolist(), movies2.tolist(), weights.tolist()))
+
+    instrumentation.increment('load.pairs_generated', accumulator.num_pairs)
+    instrumentation.increment('load.edges_created', len(weights))
+    instrumentation.increment('load.edges_incremented', accumulator.num_pairs - len(weights))
+    instrumentation.increment('load.edges_pruned', accumulator.num_pruned)
+    instrumentation.increment('load.pairs_skipped', accumulator.num_skipped_pairs)
+    instrumentation.increment('load.sampled_users', accumulator.num_sampled_calls)
+    return history
+
+
+def store_weighted_edges(graph: movie_class.Network, store_directory: str, movies_dict: dict[int, str],
+                         rating_limit: int | None = None, memory_limit_mb: int = 512,
+                         sparsification: dict[str, float] | None = None,
+                         sampling: dict[str, int | str] | None = None) -> None:
+    """Add the weighted edges produced by modify_weighted_edge for every user in the given ratings store
+    to graph, exactly as stream_weighted_edges does for the CSV file the store was converted from.
+
+    The ratings in the store are already grouped by user, so the pairs of each user are generated directly
+    from slices of the memory-mapped columns, without parsing text or keeping a rating history.
+    sparsification and sampling are used as in stream_weighted_edges, except that every user is in a
+    single call of add_user, so pair_budget bounds the total number of pairs generated for each user.
+
+    Preconditions:
+        - every title in movies_dict is a movie in graph
+        - ratings_store.is_store(store_directory)
+        - memory_limit_mb > 0
+    """
+    titles = list(graph.get_movies())
+    title_indices = {title: i for i, title in enumerate(titles)}
+    lookup = ratings_store.movie_lookup({movie_id: title_indices[title] for movie_id, title in movies_dict.items()})
+
+    memory_limit = memory_limit_mb * 1024 * 1024
+    accumulator = make_accumulator(len(titles), memory_limit, sparsification, sampling)
+    store = ratings_store.RatingsStore(store_directory)
+    last_row = store.row_limit(lookup, rating_limit)
+
+    for start, end in store.user_blocks(max(memory_limit // 4 // BYTES_PER_ROW, 1)):
+        with instrumentation.timer('load.read'):
+            first, last = int(store.offsets[start]), int(store.offsets[end])
+            movies = ratings_store.movie_lookup_values(lookup, store.movies[first:last])
+            keep = movies >= 0
+            if last_row is not None:
+                keep &= store.rows[first:last] <= last_row
+            bounds = np.cumsum(keep)[store.offsets[start + 1:end + 1] - first - 1].tolist()
+            movies, ratings = movies[keep], store.ratings[first:last][keep]
+            instrumentation.increment('load.ratings_kept', len(movies))
+
+        with instrumentation.timer('load.pairs'):
+            user_start = 0
+            for user_end in bounds:
+                if user_end - user_start >= 2:
+                    accumulator.add_user(movies[user_start:user_end], ratings[user_start:user_end])
+                user_start = user_end
+
+    with instrumentation.timer('load.edges'):
+        movies1, movies2, weights = accumulator.edges()
+        graph.add_weighted_edges((titles[i], titles[j], weight)
+                                 for i, j, weight in zip(movies1.tolist(), movies2.tolist(), weights.tolist()))
+
+    instrumentation.increment('load.pairs_generated', accumulator.num_pairs)
+    instrumentation.increment('load.edges_created', len(weights))
+    instrumentation.increment('load.edges_incremented', accumulator.num_pairs - len(weights))
+    instrumentation.increment('load.edges_pruned', accumulator.num_pruned)
+    instrumentation.increment('load.pairs_skipped', accumulator.num_skipped_pairs)
+    instrumentation.increment('load.sampled_users', accumulator.num_sampled_calls)
+
+
+def load_movie_graph(reviews_file_path: str, movies_file_path: str, movie_limit: int = 1000,
+                     rating_limit: int | None = 1000000, vectorized: bool = True, chunk_size: int = 1000000,
+                     memory_limit_mb: int = 512, sparsification: dict[str, float] | None = None,
+                     sampling: dict[str, int | str] | None = None,
+                     approximate: dict[str, int | float] | None = None) -> movie_class.Network:
+    """Returns a movie review weighted graph corresponding to the given datasets.
+
+    If vectorized is True, the reviews file is streamed in chunks of chunk_size ratings and the edges are
+    built with stream_weighted_edges, where memory_limit_mb bounds the parsed chunk, the buffered pairs and
+    the dense weight matrix. It does not bound the rating history (4 bytes per rating) or, unless
+    sparsification is given, the accumulated edges of a sparse accumulator (about BYTES_PER_EDGE bytes per
+    distinct edge), which both grow with the data. Otherwise, every rating is loaded first and
+    modify_weighted_edge is called for every user.
+    If rating_limit is None, every rating in the reviews file is used.
+
+    reviews_file_path may also be the directory of a ratings store made by ratings_store.convert_ratings,
+    in which case the edges are built from the store with store_weighted_edges and vectorized and chunk_size
+    are ignored. This builds the same graph as the CSV file the store was converted from.
+
+    If sparsification is not None, the edges are sparsified while they are accumulated, and if sampling is
+    not None, the pairs of heavy raters are sampled, as described in make_accumulator. These are only
+    supported when vectorized is True or a ratings store is used, and a ValueError is raised otherwise.
+
+    If approximate is not None, the edges are found with approximate_weighted_edges, which is passed
+    approximate as its options, instead of from every pair of movies rated by each user. sparsification
+    and sampling are then ignored.
+
+    Preconditions:
+        - reviews_file_path is the path to a CSV file corresponding to the movie review data
+        of the format <custID, rating, date, movieID>. The file should also have no header.
+        - movies_file_path is the path to a CSV file corresponding to the movie data
+        of the format <movieId, releaseYear, title>. The file should have a header.
+    """
+    if (sparsification is not None or sampling is not None) and not vectorized \
+            and not ratings_store.is_store(reviews_file_path):
+        raise ValueError
+
+    graph = movie_class.Network()
+    movies_dict = load_movies(graph, movies_file_path, movie_limit)
+
+    if approximate is not None:
+        approximate_weighted_edges(graph, reviews_file_path, movies_dict, rating_limit, chunk_size, approximate)
+    elif ratings_store.is_store(reviews_file_path):
+        store_weighted_edges(graph, reviews_file_path, movies_dict, rating_limit, memory_limit_mb, sparsification,
+                             sampling)
+    elif vectorized:
+        stream_weighted_edges(graph, reviews_file_path, movies_dict, rating_limit, chunk_size, memory_limit_mb,
+                              sparsification, sampling)
+    else:
+        with open(reviews_file_path, 'r') as reviews_file:
+            user_ratings = {}
+            counter = 0
+            for line in csv.reader(reviews_file):
+                customer, rating, _, movie = line
+
+                if int(movie) in movies_dict:
+                    if customer not in user_ratings:
+                        user_ratings[customer] = []
+
+                    user_ratings[customer].append((movies_dict[int(movie)], int(rating)))
+                    counter += 1
+
+                    if counter == rating_limit:
+                        break
+
         for user in user_ratings:
             modify_weighted_edge(graph, user_ratings[user])
 
@@ -77,10 +385,56 @@ def load_movie_graph(reviews_file_path: str, movies_file_path: str, movie_limit:
     return graph
 
 
+def load_user_ratings(reviews_file_path: str, movies_dict: dict[int, str], customers: set[str] | None = None,
+                      rating_limit: int | None = None) -> dict[str, list[tuple[str, int]]]:
+    """Return a mapping from each customer to the list of (title, rating) tuples of the ratings they gave
+    in the reviews file, counting the ratings towards rating_limit exactly like load_movie_graph.
+
+    If customers is not None, only the ratings of the given customers are kept, so the ratings of the
+    customers in a batch of updates can be found without holding every rating in memory.
+    """
+    user_ratings = {}
+    with open(reviews_file_path, 'r') as reviews_file:
+        counter = 0
+        for customer, rating, _, movie in csv.reader(reviews_file):
+            if int(movie) in movies_dict:
+                if customers is None or customer in customers:
+                    user_ratings.setdefault(customer, []).append((movies_dict[int(movie)], int(rating)))
+                counter += 1
+
+                if counter == rating_limit:
+                    break
+
+    return user_ratings
+
+
+def apply_rating_updates(graph: movie_class.Network, updates_file_path: str, movies_dict: dict[int, str],
+                         user_ratings: dict[str, list[tuple[str, int]]], epochs: int = 1) -> set[str]:
+    """Add the new ratings in the given updates file to graph and update its communities, and return
+    the titles of the movies whose edges changed.
+
+    Only the edges of the rated movies change (see Network.ingest_ratings), and community moves are only
+    re-run for those movies and their neighbours (see clustering.recluster). user_ratings maps each customer
+    in the updates file to the ratings they gave before, as returned by load_user_ratings, and is updated.
+
+    Preconditions:
+        - updates_file_path is the path to a CSV file in the same format as the reviews file
+    """
+    with open(updates_file_path, 'r') as updates_file:
+        touched = graph.ingest_ratings(csv.reader(updates_file), movies_dict, user_ratings, determine_edge_weight)
+
+    clustering.recluster(graph, touched, epochs)
+    return touched
+
+
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['csv, movie_class'],  # the names (strs) of imported modules
-        'allowed-io': ['load_movie_graph'],  # the names (strs) of functions that call print/open/input
+        # the names (strs) of imported modules
+        'extra-imports': ['csv', 'typing', 'numpy', 'clustering', 'edge_builder', 'instrumentation',
+                          'minhash', 'movie_class', 'ratings_store'],
+        # the names (strs) of functions that call print/open/input
+        'allowed-io': ['read_movies', 'read_rating_chunks', 'load_movie_graph', 'load_user_ratings',
+                       'apply_rating_updates'],
         'max-line-length': 120
     })
@@ -2,15 +2,41 @@
 
 This is the main file of the Netflix Movie Recommendation System.
 """
-from load_graph import load_movie_graph
-from clustering import louvain
+import os
+from typing import Callable
+import graph_cache
+import movie_class
 import tkinter as tk
-from front import TkinterApp
+from front import LoadingScreen
 
+REVIEWS_FILE = 'data/shuffled_user_ratings.csv'
+MOVIES_FILE = 'data/movies.csv'
+CACHE_DIRECTORY = 'data/cache/graph'
+# One of clustering.CLUSTERING_METHODS, and the options passed to it
+CLUSTERING_METHOD = 'louvain'
+CLUSTERING_OPTIONS = {'epochs': 3}
+PARAMETERS = {'movie_limit': 1000, 'rating_limit': 1000000, 'method': CLUSTERING_METHOD,
+              'options': CLUSTERING_OPTIONS}
+# New ratings in the format of REVIEWS_FILE, added to the graph on startup if this file exists
+UPDATES_FILE = 'data/rating_updates.csv'
+UPDATED_CACHE_DIRECTORY = 'data/cache/updated_graph'
+
+
+def load_or_build_graph(report_progress: Callable[[str], None]) -> movie_class.Network:
+    """Return the saved graph if it is up to date, and otherwise build, cluster and save a new graph.
+    report_progress is called with a description of each step.
+
+    If UPDATES_FILE exists, its ratings are added to the graph with load_graph.apply_rating_updates, which
+    only reclusters the movies they touch, and the result is saved to UPDATED_CACHE_DIRECTORY, so the
+    updates are only applied again when UPDATES_FILE changes.
+    """
+    if not os.path.exists(UPDATES_FILE):
+        return graph_cache.load_or_build_graph(CACHE_DIRECTORY, REVIEWS_FILE, MOVIES_FILE, PARAMETERS,
+                                               report_progress)
+    return graph_cache.load_or_update_graph(CACHE_DIRECTORY, UPDATED_CACHE_DIRECTORY, REVIEWS_FILE, MOVIES_FILE,
+                                            UPDATES_FILE, PARAMETERS, report_progress)
 
 if __name__ == "__main__":
-    print("Loading GUI... Please be patient :) The graph is being loaded and clustered.")
-    graph = load_movie_graph('data/shuffled_user_ratings.csv', 'data/movies.csv')
-    louvain(graph, 3)
-    app = TkinterApp(tk.Tk(), graph)
-    app.run()
+    root = tk.Tk()
+    LoadingScreen(root, load_or_build_graph)
+    root.mainloop()
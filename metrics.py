@@ -0,0 +1,21 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains the summary statistics shared by the server, the benchmark suite and the evaluation
+harness of the Netflix Movie Recommendation System, so that their latency percentiles are computed the
+same way.
+"""
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Return the p-th percentile of the given non-empty sorted values, using the nearest-rank method."""
+    rank = max(int(len(sorted_values) * p / 100 + 0.5) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': [],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
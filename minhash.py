@@ -0,0 +1,264 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains the approximate graph builder of the Netflix Movie Recommendation System. Instead of
+generating every pair of movies rated by each user, it finds the pairs of movies with similar sets of
+raters using MinHash signatures and locality-sensitive hashing (LSH), and only computes the weights of
+those candidate pairs.
+
+The MinHash signature of a movie is the minimum of each of num_hashes hash functions over its raters, so
+two movies agree on each entry of their signatures with probability equal to the Jaccard similarity of
+their rater sets. The signatures are split into bands, and two movies become candidates when all the
+entries of one of their bands agree. The weight of a candidate pair is then computed exactly, from the
+raters the two movies have in common, as modify_weighted_edge would.
+
+The ratings are never all held in memory: the signatures are computed in a first pass over the chunks
+of ratings, and the candidate weights in further passes that each keep only the ratings of the movies
+of a batch of candidate pairs.
+"""
+from typing import Callable, Iterable, Iterator
+import numpy as np
+import instrumentation
+
+MAX_HASH = np.iinfo(np.uint64).max
+
+
+def mix(values: np.ndarray) -> np.ndarray:
+    """Return the splitmix64 hash of each of the given unsigned 64-bit integers."""
+    with np.errstate(over='ignore'):
+        values = values + np.uint64(0x9E3779B97F4A7C15)
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class MinHashBuilder:
+    """Computes the MinHash signatures of the rater sets of movies identified by integer ids, and counts
+    the ratings of each movie, from ratings streamed in chunks.
+
+    Instance Attributes:
+        - num_movies: The number of movie ids, so every id is in range(num_movies).
+        - num_hashes: The length of each signature.
+        - signatures: The num_movies x num_hashes array of signatures. The row of a movie with no
+            ratings is MAX_HASH everywhere.
+        - counts: The number of ratings of each movie added so far.
+
+    Private Instance Attributes:
+        - _seeds: The seed of each hash function.
+        - _block_size: The number of ratings hashed at once.
+
+    Representation Invariants:
+        - self.signatures.shape == (self.num_movies, self.num_hashes)
+        - self.counts.shape == (self.num_movies,)
+    """
+    num_movies: int
+    num_hashes: int
+    signatures: np.ndarray
+    counts: np.ndarray
+    _seeds: np.ndarray
+    _block_size: int
+
+    def __init__(self, num_movies: int, num_hashes: int = 64, seed: int = 0, block_size: int = 1 << 16) -> None:
+        """Initialize a builder with no ratings."""
+        self.num_movies = num_movies
+        self.num_hashes = num_hashes
+        self.signatures = np.full((num_movies, num_hashes), MAX_HASH, dtype=np.uint64)
+        self.counts = np.zeros(num_movies, dtype=np.int64)
+        self._seeds = mix(np.arange(num_hashes, dtype=np.uint64) + np.uint64(seed) * np.uint64(num_hashes))
+        self._block_size = block_size
+
+    def add_chunk(self, users: np.ndarray, movies: np.ndarray) -> None:
+        """Add the ratings where user users[i] rated movie movies[i]."""
+        self.counts += np.bincount(movies, minlength=self.num_movies)
+        for start in range(0, len(users), self._block_size):
+            block_users = users[start:start + self._block_size].astype(np.uint64)
+            block_movies = movies[start:start + self._block_size]
+
+            order = np.argsort(block_movies, kind='stable')
+            sorted_movies = block_movies[order]
+            starts = np.flatnonzero(np.r_[True, sorted_movies[1:] != sorted_movies[:-1]])
+            hashes = mix(block_users[order][:, None] ^ self._seeds[None, :])
+            minimums = np.minimum.reduceat(hashes, starts, axis=0)
+            unique_movies = sorted_movies[starts]
+            self.signatures[unique_movies] = np.minimum(self.signatures[unique_movies], minimums)
+
+    def candidates(self, bands: int, max_bucket_size: int = 100) -> np.ndarray:
+        """Return the sorted unique keys (movie1 * num_movies + movie2, with movie1 < movie2) of the pairs
+        of movies whose signatures agree on every entry of at least one of the given number of bands.
+
+        A bucket of more than max_bucket_size movies, which is typical of very popular movies, does not
+        produce every pair of its movies: each movie is only paired with the next max_bucket_size - 1
+        movies of the bucket, in an order given by the hash of its band.
+
+        Preconditions:
+            - self.num_hashes % bands == 0
+        """
+        rows = self.num_hashes // bands
+        active = np.flatnonzero(self.signatures[:, 0] != MAX_HASH)
+        keys = []
+        for band in range(bands):
+            band_hashes = np.zeros(len(active), dtype=np.uint64)
+            for column in range(band * rows, (band + 1) * rows):
+                band_hashes = mix(band_hashes ^ self.signatures[active, column])
+
+            order = np.lexsort((mix(active.astype(np.uint64) ^ band_hashes), band_hashes))
+            sorted_hashes, sorted_movies = band_hashes[order], active[order]
+            bounds = np.flatnonzero(np.r_[True, sorted_hashes[1:] != sorted_hashes[:-1], True])
+            for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                if end - start >= 2:
+                    keys.append(bucket_pairs(sorted_movies[start:end], max_bucket_size, self.num_movies))
+
+        return np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+
+    def similarities(self, keys: np.ndarray) -> np.ndarray:
+        """Return the estimated Jaccard similarity of the rater sets of each pair of movies in keys: the
+        fraction of the entries of their signatures that agree."""
+        first, second = keys // self.num_movies, keys % self.num_movies
+        return (self.signatures[first] == self.signatures[second]).mean(axis=1)
+
+
+def bucket_pairs(members: np.ndarray, max_bucket_size: int, num_movies: int) -> np.ndarray:
+    """Return the keys of the pairs of movies in a bucket with the given members: every pair if there are
+    at most max_bucket_size members, and otherwise the pairs of each member and the next
+    max_bucket_size - 1 members."""
+    members = members.astype(np.int64)
+    if len(members) <= max_bucket_size:
+        first, second = np.triu_indices(len(members), 1)
+    else:
+        offsets = np.arange(1, max_bucket_size)
+        first = np.repeat(np.arange(len(members)), len(offsets))
+        second = first + np.tile(offsets, len(members))
+        first, second = first[second < len(members)], second[second < len(members)]
+
+    low = np.minimum(members[first], members[second])
+    high = np.maximum(members[first], members[second])
+    return low * num_movies + high
+
+
+def candidate_batches(first: np.ndarray, second: np.ndarray, counts: np.ndarray,
+                      max_ratings: int | None) -> Iterator[np.ndarray]:
+    """Yield the indices of consecutive batches of the candidate pairs (first[i], second[i]), such that the
+    movies of each batch have at most max_ratings ratings in total, where movie m has counts[m] ratings.
+
+    A batch with a single pair may go over max_ratings, since both of its movies are needed. If max_ratings
+    is None, every pair is in a single batch.
+    """
+    if max_ratings is None:
+        if len(first) > 0:
+            yield np.arange(len(first))
+        return
+
+    in_batch = np.zeros(len(counts), dtype=np.bool_)
+    start, total = 0, 0
+    for i, (movie1, movie2) in enumerate(zip(first.tolist(), second.tolist())):
+        added = (0 if in_batch[movie1] else counts[movie1]) + (0 if in_batch[movie2] else counts[movie2])
+        if total + added > max_ratings and i > start:
+            yield np.arange(start, i)
+            in_batch[:] = False
+            start, total = i, 0
+            added = counts[movie1] + counts[movie2]
+
+        in_batch[movie1] = in_batch[movie2] = True
+        total += added
+
+    if len(first) > start:
+        yield np.arange(start, len(first))
+
+
+def candidate_weights(keys: np.ndarray, num_movies: int,
+                      chunks: Callable[[], Iterable[tuple[np.ndarray, np.ndarray, np.ndarray]]],
+                      weight_function: Callable, counts: np.ndarray, max_ratings: int | None = None) -> np.ndarray:
+    """Return the weight of each pair of movies in keys: the sum of the positive weights
+    weight_function(rating1, rating2) over every rating1 of the first movie and rating2 of the second movie
+    given by the same user, as in the exact graph.
+
+    The pairs are split by candidate_batches so that at most about max_ratings ratings are held at once,
+    where counts is the number of ratings of each movie, and the chunks returned by chunks() are read once
+    for each batch, keeping only the ratings of the movies of the batch.
+    """
+    first, second = keys // num_movies, keys % num_movies
+    result = np.zeros(len(keys), dtype=np.float64)
+    passes = 0
+    for batch in candidate_batches(first, second, counts, max_ratings):
+        needed = np.zeros(num_movies, dtype=np.bool_)
+        needed[first[batch]] = needed[second[batch]] = True
+        kept = [(users[needed[movies]], movies[needed[movies]], ratings[needed[movies]])
+                for users, movies, ratings in chunks()]
+        passes += 1
+
+        users = np.concatenate([chunk[0] for chunk in kept]) if kept else np.empty(0, dtype=np.int64)
+        movies = np.concatenate([chunk[1] for chunk in kept]) if kept else np.empty(0, dtype=np.int32)
+        ratings = np.concatenate([chunk[2] for chunk in kept]) if kept else np.empty(0, dtype=np.int8)
+        order = np.lexsort((users, movies))
+        users, ratings = users[order], ratings[order]
+        indptr = np.searchsorted(movies[order], np.arange(num_movies + 1))
+
+        for i in batch.tolist():
+            start1, end1 = indptr[first[i]], indptr[first[i] + 1]
+            start2, end2 = indptr[second[i]], indptr[second[i] + 1]
+            rows1, rows2 = common_rater_rows(users[start1:end1], users[start2:end2])
+            pair_weights = np.asarray(weight_function(ratings[start1 + rows1], ratings[start2 + rows2]),
+                                      dtype=np.float64)
+            result[i] = pair_weights[pair_weights > 0].sum()
+
+    instrumentation.increment('load.candidate_passes', passes)
+    return result
+
+
+def common_rater_rows(users1: np.ndarray, users2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the arrays (rows1, rows2) of every pair of rows with users1[rows1[i]] == users2[rows2[i]].
+
+    Both users1 and users2 must be sorted. A user may appear more than once in either array, in which case
+    every combination of their rows is returned.
+    """
+    starts = np.searchsorted(users2, users1, 'left')
+    matches = np.searchsorted(users2, users1, 'right') - starts
+    offsets = np.cumsum(matches) - matches
+    rows1 = np.repeat(np.arange(len(users1)), matches)
+    rows2 = np.repeat(starts - offsets, matches) + np.arange(int(matches.sum()))
+    return rows1, rows2
+
+
+def approximate_edges(num_movies: int, chunks: Callable[[], Iterable[tuple[np.ndarray, np.ndarray, np.ndarray]]],
+                      weight_function: Callable, num_hashes: int = 64, bands: int = 16, max_bucket_size: int = 100,
+                      min_similarity: float = 0.0, seed: int = 0,
+                      max_ratings: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the (movies1, movies2, weights) arrays of the approximate edges between num_movies movies,
+    from the (users, movies, ratings) chunks of ratings, with movies1 < movies2.
+
+    chunks is called to start each pass over the ratings, and must give the same chunks every time. The
+    first pass computes the signatures, and the candidate weights are then computed by candidate_weights,
+    holding at most about max_ratings ratings at once (or every rating of a candidate movie if max_ratings
+    is None).
+
+    Only the candidate pairs found by LSH with the given number of bands whose estimated Jaccard similarity
+    is at least min_similarity are weighted. With r = num_hashes // bands rows per band, a pair with Jaccard
+    similarity s becomes a candidate with probability 1 - (1 - s ** r) ** bands.
+
+    Preconditions:
+        - num_hashes % bands == 0
+        - max_bucket_size >= 2
+    """
+    builder = MinHashBuilder(num_movies, num_hashes, seed)
+    with instrumentation.timer('load.minhash'):
+        for users, movies, _ in chunks():
+            builder.add_chunk(users, movies)
+
+    with instrumentation.timer('load.lsh'):
+        keys = builder.candidates(bands, max_bucket_size)
+        if min_similarity > 0 and len(keys) > 0:
+            keys = keys[builder.similarities(keys) >= min_similarity]
+    instrumentation.increment('load.lsh_candidates', len(keys))
+
+    with instrumentation.timer('load.candidate_weights'):
+        weights = candidate_weights(keys, num_movies, chunks, weight_function, builder.counts, max_ratings)
+    keys, weights = keys[weights > 0], weights[weights > 0]
+    return keys // num_movies, keys % num_movies, weights
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'numpy', 'instrumentation'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
@@ -3,7 +3,8 @@
 This is the graph implementation file of the Netflix Movie Recommendation System.
 """
 from __future__ import annotations
-from queue import PriorityQueue
+import heapq
+from typing import Callable, Iterable
 
 
 class Movie:
@@ -48,14 +49,22 @@ class Network:
         - _movies: A collection of the vertices contained in this graph,
             maps a movie title to a _Movie object.
         - _community: A collection of vertices within a given community
+        - _version: A counter that is incremented every time an edge or a community changes,
+            so cached query results can tell when they are out of date.
     """
     _movies: dict[str, Movie]
     _communities: dict[str, list[set[Movie] | float]]
+    _version: int
 
     def __init__(self) -> None:
         """Initialize an empty network graph (no vertices or edges)."""
         self._movies = {}
         self._communities = {}
+        self._version = 0
+
+    def get_version(self) -> int:
+        """Return the number of times the edges or communities of this graph have changed."""
+        return self._version
 
     def add_movie(self, title: str) -> None:
         """Add a movie vertex with the given item to this graph and
@@ -79,22 +88,87 @@ class Network:
             - item1 != item2
         """
         if title1 in self._movies and title2 in self._movies:
-            if self._movies[title2] in self.get_neighbours(title1):
-                return
-
             m1 = self._movies[title1]
             m2 = self._movies[title2]
 
+            if m2 in m1.neighbours:
+                return
+
             m1.neighbours[m2] = weight
             m2.neighbours[m1] = weight
+            self._version += 1
         else:
             raise ValueError
 
+    def add_weighted_edges(self, edges: Iterable[tuple[str, str, float]]) -> None:
+        """Add every (title1, title2, weight) edge in edges to this graph. If an edge is already present,
+        its weight is incremented by the given weight instead.
+
+        This is the bulk version of add_edge and increment_edge used when building the graph.
+
+        Raise a ValueError if a title does not appear as a movie in this graph.
+
+        Preconditions:
+            - all(edge[0] != edge[1] for edge in edges)
+        """
+        self._version += 1
+        for title1, title2, weight in edges:
+            if title1 not in self._movies or title2 not in self._movies:
+                raise ValueError
+
+            m1 = self._movies[title1]
+            m2 = self._movies[title2]
+            m1.neighbours[m2] = m1.neighbours.get(m2, 0) + weight
+            m2.neighbours[m1] = m2.neighbours.get(m1, 0) + weight
+
+    def ingest_ratings(self, rows: Iterable[list[str]], movies_dict: dict[int, str],
+                       user_ratings: dict[str, list[tuple[str, int]]],
+                       weight_function: Callable[[int, int], float]) -> set[str]:
+        """Update this graph with a batch of new ratings and return the titles of the movies whose edges changed.
+
+        Each row is of the format <custID, rating, date, movieID>, like the rows of the reviews file, and
+        rows of movies that are not in movies_dict are skipped. user_ratings maps each customer to the list
+        of (title, rating) tuples of every rating they have given so far, and is updated with the new ratings.
+        A new rating only changes the edges between the rated movie and the movies the customer rated
+        before, by weight_function(rating1, rating2). The sum of weights of those movies and the density of
+        their communities are updated in place, so add_sum_of_weights does not need to be called again.
+
+        Preconditions:
+            - add_sum_of_weights has been called on this graph
+            - no customer rates the same movie twice
+        """
+        touched = set()
+        for customer, rating, _, movie in rows:
+            if int(movie) not in movies_dict or movies_dict[int(movie)] not in self._movies:
+                continue
+
+            m1 = self._movies[movies_dict[int(movie)]]
+            previous = user_ratings.setdefault(customer, [])
+            for title, previous_rating in previous:
+                weight = weight_function(int(rating), previous_rating)
+                m2 = self._movies[title]
+                if weight <= 0 or m1 is m2:
+                    continue
+
+                m1.neighbours[m2] = m1.neighbours.get(m2, 0) + weight
+                m2.neighbours[m1] = m2.neighbours.get(m1, 0) + weight
+                m1.sum_weights += weight
+                m2.sum_weights += weight
+                if m1.community == m2.community:
+                    self._communities[m1.community][1] += weight
+                touched.update((m1.title, m2.title))
+                self._version += 1
+
+            previous.append((m1.title, int(rating)))
+
+        return touched
+
     def add_sum_of_weights(self) -> None:
         """This method finds the sum of weights of the neighbours of a movie in order to have a constant step
         access to sum of weights during the modularity calculation"""
         for movie in self._movies:
             self._movies[movie].sum_weights = sum(self._movies[movie].neighbours.values())
+        self._version += 1
 
     def remove_edge(self, title1: str, title2: str) -> None:
         """Remove an edge between the two movies with the given titles in this graph.
@@ -111,6 +185,7 @@ class Network:
 
             m1.neighbours.pop(m2)
             m2.neighbours.pop(m1)
+            self._version += 1
         else:
             raise ValueError
 
@@ -128,6 +203,7 @@ class Network:
 
             m1.neighbours[m2] += weight
             m2.neighbours[m1] += weight
+            self._version += 1
         else:
             raise ValueError
 
@@ -151,8 +227,7 @@ class Network:
         Return False if title1 or title2 do not appear as movies in this graph.
         """
         if title1 in self._movies and title2 in self._movies:
-            m1 = self._movies[title1]
-            return any(m2.title == title2 for m2 in m1.neighbours)
+            return self._movies[title2] in self._movies[title1].neighbours
         else:
             return False
 
@@ -184,6 +259,39 @@ class Network:
         self._communities[vertex.community][1] -= rem_density
         self._communities[new_community][0].add(vertex)
         self._communities[new_community][1] += add_density
+        self._version += 1
+
+    def set_communities(self, assignment: dict[str, str], densities: dict[str, float] | None = None) -> None:
+        """Replace the communities of this graph, so that each movie with title t is moved to the
+        community assignment[t]. Movies whose title is not in assignment keep their community.
+
+        If densities is None, the density of every community is recomputed as the sum of the weights
+        of the edges strictly inside it. Otherwise, densities maps each community to its density.
+
+        Raise a ValueError if a title in assignment does not appear as a movie in this graph.
+        """
+        if any(title not in self._movies for title in assignment):
+            raise ValueError
+
+        for title, community in assignment.items():
+            self._movies[title].community = community
+        self._version += 1
+
+        self._communities = {}
+        for movie in self._movies.values():
+            if movie.community not in self._communities:
+                self._communities[movie.community] = [set(), 0.0]
+            self._communities[movie.community][0].add(movie)
+
+        if densities is not None:
+            for community, density in densities.items():
+                self._communities.setdefault(community, [set(), 0.0])[1] = density
+        else:
+            for movie in self._movies.values():
+                for neighbour, weight in movie.neighbours.items():
+                    if neighbour.community == movie.community:
+                        # Each inside edge is seen from both of its endpoints
+                        self._communities[movie.community][1] += weight / 2
 
     def remove_empty_communities(self) -> None:
         """Get rid of communities without any members"""
@@ -202,8 +310,8 @@ class Network:
 
         Raise a ValueError if the Movie object is not in this graph
         """
-        # PriorityQueue sorts from least to greatest
-        pq = PriorityQueue()
+        # heapq pops from least to greatest
+        pq = []
         list_of_movies = []
         visited = set()
         movies = [self._movies[title] for title in movies_titles]
@@ -219,14 +327,14 @@ class Network:
             for neighbour in movie.neighbours:
                 if neighbour.community == movie.community and neighbour.title not in visited:
                     # Checking if they are in the same community
-                    pq.put([-movie.neighbours[neighbour], neighbour.title])
-                    # Adding negative weight as priority queue sorts from least to greatest
+                    heapq.heappush(pq, (-movie.neighbours[neighbour], neighbour.title))
+                    # Adding negative weight as heapq pops from least to greatest
 
         for _ in range(limit):
-            if pq.empty():
+            if not pq:
                 return list_of_movies
 
-            movie = pq.get()
+            movie = heapq.heappop(pq)
             # movie[0] = the edge weight (Inversed)
             # movie[1] = the movie object title
             if movie[1] in visited:
@@ -239,8 +347,8 @@ class Network:
             for neighbour in self._movies[movie[1]].neighbours:
                 if neighbour.community == self._movies[movie[1]].community and neighbour.title not in visited:
                     # Checking if they are in the same community
-                    pq.put([-self._movies[movie[1]].neighbours[neighbour], neighbour.title])
-                    # Adding negative weight as priority queue sorts from least to greatest
+                    heapq.heappush(pq, (-self._movies[movie[1]].neighbours[neighbour], neighbour.title))
+                    # Adding negative weight as heapq pops from least to greatest
 
         return list_of_movies
 
@@ -248,7 +356,7 @@ class Network:
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['queue'],  # the names (strs) of imported modules
+        'extra-imports': ['heapq', 'typing'],  # the names (strs) of imported modules
         'allowed-io': [],  # the names (strs) of functions that call print/open/input
         'max-line-length': 120
     })
@@ -0,0 +1,162 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains a parallel version of phase 1 of the Louvain's algorithm used by
+the Netflix Movie Recommendation System. The adjacency of the graph is copied into shared
+memory once, and a pool of processes evaluates the moves of different vertices at the same time.
+"""
+from multiprocessing import Pool
+import os
+import numpy as np
+import clustering
+import graph_cache
+import movie_class
+from shared_arrays import SHARED_ARRAYS, SharedArrays, attach_shared_arrays
+
+
+def propose_moves(vertices: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the (vertices, communities, gains) of the best move of each of the given vertices that
+    improves the modularity, given the current community of every vertex in SHARED_ARRAYS.
+
+    The edges of every given vertex are taken from the CSR arrays at once and sorted by (vertex, community)
+    with a single stable sort, so the weight of the edges from each vertex to each neighbouring community is
+    found with np.add.reduceat instead of a loop over the vertices. The vertices are returned sorted.
+
+    Like clustering.local_moving, a vertex is never moved into a community that already holds
+    max_size movies. Ties between moves with the same gain go to the community with the smallest label.
+    """
+    indptr, indices, weights = SHARED_ARRAYS['indptr'], SHARED_ARRAYS['indices'], SHARED_ARRAYS['weights']
+    labels, totals, sizes = SHARED_ARRAYS['labels'], SHARED_ARRAYS['totals'], SHARED_ARRAYS['sizes']
+    degrees = SHARED_ARRAYS['degrees']
+    two_m, max_size = SHARED_ARRAYS['settings'][0], SHARED_ARRAYS['settings'][1]
+
+    # The positions in indices and weights of the edges of every vertex, with the vertex of each edge
+    starts, lengths = indptr[vertices], indptr[vertices + 1] - indptr[vertices]
+    sources = np.repeat(vertices, lengths)
+    positions = np.arange(len(sources)) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    if len(sources) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    # One group per (vertex, neighbouring community), with the total weight of its edges
+    keys = sources.astype(np.int64) * len(labels) + labels[indices[positions]]
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    links = np.add.reduceat(weights[positions[order]].astype(np.float64), first)
+    sources, communities = np.divmod(keys[first], len(labels))
+
+    degree, own = degrees[sources], communities == labels[sources]
+    gains = links - (totals[communities] - np.where(own, degree, 0)) * degree / two_m
+
+    # The gain of staying, which is the gain of the own community of the vertex if it has a neighbour there
+    vertex_first = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]])
+    vertex_of_group = np.cumsum(np.r_[False, sources[1:] != sources[:-1]])
+    moved = sources[vertex_first]
+    stay_gains = -(totals[labels[moved]] - degrees[moved]) * degrees[moved] / two_m
+    stay_gains[vertex_of_group[own]] = gains[own]
+    gains[(sizes[communities] >= max_size) | own] = -np.inf
+
+    # The first group with the highest gain of each vertex, which has the smallest community
+    best_gains = np.maximum.reduceat(gains, vertex_first)
+    is_best = np.flatnonzero(gains == best_gains[vertex_of_group])
+    best = is_best[np.r_[True, vertex_of_group[is_best][1:] != vertex_of_group[is_best][:-1]]]
+
+    improves = best_gains > stay_gains + 1e-12
+    return (moved[improves].astype(np.int64), communities[best][improves].astype(np.int64),
+            (best_gains - stay_gains)[improves])
+
+
+def apply_moves(arrays: SharedArrays, moved: np.ndarray, targets: np.ndarray, gains: np.ndarray,
+                max_size: int) -> int:
+    """Apply the proposed moves to the shared labels, resolving conflicts between moves that were
+    evaluated at the same time, and return the number of vertices moved.
+
+    Moves are applied from the largest to the smallest gain and skipped if their target community is
+    already full or has been emptied. When two vertices that are alone in their communities both move,
+    a vertex only moves into the other's community if it has a smaller label, so two vertices never
+    swap communities.
+    """
+    labels, sizes = arrays['labels'], arrays['sizes']
+    moving_singletons = set(labels[moved[sizes[labels[moved]] == 1]].tolist())
+    applied = 0
+
+    for index in np.argsort(-gains, kind='stable').tolist():
+        vertex, target = int(moved[index]), int(targets[index])
+        if sizes[target] >= max_size or sizes[target] == 0:
+            continue
+        if labels[vertex] in moving_singletons and target in moving_singletons and target > labels[vertex]:
+            continue
+
+        sizes[labels[vertex]] -= 1
+        sizes[target] += 1
+        labels[vertex] = target
+        applied += 1
+
+    return applied
+
+
+def csr_modularity(arrays: SharedArrays, two_m: float) -> float:
+    """Return the modularity of the partition given by the shared labels."""
+    indptr, indices, weights, labels = arrays['indptr'], arrays['indices'], arrays['weights'], arrays['labels']
+    rows = np.repeat(np.arange(len(labels)), np.diff(indptr))
+    inside = weights[labels[rows] == labels[indices]].sum(dtype=np.float64)
+    return float(inside / two_m - np.sum((arrays['totals'] / two_m) ** 2))
+
+
+def parallel_louvain(graph: movie_class.Network, processes: int | None = None, max_size: int = 25,
+                     tolerance: float = 1e-6, max_passes: int = 100, sub_rounds: int = 4) -> int:
+    """Run phase 1 of the Louvain's algorithm on graph using a pool of processes, and move every movie
+    of graph into the resulting community. Return the number of passes made.
+
+    Each pass is split into sub_rounds sub-rounds over disjoint subsets of the vertices. In a sub-round,
+    the vertices of the subset are divided between the processes, which propose moves against the
+    communities as they were at the start of the sub-round, and the proposals are then applied with
+    apply_moves. Passes stop once a pass moves no vertex or increases the modularity by less than tolerance.
+    """
+    titles = list(graph.get_movies())
+    csr = graph_cache.network_to_arrays(graph)
+    rows = np.repeat(np.arange(len(titles)), np.diff(csr['indptr']))
+    degrees = np.bincount(rows, weights=csr['weights'], minlength=len(titles))
+    two_m = float(degrees.sum())
+    if two_m == 0:
+        clustering.apply_partition(graph, titles, list(range(len(titles))))
+        return 0
+
+    arrays = SharedArrays({
+        'indptr': csr['indptr'], 'indices': csr['indices'], 'weights': csr['weights'], 'degrees': degrees,
+        'labels': np.arange(len(titles), dtype=np.int64), 'totals': degrees.copy(),
+        'sizes': np.ones(len(titles), dtype=np.int64), 'settings': np.array([two_m, max_size], dtype=np.float64)
+    })
+    processes = processes or os.cpu_count() or 1
+    passes = 0
+
+    try:
+        with Pool(processes, initializer=attach_shared_arrays, initargs=(arrays.specs,)) as pool:
+            modularity = csr_modularity(arrays, two_m)
+            for passes in range(1, max_passes + 1):
+                moves = 0
+                for sub_round in range(sub_rounds):
+                    subset = np.arange(sub_round, len(titles), sub_rounds)
+                    proposals = pool.map(propose_moves, np.array_split(subset, processes * 4))
+                    moves += apply_moves(arrays, *(np.concatenate(parts) for parts in zip(*proposals)), max_size)
+                    arrays['totals'][:] = np.bincount(arrays['labels'], weights=degrees, minlength=len(titles))
+
+                new_modularity = csr_modularity(arrays, two_m)
+                if moves == 0 or new_modularity - modularity < tolerance:
+                    break
+                modularity = new_modularity
+
+        clustering.apply_partition(graph, titles, arrays['labels'].tolist())
+    finally:
+        arrays.close()
+
+    return passes
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['multiprocessing', 'os', 'numpy', 'clustering', 'graph_cache', 'movie_class',
+                          'shared_arrays'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
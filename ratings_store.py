@@ -0,0 +1,260 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains the binary ratings store of the Netflix Movie Recommendation System. The reviews CSV
+file is converted once into a directory of typed NumPy arrays, grouped by user, which load_graph reads
+through memory mapping instead of parsing text on every build.
+
+A store is a directory containing:
+    - users.npy: the sorted ids of the users (int64).
+    - offsets.npy: the ratings of users[i] are at positions offsets[i]:offsets[i + 1] of the other columns.
+    - movies.npy, ratings.npy, dates.npy: the movie id (int32), rating (int8) and date (int32, days since
+        1970-01-01) of each rating.
+    - rows.npy: the (0-based) line number of each rating in the original CSV file (int64), so a limit on
+        the number of ratings can be applied exactly as when reading the CSV file.
+    - manifest.json: the version of the format and the number of users and ratings.
+
+Within each user, the ratings are in the order of the original file.
+
+Usage:
+    python ratings_store.py data/shuffled_user_ratings.csv data/ratings_store
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+from typing import Iterator
+import numpy as np
+
+STORE_VERSION = 1
+COLUMNS = {'movies': np.int32, 'ratings': np.int8, 'dates': np.int32, 'rows': np.int64}
+
+
+def read_csv_columns(reviews_file_path: str, chunk_size: int) -> Iterator[dict[str, np.ndarray]]:
+    """Read the reviews file in chunks of at most chunk_size ratings and yield the columns of each chunk:
+    a dict mapping 'users' and each key of COLUMNS to an array.
+
+    Preconditions:
+        - reviews_file_path is the path to a CSV file corresponding to the movie review data
+        of the format <custID, rating, date, movieID>. The file should also have no header.
+        - chunk_size > 0
+    """
+    with open(reviews_file_path, 'r') as reviews_file:
+        row = 0
+        rows = []
+        for line in csv.reader(reviews_file):
+            rows.append(line)
+            if len(rows) == chunk_size:
+                yield chunk_to_columns(rows, row)
+                row += len(rows)
+                rows = []
+
+        if rows:
+            yield chunk_to_columns(rows, row)
+
+
+def chunk_to_columns(rows: list[list[str]], first_row: int) -> dict[str, np.ndarray]:
+    """Return the columns of the given <custID, rating, date, movieID> rows, the first of which is on line
+    first_row of the reviews file."""
+    customers, ratings, dates, movies = zip(*rows)
+    return {'users': np.array(customers, dtype=np.int64),
+            'movies': np.array(movies, dtype=np.int32),
+            'ratings': np.array(ratings, dtype=np.int8),
+            'dates': np.array(dates, dtype='datetime64[D]').astype(np.int32),
+            'rows': np.arange(first_row, first_row + len(rows), dtype=np.int64)}
+
+
+def convert_ratings(reviews_file_path: str, directory: str, chunk_size: int = 1000000) -> None:
+    """Convert the given reviews file into a ratings store in directory, replacing any previous store.
+
+    The file is converted with a counting sort by user in three streaming passes, so only one chunk of
+    chunk_size ratings and a few arrays with one entry per user are held in memory at once: the columns
+    are first parsed into temporary files, then the ratings of each user are counted, and finally every
+    rating is written to its position in the memory-mapped output.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    temporary = tempfile.mkdtemp(prefix='ratings_store_', dir=parent)
+    try:
+        raw_files = {name: open(os.path.join(temporary, name + '.raw'), 'wb') for name in ['users', *COLUMNS]}
+        users = np.empty(0, dtype=np.int64)
+        num_ratings = 0
+        try:
+            for columns in read_csv_columns(reviews_file_path, chunk_size):
+                for name, column in columns.items():
+                    column.tofile(raw_files[name])
+                users = np.union1d(users, columns['users'])
+                num_ratings += len(columns['users'])
+        finally:
+            for raw_file in raw_files.values():
+                raw_file.close()
+
+        raw_users = np.memmap(os.path.join(temporary, 'users.raw'), dtype=np.int64, mode='r',
+                              shape=(num_ratings,)) if num_ratings else np.empty(0, dtype=np.int64)
+        counts = np.zeros(len(users), dtype=np.int64)
+        for start in range(0, num_ratings, chunk_size):
+            counts += np.bincount(np.searchsorted(users, raw_users[start:start + chunk_size]), minlength=len(users))
+        offsets = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        output = os.path.join(temporary, 'store')
+        os.makedirs(output)
+        np.save(os.path.join(output, 'users.npy'), users)
+        np.save(os.path.join(output, 'offsets.npy'), offsets)
+        outputs = {name: np.lib.format.open_memmap(os.path.join(output, name + '.npy'), mode='w+',
+                                                   dtype=dtype, shape=(num_ratings,))
+                   for name, dtype in COLUMNS.items()}
+
+        cursors = offsets[:-1].copy()
+        for start in range(0, num_ratings, chunk_size):
+            indices = np.searchsorted(users, raw_users[start:start + chunk_size])
+            order = np.argsort(indices, kind='stable')
+            sorted_indices = indices[order]
+            group_starts = np.flatnonzero(np.r_[True, sorted_indices[1:] != sorted_indices[:-1]])
+            ranks = np.arange(len(order)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(order)]))
+            positions = np.empty(len(order), dtype=np.int64)
+            positions[order] = cursors[sorted_indices] + ranks
+            cursors += np.bincount(indices, minlength=len(users))
+
+            for name, dtype in COLUMNS.items():
+                chunk = np.fromfile(os.path.join(temporary, name + '.raw'), dtype=dtype, count=len(indices),
+                                    offset=start * np.dtype(dtype).itemsize)
+                outputs[name][positions] = chunk
+
+        for array in outputs.values():
+            array.flush()
+        del outputs, raw_users
+
+        with open(os.path.join(output, 'manifest.json'), 'w') as manifest_file:
+            json.dump({'version': STORE_VERSION, 'num_users': len(users), 'num_ratings': num_ratings},
+                      manifest_file, indent=2)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(output, directory)
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+
+
+def is_store(path: str) -> bool:
+    """Return whether path is the directory of a ratings store."""
+    return os.path.isfile(os.path.join(path, 'manifest.json'))
+
+
+class RatingsStore:
+    """A ratings store opened for reading. Every column is memory-mapped, so opening a store is instant
+    and only the parts of the columns that are used are read from disk.
+
+    Instance Attributes:
+        - users: The sorted ids of the users.
+        - offsets: The ratings of users[i] are at positions offsets[i]:offsets[i + 1] of the other columns.
+        - movies: The movie id of each rating.
+        - ratings: The value of each rating, from 1 to 5.
+        - dates: The date of each rating, in days since 1970-01-01.
+        - rows: The line number of each rating in the original CSV file.
+
+    Representation Invariants:
+        - len(self.offsets) == len(self.users) + 1
+        - len(self.movies) == len(self.ratings) == len(self.dates) == len(self.rows) == self.offsets[-1]
+    """
+    users: np.ndarray
+    offsets: np.ndarray
+    movies: np.ndarray
+    ratings: np.ndarray
+    dates: np.ndarray
+    rows: np.ndarray
+
+    def __init__(self, directory: str) -> None:
+        """Open the ratings store in directory.
+
+        Raise a ValueError if directory does not hold a store in the current format.
+        """
+        try:
+            with open(os.path.join(directory, 'manifest.json'), 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError) as error:
+            raise ValueError from error
+        if manifest.get('version') != STORE_VERSION:
+            raise ValueError
+
+        self.users = np.load(os.path.join(directory, 'users.npy'))
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'))
+        columns = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in COLUMNS}
+        self.movies, self.ratings = columns['movies'], columns['ratings']
+        self.dates, self.rows = columns['dates'], columns['rows']
+
+    def num_users(self) -> int:
+        """Return the number of users in the store."""
+        return len(self.users)
+
+    def num_ratings(self) -> int:
+        """Return the number of ratings in the store."""
+        return int(self.offsets[-1])
+
+    def user_blocks(self, max_ratings: int) -> Iterator[tuple[int, int]]:
+        """Yield (start, end) ranges of consecutive user indices covering every user, each with at most
+        max_ratings ratings in total unless it contains a single user."""
+        start = 0
+        while start < len(self.users):
+            end = int(np.searchsorted(self.offsets, self.offsets[start] + max_ratings, side='right')) - 1
+            end = min(max(end, start + 1), len(self.users))
+            yield start, end
+            start = end
+
+    def row_limit(self, movie_indices: np.ndarray, rating_limit: int | None) -> int | None:
+        """Return the line number of the last rating read by load_graph.read_rating_chunks with the given
+        rating_limit, or None if every rating is read.
+
+        movie_indices maps each movie id to its index in the graph, or -1 for movies not in the graph, as
+        returned by movie_lookup.
+        """
+        if rating_limit is None:
+            return None
+
+        kept = np.zeros(len(self.rows), dtype=np.bool_)
+        for start, end in self.user_blocks(1 << 22):
+            first, last = self.offsets[start], self.offsets[end]
+            indices = movie_lookup_values(movie_indices, self.movies[first:last])
+            kept[self.rows[first:last][indices >= 0]] = True
+
+        counted = 0
+        for start in range(0, len(kept), 1 << 22):
+            block = kept[start:start + (1 << 22)]
+            block_count = int(np.count_nonzero(block))
+            if counted + block_count >= rating_limit:
+                return start + int(np.flatnonzero(block)[rating_limit - counted - 1])
+            counted += block_count
+        return None
+
+
+def movie_lookup(movie_indices: dict[int, int]) -> np.ndarray:
+    """Return an array mapping each movie id up to the largest key of movie_indices to its value in
+    movie_indices, or to -1 if it is not a key."""
+    lookup = np.full(max(movie_indices, default=-1) + 1, -1, dtype=np.int32)
+    for movie_id, index in movie_indices.items():
+        lookup[movie_id] = index
+    return lookup
+
+
+def movie_lookup_values(lookup: np.ndarray, movie_ids: np.ndarray) -> np.ndarray:
+    """Return lookup[movie_ids], with -1 for the movie ids outside of lookup."""
+    inside = (movie_ids >= 0) & (movie_ids < len(lookup))
+    return np.where(inside, lookup[np.where(inside, movie_ids, 0)] if len(lookup) else -1, -1)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        # the names (strs) of imported modules
+        'extra-imports': ['argparse', 'csv', 'json', 'os', 'shutil', 'tempfile', 'typing', 'numpy'],
+        # the names (strs) of functions that call print/open/input
+        'allowed-io': ['read_csv_columns', 'convert_ratings', 'RatingsStore.__init__'],
+        'max-line-length': 120
+    })
+
+    parser = argparse.ArgumentParser(description='Convert a reviews CSV file into a binary ratings store.')
+    parser.add_argument('reviews', help='the reviews CSV file, of the format <custID, rating, date, movieID>')
+    parser.add_argument('directory', help='the directory to write the store to')
+    parser.add_argument('--chunk-size', type=int, default=1000000)
+    args = parser.parse_args()
+    convert_ratings(args.reviews, args.directory, args.chunk_size)
@@ -0,0 +1,385 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains the precomputed recommendation index of the Netflix Movie
+Recommendation System, which answers the same queries as Network.get_best_movies
+without filtering or sorting any neighbours at query time, and the personalized
+PageRank recommender, which ranks every movie of the graph by random walks with
+restart from the selected movies.
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import graph_cache
+import instrumentation
+import movie_class
+
+
+class RecommendationIndex:
+    """An index of the neighbours of every movie that are in the same community as the movie,
+    sorted from the heaviest to the lightest edge.
+
+    The index is kept in the flat arrays returned by index_arrays, and queries are answered by
+    best_first_search, so the batch job can run the same search on the arrays in shared memory.
+
+    Private Instance Attributes:
+        - _titles: The title of each movie id.
+        - _title_indices: Maps each title to its movie id.
+        - _arrays: The arrays of the index, as returned by index_arrays.
+
+    Representation Invariants:
+        - len(self._titles) == len(self._arrays['indptr']) - 1
+    """
+    _titles: list[str]
+    _title_indices: dict[str, int]
+    _arrays: dict[str, np.ndarray]
+
+    def __init__(self, graph: movie_class.Network) -> None:
+        """Build the index of the given graph (a Network or CompactNetwork) with its current communities."""
+        self._titles = list(graph.get_movies())
+        self._title_indices = {title: i for i, title in enumerate(self._titles)}
+        self._arrays = index_arrays(graph)
+
+    def get_best_movies(self, movies_titles: list[str], limit: int) -> list[str]:
+        """Return a maximum length limit of the best movie titles connected to the given movies and in the
+        same community, in the same order as the best-first search of Network.get_best_movies.
+
+        Unlike Network.get_best_movies, only distinct titles count towards limit, so a title reached from
+        several movies does not make the recommendations shorter, and the recommendations of
+        Network.get_best_movies are always a prefix of these.
+
+        Raise a ValueError if a title does not appear as a movie in the indexed graph.
+        """
+        if any(title not in self._title_indices for title in movies_titles):
+            raise ValueError
+
+        seeds = [self._title_indices[title] for title in movies_titles]
+        return [self._titles[index] for index in best_first_search(self._arrays, seeds, limit)]
+
+
+def title_ranks(titles: list[str]) -> np.ndarray:
+    """Return the position of each title in the sorted list of titles, so that comparing ranks orders
+    movies like comparing their titles."""
+    ranks = np.empty(len(titles), dtype=np.int64)
+    ranks[sorted(range(len(titles)), key=titles.__getitem__)] = np.arange(len(titles))
+    return ranks
+
+
+def index_arrays(graph: movie_class.Network) -> dict[str, np.ndarray]:
+    """Return the arrays searched by best_first_search for the given graph (a Network or CompactNetwork)
+    with its current communities.
+
+    These are the same-community neighbours of every movie id in CSR form ('indptr', 'indices' and
+    'weights'), sorted by decreasing edge weight and then by title, and the rank of each title in sorted
+    order ('ranks'). Movie ids are positions in graph.get_movies().
+    """
+    csr = graph_cache.network_to_arrays(graph)
+    ranks = title_ranks(list(graph.get_movies()))
+    rows = np.repeat(np.arange(len(ranks)), np.diff(csr['indptr']))
+    indices, weights = csr['indices'].astype(np.int64), csr['weights']
+
+    kept = csr['communities'][rows] == csr['communities'][indices]
+    rows, indices, weights = rows[kept], indices[kept], weights[kept]
+    order = np.lexsort((ranks[indices], -weights, rows))
+    indptr = np.zeros(len(ranks) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(ranks)), out=indptr[1:])
+    return {'indptr': indptr, 'indices': indices[order], 'weights': weights[order], 'ranks': ranks}
+
+
+def best_first_search(arrays: dict[str, np.ndarray], seeds: list[int], limit: int) -> list[int]:
+    """Return the ids of at most limit movies connected to the given movie ids and in the same community,
+    from best to worst, using the arrays returned by index_arrays.
+
+    This is the best-first search of Network.get_best_movies, but rather than pushing every neighbour
+    of a movie onto the heap when it is reached, only its next best neighbour is pushed, and the following
+    one is pushed when that entry is popped. So each query only looks at about limit + len(seeds) entries
+    of the index. Only distinct movies count towards limit.
+    """
+    # Each heap entry is (-weight, title rank, movie id, source movie id, position in the source's row)
+    heap = []
+    recommendations = []
+    visited = set(seeds)
+
+    for source in visited:
+        push_next(arrays, heap, source, 0)
+
+    while heap and len(recommendations) < limit:
+        _, _, index, source, position = heapq.heappop(heap)
+        push_next(arrays, heap, source, position + 1)
+        if index in visited:
+            continue
+
+        recommendations.append(index)
+        visited.add(index)
+        push_next(arrays, heap, index, 0)
+
+    return recommendations
+
+
+def push_next(arrays: dict[str, np.ndarray], heap: list, source: int, position: int) -> None:
+    """Push the entry at the given position of the row of source in the arrays of index_arrays onto heap,
+    if there is one."""
+    edge = int(arrays['indptr'][source]) + position
+    if edge < arrays['indptr'][source + 1]:
+        index = int(arrays['indices'][edge])
+        heapq.heappush(heap, (-float(arrays['weights'][edge]), int(arrays['ranks'][index]), index, source, position))
+
+
+class PageRankRecommender:
+    """Recommends movies by personalized PageRank (random walk with restart) from the selected movies.
+
+    A walker starts at one of the selected movies and, at each step, either jumps back to a random
+    selected movie with probability restart, or moves to a neighbour of its current movie with probability
+    proportional to the weight of the edge. The movies where the walker spends the most time are the
+    recommendations. Unlike Network.get_best_movies, this uses every edge of the graph, whatever the
+    communities, so it returns limit movies whenever that many can be reached. The stationary distribution
+    is found by power iteration, where each step is a sparse matrix-vector product over the edge arrays
+    returned by pagerank_arrays, and queries are answered by pagerank_search, which the batch job also
+    runs on the arrays in shared memory.
+
+    Private Instance Attributes:
+        - _titles: The title of each movie id.
+        - _title_indices: Maps each title to its movie id.
+        - _arrays: The edge arrays of the graph, as returned by pagerank_arrays.
+
+    Representation Invariants:
+        - len(self._titles) == len(self._arrays['dangling'])
+    """
+    _titles: list[str]
+    _title_indices: dict[str, int]
+    _arrays: dict[str, np.ndarray]
+
+    def __init__(self, graph: movie_class.Network) -> None:
+        """Build the edge arrays of the given graph (a Network or CompactNetwork)."""
+        self._titles = list(graph.get_movies())
+        self._title_indices = {title: i for i, title in enumerate(self._titles)}
+        self._arrays = pagerank_arrays(graph)
+
+    def get_scores(self, movies_titles: list[str], restart: float = 0.15, tolerance: float = 1e-6,
+                   max_iterations: int = 100) -> np.ndarray:
+        """Return the personalized PageRank of every movie id for walks restarting at the given movies,
+        computed by personalized_pagerank.
+
+        Raise a ValueError if a title does not appear as a movie in the graph.
+        """
+        if any(title not in self._title_indices for title in movies_titles):
+            raise ValueError
+
+        seeds = np.array([self._title_indices[title] for title in movies_titles], dtype=np.int64)
+        return personalized_pagerank(self._arrays['sources'], self._arrays['targets'], self._arrays['transitions'],
+                                     self._arrays['dangling'], seeds, restart, tolerance, max_iterations)
+
+    def get_best_movies(self, movies_titles: list[str], limit: int, restart: float = 0.15,
+                        community_boost: float = 0.0, tolerance: float = 1e-6, max_iterations: int = 100) -> list[str]:
+        """Return a maximum length limit of the movie titles with the highest personalized PageRank for walks
+        restarting at the given movies, from highest to lowest (and by title for equal scores), as found by
+        pagerank_search.
+
+        Raise a ValueError if a title does not appear as a movie in the graph.
+        """
+        if any(title not in self._title_indices for title in movies_titles):
+            raise ValueError
+
+        seeds = [self._title_indices[title] for title in movies_titles]
+        return [self._titles[index] for index in pagerank_search(self._arrays, seeds, limit, restart,
+                                                                 community_boost, tolerance, max_iterations)]
+
+
+def pagerank_arrays(graph: movie_class.Network) -> dict[str, np.ndarray]:
+    """Return the arrays used by pagerank_search for the given graph (a Network or CompactNetwork).
+
+    These are the directed edges of the graph, from 'sources' to 'targets', with the probability
+    'transitions' of following each edge from its source, whether each movie has no edges ('dangling'),
+    the community id of each movie ('communities') and the rank of each title in sorted order ('ranks').
+    Movie ids are positions in graph.get_movies().
+    """
+    csr = graph_cache.network_to_arrays(graph)
+    sources = np.repeat(np.arange(len(csr['indptr']) - 1), np.diff(csr['indptr']))
+    weights = csr['weights']
+    strengths = np.bincount(sources, weights=weights, minlength=len(csr['indptr']) - 1)
+    return {'sources': sources, 'targets': csr['indices'].astype(np.int64),
+            'transitions': weights / strengths[sources] if len(weights) else weights,
+            'dangling': strengths <= 0, 'communities': csr['communities'].astype(np.int64),
+            'ranks': title_ranks(list(graph.get_movies()))}
+
+
+def pagerank_search(arrays: dict[str, np.ndarray], seeds: list[int], limit: int, restart: float = 0.15,
+                    community_boost: float = 0.0, tolerance: float = 1e-6, max_iterations: int = 100) -> list[int]:
+    """Return the ids of at most limit movies with the highest personalized PageRank for walks restarting
+    at the given movie ids, from highest to lowest (and by title for equal scores), using the arrays
+    returned by pagerank_arrays. The given movies and the movies that cannot be reached from them are
+    never returned.
+
+    If community_boost is positive, the scores of the movies in the same community as one of the given
+    movies are multiplied by 1 + community_boost, so recommendations from the communities found by
+    clustering are favoured without ignoring the rest of the graph.
+    """
+    if limit <= 0:
+        return []
+
+    scores = personalized_pagerank(arrays['sources'], arrays['targets'], arrays['transitions'], arrays['dangling'],
+                                   np.array(seeds, dtype=np.int64), restart, tolerance, max_iterations)
+    if community_boost > 0:
+        scores = scores * (1 + community_boost * np.isin(arrays['communities'], arrays['communities'][seeds]))
+    scores[seeds] = 0
+
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+    return candidates[np.lexsort((arrays['ranks'][candidates], -scores[candidates]))].tolist()
+
+
+def personalized_pagerank(sources: np.ndarray, targets: np.ndarray, transitions: np.ndarray, dangling: np.ndarray,
+                          seeds: np.ndarray, restart: float = 0.15, tolerance: float = 1e-6,
+                          max_iterations: int = 100) -> np.ndarray:
+    """Return the personalized PageRank of every movie id for walks restarting at the movie ids in seeds,
+    on the graph whose directed edges go from sources[i] to targets[i] with probability transitions[i].
+    A movie with dangling[i] True has no edges, and the walker jumps back to a seed from it.
+
+    The power iteration stops once the total change of the scores in an iteration is below tolerance,
+    or after max_iterations iterations.
+    """
+    restarts = np.zeros(len(dangling), dtype=np.float64)
+    restarts[seeds] = 1
+    restarts /= max(restarts.sum(), 1)
+
+    scores = restarts.copy()
+    for iteration in range(max_iterations):
+        spread = np.bincount(targets, weights=transitions * scores[sources], minlength=len(scores))
+        spread += scores[dangling].sum() * restarts
+        new_scores = (1 - restart) * spread + restart * restarts
+        change = np.abs(new_scores - scores).sum()
+        scores = new_scores
+        if change < tolerance:
+            instrumentation.observe('recommend.pagerank_iterations', iteration + 1)
+            break
+
+    return scores
+
+
+RECOMMENDERS = {'index': RecommendationIndex, 'pagerank': PageRankRecommender}
+# The functions returning the arrays of each recommender, and the searches answering its queries on them
+RECOMMENDATION_ARRAYS = {'index': index_arrays, 'pagerank': pagerank_arrays}
+SEARCHES = {'index': best_first_search, 'pagerank': pagerank_search}
+
+
+class RecommendationCache:
+    """A least recently used cache of the recommendations for a graph.
+
+    Queries are keyed by the set of seed titles and the limit, so the same selection in a different
+    order is a cache hit. The cache is cleared, and the recommender rebuilt, whenever the
+    version of the graph changes, so stale recommendations are never returned. The cache can be
+    shared between threads.
+
+    Instance Attributes:
+        - method: The key in RECOMMENDERS of the recommender used, 'index' or 'pagerank'.
+        - capacity: The maximum number of cached queries.
+        - hits: The number of queries answered from the cache.
+        - misses: The number of queries that had to be computed.
+        - invalidations: The number of times the cache was cleared because the graph changed.
+
+    Private Instance Attributes:
+        - _graph: The graph recommendations are made from.
+        - _version: The version of _graph the cached recommendations and _index were computed for.
+        - _index: The recommender of _graph, or None if it has to be rebuilt for the current version.
+        - _results: Maps each cached query to its recommendations, from least to most recently used.
+        - _lock: The lock held while the cache is read or updated, but not while recommendations are computed.
+
+    Representation Invariants:
+        - len(self._results) <= self.capacity
+    """
+    method: str
+    capacity: int
+    hits: int
+    misses: int
+    invalidations: int
+    _graph: movie_class.Network
+    _version: int
+    _index: RecommendationIndex | PageRankRecommender | None
+    _results: OrderedDict[tuple[frozenset[str], int], list[str]]
+    _lock: threading.Lock
+
+    def __init__(self, graph: movie_class.Network, capacity: int = 1024, method: str = 'index') -> None:
+        """Initialize an empty cache of recommendations for the given graph, made by the recommender
+        RECOMMENDERS[method].
+
+        Raise a ValueError if method is not a key of RECOMMENDERS.
+        """
+        if method not in RECOMMENDERS:
+            raise ValueError
+        self.method = method
+        self.capacity = capacity
+        self.hits, self.misses, self.invalidations = 0, 0, 0
+        self._graph = graph
+        self._version = graph.get_version()
+        self._index = RECOMMENDERS[method](graph)
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_best_movies(self, movies_titles: list[str], limit: int) -> list[str]:
+        """Return the get_best_movies(movies_titles, limit) of the recommender for the current version of
+        the graph, from the cache if this query was made before.
+
+        Raise a ValueError if a title does not appear as a movie in the graph.
+        """
+        if instrumentation.ENABLED:
+            start = time.perf_counter()
+            recommendations = self._get_best_movies(movies_titles, limit)
+            instrumentation.observe('recommend.latency_ms', (time.perf_counter() - start) * 1000)
+            return recommendations
+        return self._get_best_movies(movies_titles, limit)
+
+    def _get_best_movies(self, movies_titles: list[str], limit: int) -> list[str]:
+        """Return the result of get_best_movies, without recording its latency.
+
+        The lock is only held to read and update the cache, so the recommender is rebuilt and queries are
+        computed outside it. Two threads missing on the same query at once both compute it.
+        """
+        version = self._graph.get_version()
+        key = (frozenset(movies_titles), limit)
+        with self._lock:
+            if version != self._version:
+                self._results.clear()
+                self._index = None
+                self._version = version
+                self.invalidations += 1
+
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return list(self._results[key])
+
+            self.misses += 1
+            index = self._index
+
+        if index is None:
+            index = RECOMMENDERS[self.method](self._graph)
+            with self._lock:
+                if self._version == version:
+                    self._index = index
+
+        recommendations = index.get_best_movies(list(key[0]), limit)
+        with self._lock:
+            if self._version == version:
+                self._results[key] = recommendations
+                if len(self._results) > self.capacity:
+                    self._results.popitem(last=False)
+        return list(recommendations)
+
+    def get_statistics(self) -> dict[str, int | float]:
+        """Return the number of hits, misses and invalidations of this cache, its hit rate and its size."""
+        queries = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+                'hit_rate': self.hits / queries if queries else 0.0, 'size': len(self._results)}
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        # the names (strs) of imported modules
+        'extra-imports': ['heapq', 'threading', 'time', 'collections', 'numpy', 'graph_cache', 'instrumentation',
+                          'movie_class'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
@@ -0,0 +1,109 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains the title search index of the Netflix Movie Recommendation System,
+used to find the movies matching the text typed in the search box.
+"""
+import heapq
+import unicodedata
+
+
+def normalise(text: str) -> str:
+    """Return text in lowercase, without accents and with runs of whitespace replaced by a single space."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).lower().split())
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the set of substrings of length 3 of text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """A trigram index over normalised movie titles, used for substring search.
+
+    Every title containing a query of at least 3 characters also contains each trigram of the query,
+    so only the titles in the intersection of their posting lists have to be checked. When the query
+    grows by extending the previous one, only the previous matches are checked.
+
+    Instance Attributes:
+        - limit: The default maximum number of results returned by search.
+
+    Private Instance Attributes:
+        - _titles: The titles in the index.
+        - _normalised: The normalised version of each title in _titles.
+        - _postings: Maps each trigram to the set of indices of the titles containing it.
+        - _last_query: The normalised query of the previous search.
+        - _last_matches: The indices of every title matching _last_query.
+
+    Representation Invariants:
+        - len(self._titles) == len(self._normalised)
+    """
+    limit: int
+    _titles: list[str]
+    _normalised: list[str]
+    _postings: dict[str, set[int]]
+    _last_query: str
+    _last_matches: list[int]
+
+    def __init__(self, titles: list[str], limit: int = 50) -> None:
+        """Initialize an index of the given titles."""
+        self.limit = limit
+        self._titles = list(titles)
+        self._normalised = [normalise(title) for title in self._titles]
+        self._postings = {}
+        for i, title in enumerate(self._normalised):
+            for trigram in trigrams(title):
+                self._postings.setdefault(trigram, set()).add(i)
+
+        self._last_query = ''
+        self._last_matches = list(range(len(self._titles)))
+
+    def search(self, query: str, limit: int | None = None, incremental: bool = True) -> list[str]:
+        """Return at most limit (or self.limit) of the titles containing query, ignoring case, accents
+        and extra whitespace.
+
+        Titles starting with the query come first, then titles with a word starting with the query, then
+        all other matches. Ties are broken by where the query appears, then by title length.
+
+        If incremental is False, the previous search is neither used nor replaced, so independent
+        queries (for example from several threads) can be made safely.
+        """
+        query = normalise(query)
+        if query == '':
+            return []
+
+        if incremental and self._last_query and query.startswith(self._last_query):
+            candidates = self._last_matches
+        elif len(query) >= 3:
+            postings = sorted((self._postings.get(trigram, set()) for trigram in trigrams(query)), key=len)
+            candidates = sorted(set.intersection(*postings))
+        else:
+            candidates = range(len(self._titles))
+
+        matches = [i for i in candidates if query in self._normalised[i]]
+        if incremental:
+            self._last_query, self._last_matches = query, matches
+
+        ranked = heapq.nsmallest(limit or self.limit, matches, key=lambda i: self._rank(i, query))
+        return [self._titles[i] for i in ranked]
+
+    def _rank(self, index: int, query: str) -> tuple[int, int, int]:
+        """Return the sort key of the title with the given index for the given query."""
+        title = self._normalised[index]
+        position = title.find(query)
+        if position == 0:
+            kind = 0
+        elif f' {query}' in title:
+            kind = 1
+        else:
+            kind = 2
+        return kind, position, len(title)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['heapq', 'unicodedata'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
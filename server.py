@@ -0,0 +1,231 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This is a headless HTTP server for the Netflix Movie Recommendation System. It loads the graph
+once and serves recommendations and title searches as JSON to many concurrent clients.
+
+Endpoints:
+    - GET /recommend?title=<title>&title=<title>&limit=<n>, or POST /recommend with the JSON body
+        {"titles": [...], "limit": n}: the recommendations for the given movies.
+    - GET /search?q=<text>&limit=<n>: the titles matching the given text.
+    - GET /stats: the number of requests and latency percentiles of each endpoint, and the cache statistics,
+        with the instrumentation summary if instrumentation is enabled.
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import clustering
+import graph_cache
+import instrumentation
+from metrics import percentile
+from recommender import RecommendationCache
+from search import TitleIndex
+
+
+class LatencyRecorder:
+    """Records the latency of the most recent requests to each endpoint.
+
+    Instance Attributes:
+        - window: The number of most recent latencies kept for each endpoint.
+
+    Private Instance Attributes:
+        - _latencies: Maps each endpoint to its most recent latencies, in milliseconds.
+        - _counts: Maps each endpoint to its total number of requests.
+        - _lock: The lock held while the latencies are read or updated.
+    """
+    window: int
+    _latencies: dict[str, deque]
+    _counts: dict[str, int]
+    _lock: threading.Lock
+
+    def __init__(self, window: int = 10000) -> None:
+        """Initialize a recorder with no requests."""
+        self.window = window
+        self._latencies = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, milliseconds: float) -> None:
+        """Record a request to endpoint that took the given number of milliseconds."""
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self.window)).append(milliseconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Return the number of requests and the p50, p90, p99 and maximum latency of each endpoint."""
+        with self._lock:
+            latencies = {endpoint: sorted(values) for endpoint, values in self._latencies.items()}
+            counts = dict(self._counts)
+
+        return {endpoint: {'requests': counts[endpoint],
+                           'p50_ms': percentile(values, 50),
+                           'p90_ms': percentile(values, 90),
+                           'p99_ms': percentile(values, 99),
+                           'max_ms': values[-1]}
+                for endpoint, values in latencies.items()}
+
+
+class RecommendationService:
+    """The state shared by every request: the recommendation cache, title index and latency recorder
+    of one loaded graph.
+
+    Instance Attributes:
+        - recommender: The recommendation cache of the graph.
+        - title_index: The search index of the titles in the graph.
+        - latencies: The latency recorder of the requests.
+        - max_limit: The maximum number of results returned by a request.
+    """
+    recommender: RecommendationCache
+    title_index: TitleIndex
+    latencies: LatencyRecorder
+    max_limit: int
+
+    def __init__(self, recommender: RecommendationCache, title_index: TitleIndex, max_limit: int = 100) -> None:
+        """Initialize a service using the given recommendation cache and title index."""
+        self.recommender = recommender
+        self.title_index = title_index
+        self.latencies = LatencyRecorder()
+        self.max_limit = max_limit
+
+    def recommend(self, titles: list[str], limit: int) -> dict:
+        """Return the response to a recommendation request."""
+        try:
+            return {'titles': titles, 'recommendations': self.recommender.get_best_movies(titles, limit)}
+        except ValueError:
+            return {'error': 'unknown title', 'titles': titles}
+
+    def search(self, query: str, limit: int) -> dict:
+        """Return the response to a search request."""
+        return {'query': query, 'results': self.title_index.search(query, limit, incremental=False)}
+
+    def stats(self) -> dict:
+        """Return the response to a statistics request."""
+        response = {'endpoints': self.latencies.summary(), 'cache': self.recommender.get_statistics()}
+        if instrumentation.ENABLED:
+            response['instrumentation'] = instrumentation.summary()
+        return response
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Handles one HTTP request to the recommendation server, using the RecommendationService stored
+    in the service attribute of the server."""
+
+    def do_GET(self) -> None:
+        """Answer a GET request."""
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/recommend':
+            self.respond(url.path, lambda service: service.recommend(query.get('title', []), self.limit(query)))
+        elif url.path == '/search':
+            self.respond(url.path, lambda service: service.search(query.get('q', [''])[0], self.limit(query)))
+        elif url.path == '/stats':
+            self.respond(url.path, lambda service: service.stats())
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self) -> None:
+        """Answer a POST request."""
+        if urlparse(self.path).path != '/recommend':
+            self.send_json(404, {'error': 'not found'})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            titles, limit = body.get('titles', []), int(body.get('limit', 5))
+        except (ValueError, TypeError, AttributeError):
+            self.send_json(400, {'error': 'invalid JSON body'})
+            return
+
+        if not isinstance(titles, list) or not all(isinstance(title, str) for title in titles):
+            self.send_json(400, {'error': 'titles must be a list of strings'})
+            return
+        if limit <= 0:
+            self.send_json(400, {'error': 'limit must be positive'})
+            return
+
+        self.respond('/recommend', lambda service: service.recommend(titles, min(limit, service.max_limit)))
+
+    def limit(self, query: dict[str, list[str]]) -> int:
+        """Return the limit parameter of the given query string, between 0 and the service's maximum."""
+        try:
+            limit = int(query.get('limit', ['5'])[0])
+        except ValueError:
+            limit = 5
+        return min(max(limit, 0), self.server.service.max_limit)
+
+    def respond(self, endpoint: str, handler: Callable[[RecommendationService], dict]) -> None:
+        """Send the JSON response returned by handler(service) and record its latency under endpoint."""
+        service = self.server.service
+        start = time.perf_counter()
+        response = handler(service)
+        milliseconds = (time.perf_counter() - start) * 1000
+        service.latencies.record(endpoint, milliseconds)
+        response['latency_ms'] = milliseconds
+        self.send_json(400 if 'error' in response else 200, response)
+
+    def send_json(self, status: int, response: dict) -> None:
+        """Send the given response as JSON with the given status code."""
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        """Do not log every request, since latencies are reported by /stats."""
+
+
+def create_server(service: RecommendationService, host: str = '127.0.0.1', port: int = 8000) -> ThreadingHTTPServer:
+    """Return a server answering requests with the given service on a new thread per request."""
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        # the names (strs) of imported modules
+        'extra-imports': ['argparse', 'json', 'threading', 'time', 'collections', 'typing', 'http.server',
+                          'urllib.parse', 'clustering', 'graph_cache', 'instrumentation', 'metrics', 'recommender',
+                          'search'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
+
+    parser = argparse.ArgumentParser(description='Serve movie recommendations over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--reviews', default='data/shuffled_user_ratings.csv')
+    parser.add_argument('--movies', default='data/movies.csv')
+    parser.add_argument('--cache', default='data/cache/graph')
+    parser.add_argument('--movie-limit', type=int, default=1000)
+    parser.add_argument('--rating-limit', type=int, default=1000000)
+    parser.add_argument('--method', choices=list(clustering.CLUSTERING_METHODS), default='louvain')
+    parser.add_argument('--options', type=json.loads, help='the clustering options, as a JSON object')
+    parser.add_argument('--recommender', choices=['index', 'pagerank'], default='index')
+    parser.add_argument('--instrument', type=float, metavar='SECONDS',
+                        help='enable instrumentation and log it every SECONDS seconds')
+    args = parser.parse_args()
+
+    if args.instrument:
+        instrumentation.enable()
+        instrumentation.PeriodicLogger(args.instrument)
+
+    if args.options is None:
+        args.options = {'epochs': 3} if args.method == 'louvain' else {}
+    parameters = {'movie_limit': args.movie_limit, 'rating_limit': args.rating_limit, 'method': args.method,
+                  'options': args.options}
+    graph = graph_cache.load_or_build_graph(args.cache, args.reviews, args.movies, parameters, print)
+    recommendation_service = RecommendationService(RecommendationCache(graph, method=args.recommender),
+                                                   TitleIndex(list(graph.get_movies())))
+
+    http_server = create_server(recommendation_service, args.host, args.port)
+    print(f"Serving recommendations on http://{args.host}:{args.port}")
+    http_server.serve_forever()
@@ -0,0 +1,72 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains the shared memory arrays used by the worker processes of the Netflix Movie
+Recommendation System. The parent process copies NumPy arrays into shared memory blocks once, and each
+worker attaches to them when it starts, instead of unpickling its own copy. They are used by the parallel
+Louvain's algorithm, the batch recommendation job and the evaluation harness.
+"""
+from multiprocessing import shared_memory
+import numpy as np
+
+# The arrays shared with the current worker process, set by attach_shared_arrays
+SHARED_ARRAYS = {}
+SHARED_BLOCKS = []
+
+
+class SharedArrays:
+    """A collection of NumPy arrays copied into shared memory blocks, so that worker processes
+    can read them without each process holding its own copy.
+
+    Instance Attributes:
+        - specs: maps the name of each array to the (block name, shape, dtype) needed to attach to it.
+
+    Private Instance Attributes:
+        - _blocks: the shared memory blocks owned by this object.
+        - _arrays: maps the name of each array to the array backed by its shared memory block.
+    """
+    specs: dict[str, tuple[str, tuple, str]]
+    _blocks: list[shared_memory.SharedMemory]
+    _arrays: dict[str, np.ndarray]
+
+    def __init__(self, arrays: dict[str, np.ndarray]) -> None:
+        """Copy each of the given arrays into a new shared memory block."""
+        self.specs, self._blocks, self._arrays = {}, [], {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[...] = array
+            self._blocks.append(block)
+            self._arrays[name] = shared
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Return the shared array with the given name."""
+        return self._arrays[name]
+
+    def close(self) -> None:
+        """Release and delete every shared memory block owned by this object."""
+        self._arrays = {}
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def attach_shared_arrays(specs: dict[str, tuple[str, tuple, str]]) -> None:
+    """Attach the current process to the shared arrays described by specs and store them in SHARED_ARRAYS.
+
+    This is used as the initializer of worker processes.
+    """
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        SHARED_BLOCKS.append(block)
+        SHARED_ARRAYS[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['multiprocessing', 'numpy'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
@@ -0,0 +1,99 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+This file contains the background task runner used by the frontend of the Netflix Movie
+Recommendation System, so that slow work never runs on the Tkinter main thread.
+"""
+import queue
+import sys
+import tkinter as tk
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class TaskRunner:
+    """Runs functions on a pool of worker threads and delivers their results on the Tkinter main thread.
+
+    Tkinter widgets may only be used from the main thread, so worker threads never call back into
+    Tkinter. Instead, callbacks are put on a thread-safe queue, which the main thread drains every
+    poll_interval milliseconds using root.after. An exception raised by a callback is passed to
+    root.report_callback_exception, like one raised by a Tkinter event handler, and the other callbacks
+    still run.
+
+    Instance Attributes:
+        - root: The Tkinter window whose main loop runs the callbacks.
+        - poll_interval: The number of milliseconds between two checks of the callback queue.
+
+    Private Instance Attributes:
+        - _executor: The pool of worker threads.
+        - _callbacks: The queue of (callback, arguments) pairs waiting to run on the main thread.
+    """
+    root: tk.Tk
+    poll_interval: int
+    _executor: ThreadPoolExecutor
+    _callbacks: queue.Queue
+
+    def __init__(self, root: tk.Tk, max_workers: int = 2, poll_interval: int = 50) -> None:
+        """Initialize a task runner for the given window and start checking for callbacks."""
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._callbacks = queue.Queue()
+        self.root.after(self.poll_interval, self._poll)
+
+    def post(self, callback: Callable, *args: Any) -> None:
+        """Run callback(*args) on the main thread as soon as possible. This may be called from any thread."""
+        self._callbacks.put((callback, args))
+
+    def submit(self, function: Callable, *args: Any, on_done: Callable[[Any], None] | None = None,
+               on_error: Callable[[BaseException], None] | None = None) -> Future:
+        """Run function(*args) on a worker thread. Once it finishes, call on_done with its return value,
+        or on_error with the exception it raised, on the main thread.
+
+        If on_error is None, the exception is raised again on the main thread, so it is reported by
+        root.report_callback_exception instead of being lost."""
+        future = self._executor.submit(function, *args)
+
+        def deliver(done: Future) -> None:
+            """Post the outcome of done to the main thread."""
+            if done.exception() is not None:
+                self.post(on_error if on_error is not None else reraise, done.exception())
+            elif on_done is not None:
+                self.post(on_done, done.result())
+
+        future.add_done_callback(deliver)
+        return future
+
+    def shutdown(self) -> None:
+        """Stop accepting tasks, without waiting for the running ones to finish."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self) -> None:
+        """Run every callback waiting in the queue, then check again after poll_interval milliseconds."""
+        try:
+            while True:
+                try:
+                    callback, args = self._callbacks.get_nowait()
+                except queue.Empty:
+                    break
+
+                try:
+                    callback(*args)
+                except Exception:
+                    self.root.report_callback_exception(*sys.exc_info())
+        finally:
+            self.root.after(self.poll_interval, self._poll)
+
+
+def reraise(error: BaseException) -> None:
+    """Raise the given exception of a task that has no on_error callback."""
+    raise error
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        # the names (strs) of imported modules
+        'extra-imports': ['queue', 'sys', 'tkinter', 'concurrent.futures', 'typing'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
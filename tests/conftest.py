@@ -0,0 +1,27 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Shared fixtures of the tests of the Netflix Movie Recommendation System. Every test runs on small synthetic
+datasets generated by benchmark.generate_dataset, so no data files are needed.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark  # noqa: E402
+import movie_class  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory: pytest.TempPathFactory) -> tuple[str, str]:
+    """Return the (ratings file, movies file) paths of a small synthetic dataset."""
+    directory = str(tmp_path_factory.mktemp('dataset'))
+    benchmark.generate_dataset(directory, 60, 400, 8000, seed=1)
+    return os.path.join(directory, 'ratings.csv'), os.path.join(directory, 'movies.csv')
+
+
+def edge_weights(graph: movie_class.Network) -> dict[tuple[str, str], float]:
+    """Return the weight of every edge of graph, keyed by the sorted pair of titles of its movies."""
+    return {tuple(sorted((movie.title, neighbour.title))): weight
+            for movie in graph.get_movies().values() for neighbour, weight in movie.neighbours.items()}
@@ -0,0 +1,61 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the offline batch recommendation job of the Netflix Movie Recommendation System.
+"""
+import csv
+import os
+import pytest
+import batch_recommend
+import clustering
+import load_graph
+import ratings_store
+from recommender import RECOMMENDERS
+
+
+def read_rows(file_path: str) -> dict[str, list[str]]:
+    """Return the titles of each customer in a seed or output file."""
+    with open(file_path, newline='') as rows_file:
+        return {row[0]: row[1:] for row in csv.reader(rows_file)}
+
+
+def expected_seeds(reviews: str, movies: str, max_seeds: int, min_rating: int) -> dict[str, list[str]]:
+    """Return the seeds of every customer, computed from all of their ratings at once."""
+    seeds = {}
+    user_ratings = load_graph.load_user_ratings(reviews, load_graph.read_movies(movies, 40), rating_limit=6000)
+    for customer, ratings in user_ratings.items():
+        best = sorted((rating for rating in ratings if rating[1] >= min_rating), key=lambda rating: -rating[1])
+        if best:
+            seeds[customer] = list(dict.fromkeys(title for title, _ in best[:max_seeds]))
+    return seeds
+
+
+@pytest.mark.parametrize('max_seeds, min_rating', [(5, 4), (3, 1)])
+def test_seeds_match_all_ratings(dataset: tuple[str, str], tmp_path: str, max_seeds: int, min_rating: int) -> None:
+    """The seeds streamed from the CSV file or a ratings store are those chosen from every rating at once."""
+    reviews, movies = dataset
+    expected = expected_seeds(reviews, movies, max_seeds, min_rating)
+    store = os.path.join(tmp_path, 'store')
+    ratings_store.convert_ratings(reviews, store, chunk_size=2500)
+
+    for source in (reviews, store):
+        seeds_file = os.path.join(tmp_path, 'seeds.csv')
+        assert batch_recommend.write_seed_file(source, movies, seeds_file, 40, 6000, max_seeds, min_rating) == \
+               len(expected)
+        assert read_rows(seeds_file) == expected
+
+
+@pytest.mark.parametrize('method', ['index', 'pagerank'])
+def test_batch_matches_recommender(dataset: tuple[str, str], tmp_path: str, method: str) -> None:
+    """The batch job gives every customer the recommendations of the recommender it runs in each worker."""
+    reviews, movies = dataset
+    graph = load_graph.load_movie_graph(reviews, movies, 60, None)
+    clustering.louvain(graph, 1)
+    seeds_file, output_file = os.path.join(tmp_path, 'seeds.csv'), os.path.join(tmp_path, 'output.csv')
+    batch_recommend.write_seed_file(reviews, movies, seeds_file, 60, None)
+
+    totals = batch_recommend.run_batch(graph, seeds_file, output_file, 7, method, processes=2, block_size=50)
+    seeds, results = read_rows(seeds_file), read_rows(output_file)
+    assert totals['customers'] == len(seeds) == len(results)
+    recommender = RECOMMENDERS[method](graph)
+    for customer, titles in seeds.items():
+        assert results[customer] == recommender.get_best_movies(titles, 7)
@@ -0,0 +1,36 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the synthetic datasets of the benchmark suite of the Netflix Movie Recommendation System.
+"""
+import csv
+import os
+import pytest
+import benchmark
+
+
+@pytest.mark.parametrize('num_movies, num_users, num_ratings', [(60, 400, 8000), (20, 50, 900), (10, 10, 100)])
+def test_dataset_has_the_exact_rating_count(tmp_path: str, num_movies: int, num_users: int,
+                                            num_ratings: int) -> None:
+    """generate_dataset writes exactly num_ratings ratings, with every user rating each movie at most once."""
+    benchmark.generate_dataset(str(tmp_path), num_movies, num_users, num_ratings, seed=2, users_per_chunk=30)
+    with open(os.path.join(tmp_path, 'ratings.csv')) as ratings_file:
+        rows = list(csv.reader(ratings_file))
+    assert len(rows) == num_ratings
+    assert len({(row[0], row[3]) for row in rows}) == num_ratings
+    assert len({row[0] for row in rows}) == num_users
+    assert all(1 <= int(row[3]) <= num_movies for row in rows)
+
+
+def test_impossible_rating_count(tmp_path: str) -> None:
+    """A user cannot rate a movie twice, so there can be at most num_users * num_movies ratings."""
+    with pytest.raises(ValueError):
+        benchmark.generate_dataset(str(tmp_path), 10, 10, 101)
+
+
+def test_parallel_clustering_stage(dataset: tuple[str, str]) -> None:
+    """The cluster_parallel stage runs the parallel Louvain's algorithm on more than one process, and
+    reports its speedup over a single process."""
+    results = benchmark.run_benchmarks(*dataset, stages=['cluster_parallel'], num_queries=10)
+    assert list(results) == ['cluster_parallel']
+    assert results['cluster_parallel']['processes'] >= 2
+    assert results['cluster_parallel']['speedup'] > 0
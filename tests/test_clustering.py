@@ -0,0 +1,69 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the clustering methods of the Netflix Movie Recommendation System.
+"""
+import numpy as np
+import pytest
+import clustering
+import graph_cache
+import load_graph
+import parallel_clustering
+from shared_arrays import SHARED_ARRAYS
+
+
+@pytest.mark.parametrize('method, options', [('louvain', {'epochs': 2}), ('multilevel', {}), ('leiden', {}),
+                                             ('parallel', {'processes': 2})])
+def test_cluster_methods(dataset: tuple[str, str], method: str, options: dict) -> None:
+    """Every clustering method can be selected through clustering.cluster, and puts every movie in a
+    community of at most 25 movies."""
+    graph = load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None)
+    clustering.cluster(graph, method, **options)
+
+    communities = graph.get_communities()
+    assert sum(len(members) for members, _ in communities.values()) == len(graph.get_movies())
+    assert all(len(members) <= 25 for members, _ in communities.values())
+    assert all(movie in communities[movie.community][0] for movie in graph.get_movies().values())
+
+
+def test_unknown_method() -> None:
+    """An unknown clustering method is rejected."""
+    with pytest.raises(ValueError):
+        clustering.cluster(None, 'unknown')
+
+
+def test_proposed_moves_match_a_loop_over_the_vertices(dataset: tuple[str, str]) -> None:
+    """The moves proposed for a block of vertices at once are the best move of each vertex, found by
+    summing the weight of its edges to each neighbouring community one vertex at a time."""
+    graph = load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None)
+    csr = graph_cache.network_to_arrays(graph)
+    rows = np.repeat(np.arange(len(csr['indptr']) - 1), np.diff(csr['indptr']))
+    degrees = np.bincount(rows, weights=csr['weights'])
+    labels = np.random.default_rng(0).integers(0, 20, len(degrees))
+    two_m, max_size = degrees.sum(), 4
+    SHARED_ARRAYS.update({'indptr': csr['indptr'], 'indices': csr['indices'], 'weights': csr['weights'],
+                          'degrees': degrees, 'labels': labels, 'sizes': np.bincount(labels, minlength=len(labels)),
+                          'totals': np.bincount(labels, weights=degrees, minlength=len(labels)),
+                          'settings': np.array([two_m, max_size])})
+    try:
+        vertices = np.arange(1, len(degrees), 2)
+        moved, targets, gains = parallel_clustering.propose_moves(vertices)
+    finally:
+        SHARED_ARRAYS.clear()
+
+    expected = {}
+    for i in vertices.tolist():
+        links = {}
+        for j, weight in zip(csr['indices'][rows == i].tolist(), csr['weights'][rows == i].tolist()):
+            links[labels[j]] = links.get(labels[j], 0) + weight
+        totals = np.bincount(labels, weights=degrees, minlength=len(labels))
+        totals[labels[i]] -= degrees[i]
+        gain = {community: kin - totals[community] * degrees[i] / two_m for community, kin in links.items()}
+        stay = gain.get(labels[i], -totals[labels[i]] * degrees[i] / two_m)
+        candidates = [(value, -community) for community, value in gain.items()
+                      if community != labels[i] and np.sum(labels == community) < max_size]
+        if candidates and max(candidates)[0] > stay + 1e-12:
+            expected[i] = (-max(candidates)[1], max(candidates)[0] - stay)
+
+    assert moved.tolist() == list(expected)
+    assert targets.tolist() == [community for community, _ in expected.values()]
+    assert gains.tolist() == pytest.approx([gain for _, gain in expected.values()])
@@ -0,0 +1,57 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the array-backed CompactNetwork of the Netflix Movie Recommendation System.
+"""
+import numpy as np
+import pytest
+from conftest import edge_weights
+import clustering
+import graph_cache
+import load_graph
+from compact_network import CompactNetwork
+
+
+def test_compact_network_has_the_same_edges(dataset: tuple[str, str]) -> None:
+    """A CompactNetwork keeps the weights of the Network it was made from, rounded to 32-bit floats."""
+    graph = load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None)
+    compact = CompactNetwork.from_network(graph)
+    assert edge_weights(compact) == {edge: float(np.float32(weight)) for edge, weight in edge_weights(graph).items()}
+    assert edge_weights(compact) == pytest.approx(edge_weights(graph), rel=1e-6)
+    for title, movie in graph.get_movies().items():
+        assert compact.get_neighbours(title) == {neighbour.title for neighbour in movie.neighbours}
+
+
+def test_neighbours_are_not_kept(dataset: tuple[str, str]) -> None:
+    """The neighbours dict of a MovieView is built from the arrays every time, and not kept in the view."""
+    compact = CompactNetwork.from_network(load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None))
+    view = next(iter(compact.get_movies().values()))
+    indices, weights = compact.neighbour_arrays(view.index)
+    assert view.neighbours is not view.neighbours
+    assert {neighbour.index: weight for neighbour, weight in view.neighbours.items()} == \
+           dict(zip(indices.tolist(), weights.tolist()))
+
+
+def test_louvain_runs_on_compact_network(dataset: tuple[str, str]) -> None:
+    """Louvain, which reads the neighbours of a CompactNetwork from its arrays, gives it the same
+    communities as a Network with the same weights."""
+    compact = CompactNetwork.from_network(load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None))
+    graph = graph_cache.arrays_to_network(compact.to_arrays())
+    clustering.louvain(graph, 2)
+    clustering.louvain(compact, 2)
+    assert {title: movie.community for title, movie in compact.get_movies().items()} == \
+           {title: movie.community for title, movie in graph.get_movies().items()}
+
+
+def test_to_arrays_matches_network_to_arrays(dataset: tuple[str, str]) -> None:
+    """A CompactNetwork gives back the arrays it was made from, with the weights as 32-bit floats."""
+    graph = load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None)
+    clustering.louvain(graph, 1)
+    arrays = graph_cache.network_to_arrays(graph)
+    compact = CompactNetwork(arrays)
+    compact_arrays = graph_cache.network_to_arrays(compact)
+    assert compact_arrays.keys() == arrays.keys()
+    rows = np.repeat(np.arange(len(arrays['indptr']) - 1), np.diff(arrays['indptr']))
+    for name in arrays.keys() - {'indices', 'weights'}:
+        assert np.array_equal(compact_arrays[name], arrays[name])
+    assert sorted(zip(rows.tolist(), arrays['indices'].tolist(), arrays['weights'].astype(np.float32).tolist())) == \
+           list(zip(rows.tolist(), compact_arrays['indices'].tolist(), compact_arrays['weights'].tolist()))
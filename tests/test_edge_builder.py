@@ -0,0 +1,25 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the edge accumulator of the Netflix Movie Recommendation System.
+"""
+import numpy as np
+import pytest
+from edge_builder import EdgeAccumulator
+
+
+@pytest.mark.parametrize('strategy', ['uniform', 'stratified'])
+@pytest.mark.parametrize('pair_budget', [1, 7, 24, 500])
+def test_sampled_pairs_stay_within_budget(strategy: str, pair_budget: int) -> None:
+    """The sample of the pairs of a heavy rater has exactly pair_budget pairs, even when there are more
+    strata of ratings than pairs in the budget."""
+    generator = np.random.default_rng(3)
+    movies = generator.permutation(300)[:120]
+    ratings = generator.integers(1, 6, size=120)
+    accumulator = EdgeAccumulator(300, lambda ratings1, ratings2: np.ones(len(ratings1)),
+                                  pair_budget=pair_budget, strategy=strategy)
+
+    accumulator.add_user(movies, ratings)
+    assert accumulator.num_pairs == pair_budget
+    accumulator.add_pair_product(movies[:40], ratings[:40], movies[40:], ratings[40:])
+    assert accumulator.num_pairs == 2 * pair_budget
+    assert accumulator.num_skipped_pairs == 120 * 119 // 2 + 40 * 80 - 2 * pair_budget
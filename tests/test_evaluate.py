@@ -0,0 +1,28 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the offline evaluation harness of the Netflix Movie Recommendation System.
+"""
+import json
+import os
+import evaluate
+from metrics import percentile
+
+
+def test_percentile() -> None:
+    """percentile uses the nearest-rank method."""
+    values = [float(value) for value in range(1, 101)]
+    assert [percentile(values, p) for p in (0, 50, 90, 99, 100)] == [1.0, 50.0, 90.0, 99.0, 100.0]
+    assert percentile([3.0], 99) == 3.0
+
+
+def test_clustering_options_are_passed_on(dataset: tuple[str, str], tmp_path: str) -> None:
+    """The clustering method and its --options are used for the evaluation and saved with the results."""
+    results_file = os.path.join(tmp_path, 'results.json')
+    arguments = ['--reviews', dataset[0], '--movies', dataset[1], '--movie-limit', '60', '--rating-limit', '8000',
+                 '--max-users', '50', '--processes', '1', '--directory', str(tmp_path), '--method', 'leiden',
+                 '--options', '{"max_size": 5}', '--save', results_file]
+    assert evaluate.main(arguments) == 0
+    with open(results_file) as saved:
+        saved_results = json.load(saved)
+    assert saved_results['arguments']['options'] == {'max_size': 5}
+    assert saved_results['results']['users'] > 0
@@ -0,0 +1,64 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the graph snapshots of the Netflix Movie Recommendation System.
+"""
+import os
+import pytest
+from conftest import edge_weights
+import graph_cache
+import movie_class
+from compact_network import CompactNetwork
+
+PARAMETERS = {'movie_limit': 60, 'rating_limit': None, 'method': 'louvain', 'options': {'epochs': 2}}
+
+
+def test_snapshot_is_loaded_without_copying(dataset: tuple[str, str], tmp_path: str) -> None:
+    """A saved graph is loaded back as a CompactNetwork over the read-only mapped arrays of the snapshot,
+    with the same edges and communities as the graph that was built."""
+    directory = os.path.join(tmp_path, 'graph')
+    built = graph_cache.load_or_build_graph(directory, *dataset, PARAMETERS, compact=False)
+    loaded = graph_cache.load_or_build_graph(directory, *dataset, PARAMETERS)
+
+    assert isinstance(built, movie_class.Network)
+    assert isinstance(loaded, CompactNetwork)
+    assert not loaded.neighbour_arrays(0)[0].flags.writeable
+    assert edge_weights(loaded) == pytest.approx(edge_weights(built), rel=1e-6)
+    assert {title: movie.community for title, movie in loaded.get_movies().items()} == \
+           {title: movie.community for title, movie in built.get_movies().items()}
+
+
+def test_network_snapshot_round_trip(dataset: tuple[str, str], tmp_path: str) -> None:
+    """A snapshot can also be loaded back as a full Network."""
+    directory = os.path.join(tmp_path, 'graph')
+    built = graph_cache.load_or_build_graph(directory, *dataset, PARAMETERS, compact=False)
+    loaded = graph_cache.load_graph(directory, list(dataset), PARAMETERS)
+    assert edge_weights(loaded) == pytest.approx(edge_weights(built), rel=1e-6)
+
+
+def test_rating_updates_are_saved(dataset: tuple[str, str], tmp_path: str) -> None:
+    """The graph with the rating updates applied is saved, and is loaded back as it is until the updates
+    file changes."""
+    reviews, movies = dataset
+    with open(reviews) as reviews_file:
+        lines = reviews_file.readlines()
+    trimmed, updates = os.path.join(tmp_path, 'reviews.csv'), os.path.join(tmp_path, 'updates.csv')
+    with open(trimmed, 'w') as trimmed_file:
+        trimmed_file.writelines(lines[:5000])
+    with open(updates, 'w') as updates_file:
+        updates_file.writelines(lines[5000:7000])
+    directories = os.path.join(tmp_path, 'graph'), os.path.join(tmp_path, 'updated')
+    manifest = os.path.join(tmp_path, 'updated', 'manifest.json')
+
+    updated = graph_cache.load_or_update_graph(*directories, trimmed, movies, updates, PARAMETERS)
+    saved_at = os.stat(manifest).st_mtime_ns
+    loaded = graph_cache.load_or_update_graph(*directories, trimmed, movies, updates, PARAMETERS)
+    assert isinstance(loaded, CompactNetwork)
+    assert os.stat(manifest).st_mtime_ns == saved_at
+    assert edge_weights(loaded) == edge_weights(updated)
+    assert edge_weights(loaded) != edge_weights(graph_cache.load_or_build_graph(directories[0], trimmed, movies,
+                                                                                PARAMETERS))
+
+    with open(updates, 'w') as updates_file:
+        updates_file.writelines(lines[5000:])
+    changed = graph_cache.load_or_update_graph(*directories, trimmed, movies, updates, PARAMETERS)
+    assert edge_weights(changed) != edge_weights(updated)
@@ -0,0 +1,55 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the graph loaders of the Netflix Movie Recommendation System.
+"""
+import os
+import pytest
+from conftest import edge_weights
+import clustering
+import load_graph
+
+
+def test_vectorized_matches_slow_loader(dataset: tuple[str, str]) -> None:
+    """The streamed, vectorized loader builds the same edges as modify_weighted_edge."""
+    slow = load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None, vectorized=False)
+    for chunk_size in (1000000, 997):
+        fast = load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None, chunk_size=chunk_size)
+        assert edge_weights(fast) == pytest.approx(edge_weights(slow))
+
+
+def test_rating_limit_matches_slow_loader(dataset: tuple[str, str]) -> None:
+    """Both loaders stop after the same ratings when a rating limit is given."""
+    slow = load_graph.load_movie_graph(*dataset, movie_limit=40, rating_limit=3000, vectorized=False)
+    fast = load_graph.load_movie_graph(*dataset, movie_limit=40, rating_limit=3000, chunk_size=512)
+    assert edge_weights(fast) == pytest.approx(edge_weights(slow))
+
+
+def test_rating_updates_match_full_build(dataset: tuple[str, str], tmp_path: str) -> None:
+    """Applying the last ratings of the file as updates gives the same edges as building from every rating."""
+    reviews, movies = dataset
+    with open(reviews) as reviews_file:
+        lines = reviews_file.readlines()
+    updates = os.path.join(tmp_path, 'updates.csv')
+    with open(updates, 'w') as updates_file:
+        updates_file.writelines(lines[5000:])
+
+    full = load_graph.load_movie_graph(reviews, movies, movie_limit=60, rating_limit=None)
+    graph = load_graph.load_movie_graph(reviews, movies, movie_limit=60, rating_limit=5000)
+    clustering.louvain(graph, 1)
+    movies_dict = load_graph.read_movies(movies, 60)
+    user_ratings = load_graph.load_user_ratings(reviews, movies_dict, rating_limit=5000)
+    load_graph.apply_rating_updates(graph, updates, movies_dict, user_ratings)
+
+    assert edge_weights(graph) == pytest.approx(edge_weights(full))
+
+
+@pytest.mark.parametrize('sparsification', [{'min_weight': 40.0}, {'min_weight': 45.4}, {'min_weight': 52.2},
+                                            {'top_k': 3}, {'min_weight': 41.6, 'top_k': 10}])
+def test_chunked_pruning_matches_whole_file(dataset: tuple[str, str], sparsification: dict[str, float]) -> None:
+    """Sparsification keeps exactly the same edges whatever the chunk size. The thresholds are sums of
+    fifths, which the accumulated weights often reach exactly."""
+    whole = load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None, sparsification=sparsification)
+    for chunk_size in (3000, 997, 131):
+        chunked = load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None, chunk_size=chunk_size,
+                                              sparsification=sparsification)
+        assert edge_weights(chunked) == edge_weights(whole)
@@ -0,0 +1,40 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the approximate graph builder of the Netflix Movie Recommendation System.
+"""
+import numpy as np
+import pytest
+from conftest import edge_weights
+import load_graph
+import minhash
+import movie_class
+
+
+@pytest.mark.parametrize('max_ratings', [None, 2000])
+def test_approximate_weights_are_exact(dataset: tuple[str, str], max_ratings: int | None) -> None:
+    """Every approximate edge has its exact weight, however many passes the candidate weights take."""
+    exact = edge_weights(load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None))
+    approximate = edge_weights(load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None,
+                                                           chunk_size=1000,
+                                                           approximate={'bands': 32, 'max_ratings': max_ratings}))
+    assert len(approximate) > 0.9 * len(exact)
+    assert approximate == pytest.approx({pair: exact[pair] for pair in approximate})
+
+
+def test_duplicate_ratings_are_all_weighted() -> None:
+    """A user who rated a movie twice contributes a weight for each of the ratings, as in the exact graph."""
+    users = np.array([1, 1, 1, 2, 2, 3, 3, 3], dtype=np.int64)
+    movies = np.array([0, 1, 0, 0, 1, 1, 2, 1], dtype=np.int32)
+    ratings = np.array([5, 4, 2, 3, 3, 1, 5, 4], dtype=np.int8)
+    keys = np.array([0 * 3 + 1, 1 * 3 + 2], dtype=np.int64)
+    weights = minhash.candidate_weights(keys, 3, lambda: iter([(users[:4], movies[:4], ratings[:4]),
+                                                               (users[4:], movies[4:], ratings[4:])]),
+                                        load_graph.determine_edge_weight, np.bincount(movies, minlength=3))
+
+    graph = movie_class.Network()
+    for title in '012':
+        graph.add_movie(title)
+    for user in (1, 2, 3):
+        load_graph.modify_weighted_edge(graph, [(str(movie), rating) for movie, rating
+                                                in zip(movies[users == user], ratings[users == user])])
+    assert weights.tolist() == pytest.approx([graph.get_weight('0', '1'), graph.get_weight('1', '2')])
@@ -0,0 +1,41 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the binary ratings store of the Netflix Movie Recommendation System.
+"""
+import os
+import pytest
+from conftest import edge_weights
+import load_graph
+import ratings_store
+
+
+@pytest.fixture(scope='module')
+def store(dataset: tuple[str, str], tmp_path_factory: pytest.TempPathFactory) -> str:
+    """Return the directory of the ratings store converted from the dataset."""
+    directory = os.path.join(str(tmp_path_factory.mktemp('store')), 'ratings')
+    ratings_store.convert_ratings(dataset[0], directory, chunk_size=1500)
+    return directory
+
+
+def test_store_is_recognised(store: str, dataset: tuple[str, str]) -> None:
+    """is_store tells a ratings store from a CSV file."""
+    assert ratings_store.is_store(store)
+    assert not ratings_store.is_store(dataset[0])
+
+
+@pytest.mark.parametrize('movie_limit, rating_limit', [(60, None), (40, 3000), (60, 1)])
+def test_store_matches_csv(store: str, dataset: tuple[str, str], movie_limit: int, rating_limit: int | None) -> None:
+    """A graph built from the store has the same edges as one built from the CSV file it was converted from."""
+    reviews, movies = dataset
+    from_csv = load_graph.load_movie_graph(reviews, movies, movie_limit, rating_limit)
+    from_store = load_graph.load_movie_graph(store, movies, movie_limit, rating_limit)
+    assert edge_weights(from_store) == pytest.approx(edge_weights(from_csv))
+
+
+def test_store_matches_csv_when_sparsified(store: str, dataset: tuple[str, str]) -> None:
+    """Sparsification keeps the same edges whether the ratings come from the store or the CSV file."""
+    reviews, movies = dataset
+    options = {'min_support': 3, 'top_k': 10}
+    from_csv = load_graph.load_movie_graph(reviews, movies, 60, None, sparsification=options)
+    from_store = load_graph.load_movie_graph(store, movies, 60, None, sparsification=options)
+    assert edge_weights(from_store) == pytest.approx(edge_weights(from_csv))
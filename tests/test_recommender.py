@@ -0,0 +1,79 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the recommenders of the Netflix Movie Recommendation System.
+"""
+import random
+import pytest
+import load_graph
+import movie_class
+from compact_network import CompactNetwork
+from recommender import RECOMMENDERS, RecommendationCache, RecommendationIndex
+
+
+@pytest.fixture
+def graph(dataset: tuple[str, str]) -> movie_class.Network:
+    """Return a new graph of the dataset, since the tests change its communities."""
+    return load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None)
+
+
+@pytest.mark.parametrize('groups', [1, 3, 12])
+def test_index_matches_best_first_search(graph: movie_class.Network, groups: int) -> None:
+    """RecommendationIndex gives the same recommendations as the best-first search of CompactNetwork for
+    random seed sets, with the movies split into the given number of communities, and those of
+    Network.get_best_movies are a prefix of them, since it also counts titles it has already returned.
+    Each graph is compared with an index of the same graph, since CompactNetwork rounds the weights."""
+    titles = sorted(graph.get_movies())
+    graph.set_communities({title: str(i % groups) for i, title in enumerate(titles)})
+    compact = CompactNetwork.from_network(graph)
+    index, compact_index = RecommendationIndex(graph), RecommendationIndex(compact)
+    picker = random.Random(groups)
+    for _ in range(500):
+        seeds = picker.sample(titles, picker.randint(1, 5))
+        limit = picker.randint(1, 30)
+        expected = index.get_best_movies(seeds, limit)
+        assert len(set(expected)) == len(expected)
+        assert not set(expected) & set(seeds)
+        assert compact.get_best_movies(seeds, limit) == compact_index.get_best_movies(seeds, limit)
+        network = graph.get_best_movies(seeds, limit)
+        assert network == expected[:len(network)]
+
+
+def test_best_movies_reach_the_limit(graph: movie_class.Network) -> None:
+    """In RecommendationIndex and CompactNetwork, a title pushed by several seeds does not count towards
+    the limit more than once."""
+    titles = sorted(graph.get_movies())
+    graph.set_communities({title: '0' for title in titles})
+    assert len(RecommendationIndex(graph).get_best_movies(titles[:5], 20)) == 20
+    assert len(CompactNetwork.from_network(graph).get_best_movies(titles[:5], 20)) == 20
+    assert len(graph.get_best_movies(titles[:5], 20)) < 20
+
+
+def test_cache_computes_outside_the_lock(graph: movie_class.Network) -> None:
+    """RecommendationCache does not hold its lock while the recommender is rebuilt or queried."""
+    titles = sorted(graph.get_movies())
+    graph.set_communities({title: '0' for title in titles})
+    cache = RecommendationCache(graph)
+    locked = []
+
+    class CheckedIndex(RecommendationIndex):
+        """A RecommendationIndex that records whether the cache lock is held while it is used."""
+
+        def __init__(self, network: movie_class.Network) -> None:
+            locked.append(cache._lock.locked())
+            super().__init__(network)
+
+        def get_best_movies(self, movies_titles: list[str], limit: int) -> list[str]:
+            locked.append(cache._lock.locked())
+            return super().get_best_movies(movies_titles, limit)
+
+    RECOMMENDERS['checked'] = CheckedIndex
+    try:
+        cache.method = 'checked'
+        graph.set_communities({title: '1' for title in titles})
+        expected = RecommendationIndex(graph).get_best_movies(titles[:2], 5)
+        assert cache.get_best_movies(titles[:2], 5) == expected
+        assert cache.get_best_movies(titles[1::-1], 5) == expected
+    finally:
+        del RECOMMENDERS['checked']
+    assert locked == [False, False]
+    assert (cache.hits, cache.misses, cache.invalidations) == (1, 1, 1)
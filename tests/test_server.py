@@ -0,0 +1,65 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the HTTP server of the Netflix Movie Recommendation System.
+"""
+import json
+import threading
+from http.client import HTTPConnection
+from typing import Iterator
+import pytest
+import load_graph
+from recommender import RecommendationCache
+from search import TitleIndex
+from server import RecommendationService, create_server
+
+
+@pytest.fixture(scope='module')
+def address(dataset: tuple[str, str]) -> Iterator[tuple[str, int]]:
+    """Serve recommendations for the dataset on a free port, and return its (host, port)."""
+    graph = load_graph.load_movie_graph(*dataset, movie_limit=60, rating_limit=None)
+    graph.set_communities({title: '0' for title in graph.get_movies()})
+    service = RecommendationService(RecommendationCache(graph), TitleIndex(list(graph.get_movies())))
+    server = create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[:2]
+    server.shutdown()
+    server.server_close()
+
+
+def post(address: tuple[str, int], body: object) -> tuple[int, dict]:
+    """Return the status and JSON response of a POST /recommend request with the given JSON body."""
+    connection = HTTPConnection(*address, timeout=10)
+    connection.request('POST', '/recommend', json.dumps(body), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read())
+    connection.close()
+    return result
+
+
+def test_post_recommend(address: tuple[str, int], dataset: tuple[str, str]) -> None:
+    """A valid POST request is answered with the recommendations."""
+    title = next(iter(load_graph.read_movies(dataset[1], 1).values()))
+    status, response = post(address, {'titles': [title], 'limit': 3})
+    assert status == 200
+    assert len(response['recommendations']) == 3
+
+
+@pytest.mark.parametrize('body', [{'titles': [['Dinosaur']]}, {'titles': 'Dinosaur'}, {'titles': {'a': 1}},
+                                  {'titles': [1, 2]}])
+def test_post_rejects_titles_that_are_not_strings(address: tuple[str, int], body: dict) -> None:
+    """titles must be a list of strings, not a string or a list of other values."""
+    assert post(address, body) == (400, {'error': 'titles must be a list of strings'})
+
+
+@pytest.mark.parametrize('limit', [0, -3])
+def test_post_rejects_limits_that_are_not_positive(address: tuple[str, int], limit: int) -> None:
+    """The limit of a POST request must be positive."""
+    assert post(address, {'titles': [], 'limit': limit}) == (400, {'error': 'limit must be positive'})
+
+
+def test_post_rejects_invalid_json(address: tuple[str, int]) -> None:
+    """A body that is not a JSON object is rejected, and the server keeps answering."""
+    assert post(address, ['Dinosaur']) == (400, {'error': 'invalid JSON body'})
+    assert post(address, {'titles': [], 'limit': 'many'}) == (400, {'error': 'invalid JSON body'})
+    assert post(address, {'titles': []})[0] == 200
@@ -0,0 +1,58 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the background task runner of the Netflix Movie Recommendation System. A stand-in for the Tkinter
+window records the scheduled polls and reported errors, so no display is needed.
+"""
+from types import TracebackType
+from typing import Any, Callable, Optional
+from tasks import TaskRunner
+
+
+class FakeRoot:
+    """Records the calls TaskRunner makes to its Tkinter window.
+
+    Instance Attributes:
+        - scheduled: The callbacks passed to after, in order.
+        - reported: The exceptions passed to report_callback_exception, in order.
+    """
+    scheduled: list[Callable[[], Any]]
+    reported: list[BaseException]
+
+    def __init__(self) -> None:
+        """Initialize a window with no scheduled callbacks or reported exceptions."""
+        self.scheduled = []
+        self.reported = []
+
+    def after(self, _: int, callback: Callable[[], Any]) -> None:
+        """Record a callback scheduled after some milliseconds."""
+        self.scheduled.append(callback)
+
+    def report_callback_exception(self, _: type[BaseException], error: BaseException,
+                                  __: Optional[TracebackType]) -> None:
+        """Record an exception raised by a callback."""
+        self.reported.append(error)
+
+
+def test_failing_callback_does_not_stop_polling() -> None:
+    """A callback that raises is reported, the other callbacks still run, and polling continues."""
+    root = FakeRoot()
+    runner = TaskRunner(root)
+    results = []
+    runner.post(lambda: 1 / 0)
+    runner.post(results.append, 'ran')
+    root.scheduled.pop()()
+    runner.shutdown()
+    assert results == ['ran']
+    assert [type(error) for error in root.reported] == [ZeroDivisionError]
+    assert len(root.scheduled) == 1
+
+
+def test_task_error_without_on_error_is_reported() -> None:
+    """The exception of a task without on_error is reported on the main thread."""
+    root = FakeRoot()
+    runner = TaskRunner(root)
+    runner.submit(int, 'not a number')
+    # Waiting for the worker threads to exit also waits for the done callbacks they run
+    runner._executor.shutdown(wait=True)
+    root.scheduled.pop()()
+    assert [type(error) for error in root.reported] == [ValueError]
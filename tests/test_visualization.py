@@ -0,0 +1,21 @@
+"""CSC111 Project 2: Netflix Movie Recommendation System
+
+Tests of the community layouts of the Netflix Movie Recommendation System.
+"""
+import os
+import visualization
+from visualization import LayoutCache
+
+
+def test_layout_cache_is_shared() -> None:
+    """Every drawing with the same layout algorithm uses the same LayoutCache."""
+    assert visualization.get_layout_cache('circular_layout') is visualization.get_layout_cache('circular_layout')
+    assert visualization.get_layout_cache('circular_layout') is not visualization.get_layout_cache()
+
+
+def test_layouts_are_saved_and_reused(tmp_path: str) -> None:
+    """A layout is saved without leaving temporary files behind, and read back by a new cache."""
+    titles, edges = ['A', 'B', 'C'], [('A', 'B', 1.0), ('B', 'C', 2.0)]
+    positions = LayoutCache(str(tmp_path)).get_positions(titles, edges)
+    assert [name for name in os.listdir(tmp_path) if not name.endswith('.json')] == []
+    assert LayoutCache(str(tmp_path)).get_positions(titles, edges) == positions
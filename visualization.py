@@ -3,10 +3,21 @@
 This is the graph implementation file of the Netflix Movie Recommendation System.
 """
 import colorsys
+import hashlib
+import json
+import math
+import os
+import tempfile
 import networkx as nx
-from plotly.graph_objs import Scatter, Figure
+import numpy as np
+from plotly.graph_objs import Scattergl, Figure
 import movie_class
 
+LAYOUT_DIRECTORY = 'data/cache/layouts'
+
+# The shared LayoutCache of each layout algorithm, created by get_layout_cache on first use
+LAYOUT_CACHES = {}
+
 
 def generate_color_scheme(graph: movie_class.Network) -> dict[str, str]:
     """
@@ -26,84 +37,206 @@ def generate_color_scheme(graph: movie_class.Network) -> dict[str, str]:
     return colors
 
 
-def generate_graph_nx(graph: movie_class.Network, movie_names: list[str]) -> nx.classes.Graph():
+def community_subgraph(graph: movie_class.Network, community: str) -> tuple[list[str], list[tuple[str, str, float]]]:
+    """Return the titles of the movies in the given community, and the (title1, title2, weight) edges between them.
+
+    Only the members of the community are visited, using the community index of the graph.
+    """
+    members = graph.get_communities()[community][0]
+    titles = sorted(movie.title for movie in members)
+    edges = [(movie.title, neighbour.title, weight) for movie in members
+             for neighbour, weight in movie.neighbours.items()
+             if neighbour.community == community and movie.title < neighbour.title]
+    edges.sort()
+    return titles, edges
+
+
+def selected_communities(graph: movie_class.Network, movie_names: list[str]) -> list[str]:
+    """Return the communities of the given movies, without duplicates and in order of first appearance."""
+    movies = graph.get_movies()
+    return list(dict.fromkeys(movies[movie].community for movie in movie_names))
+
+
+def generate_graph_nx(graph: movie_class.Network, movie_names: list[str]) -> nx.Graph:
     """
-    Generate the networkx graph
+    Generate the networkx graph of the communities of the given movies
     """
     graph_nx = nx.Graph()
-    movies = graph.get_movies()
-    visited, communities = set(), set()
-    for movie in movie_names:
-        graph_nx.add_node(movie, kind=movies[movie].community)
-        communities.add(movies[movie].community)
-
-    for movie in movies:
-        if movies[movie].community in communities:
-            graph_nx.add_node(movie, kind=movies[movie].community)
-
-    for movie in movies:
-        if movies[movie].community not in communities:
-            continue
-        visited.add(movies[movie])
-        for neighbour in movies[movie].neighbours:
-            if (neighbour not in visited and movies[movie].community in communities and neighbour.
-                    community == movies[movie].community):
-                graph_nx.add_edge(neighbour.title, movies[movie].title)
+    for community in selected_communities(graph, movie_names):
+        titles, edges = community_subgraph(graph, community)
+        graph_nx.add_nodes_from(titles, kind=community)
+        graph_nx.add_weighted_edges_from(edges)
     return graph_nx
 
 
+class LayoutCache:
+    """Computes the layout of each community and keeps it on disk, so a community is only laid out again
+    once its members or edges change.
+
+    The layout of a community is saved in a JSON file named after a hash of the layout algorithm and its
+    members, together with a hash of its edges, which is checked when the file is read back.
+
+    Instance Attributes:
+        - directory: The directory the layouts are saved in, or None to only keep them in memory.
+        - layout: The name of the networkx layout algorithm used.
+
+    Private Instance Attributes:
+        - _memory: Maps the file name of each layout used so far to its (edge hash, positions).
+    """
+    directory: str | None
+    layout: str
+    _memory: dict[str, tuple[str, dict[str, list[float]]]]
+
+    def __init__(self, directory: str | None = LAYOUT_DIRECTORY, layout: str = 'spring_layout') -> None:
+        """Initialize a layout cache saving to the given directory."""
+        self.directory = directory
+        self.layout = layout
+        self._memory = {}
+
+    def get_positions(self, titles: list[str], edges: list[tuple[str, str, float]]) -> dict[str, list[float]]:
+        """Return the [x, y] position of each of the given titles, in a layout of the graph with the given edges.
+
+        titles and edges must be sorted, as returned by community_subgraph.
+        """
+        name = hashlib.sha1(json.dumps([self.layout, titles]).encode('utf-8')).hexdigest() + '.json'
+        edge_hash = hashlib.sha1(json.dumps(edges).encode('utf-8')).hexdigest()
+
+        if name not in self._memory and self.directory is not None:
+            try:
+                with open(os.path.join(self.directory, name), 'r') as layout_file:
+                    saved = json.load(layout_file)
+                self._memory[name] = (saved['edges'], saved['positions'])
+            except (OSError, ValueError, KeyError):
+                pass
+
+        if name in self._memory and self._memory[name][0] == edge_hash:
+            return self._memory[name][1]
+
+        positions = compute_layout(titles, edges, self.layout)
+        self._memory[name] = (edge_hash, positions)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Each write goes to its own temporary file, so concurrent writers never mix their output
+            with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False) as layout_file:
+                json.dump({'edges': edge_hash, 'positions': positions}, layout_file)
+            os.replace(layout_file.name, os.path.join(self.directory, name))
+        return positions
+
+
+def get_layout_cache(layout: str = 'spring_layout') -> LayoutCache:
+    """Return the LayoutCache of the given layout algorithm saving to LAYOUT_DIRECTORY, which is shared by
+    every call, so the layouts used so far stay in memory between drawings."""
+    if layout not in LAYOUT_CACHES:
+        LAYOUT_CACHES[layout] = LayoutCache(layout=layout)
+    return LAYOUT_CACHES[layout]
+
+
+def compute_layout(titles: list[str], edges: list[tuple[str, str, float]],
+                   layout: str = 'spring_layout') -> dict[str, list[float]]:
+    """Return the [x, y] position of each of the given titles in the given networkx layout of the graph
+    with the given edges, scaled to fit in the square from (-1, -1) to (1, 1)."""
+    graph_nx = nx.Graph()
+    graph_nx.add_nodes_from(titles)
+    graph_nx.add_weighted_edges_from(edges)
+    if layout == 'spring_layout':
+        pos = nx.spring_layout(graph_nx, seed=0)
+    else:
+        pos = getattr(nx, layout)(graph_nx)
+    return {title: [float(pos[title][0]), float(pos[title][1])] for title in titles}
+
+
 def setup_graph(graph: movie_class.Network,
                 movie_names: list[str],
-                layout: str = 'spring_layout') -> list:
+                layout: str = 'spring_layout',
+                layout_cache: LayoutCache | None = None) -> list:
     """Use plotly and networkx to setup the visuals for the given graph.
 
-    Optional arguments:
-        - weighted: True when weight data should be visualized
+    Every community containing one of movie_names is drawn in its own cell of a grid, with the layout
+    given by layout_cache (or the shared get_layout_cache(layout) if it is None). The edges are drawn in a
+    few traces of increasing width, one for each range of edge weights.
     """
+    if layout_cache is None:
+        layout_cache = get_layout_cache(layout)
 
-    # Creating the graph
-    graph_nx = generate_graph_nx(graph, movie_names)
+    communities = selected_communities(graph, movie_names)
+    columns = max(math.ceil(math.sqrt(len(communities))), 1)
+    possible_colours = generate_color_scheme(graph)
 
-    pos = getattr(nx, layout)(graph_nx)
+    x_values, y_values, labels, colours = [], [], [], []
+    edge_points, edge_weights = [], []
+    for i, community in enumerate(communities):
+        titles, edges = community_subgraph(graph, community)
+        positions = layout_cache.get_positions(titles, edges)
+        offset_x, offset_y = 2.5 * (i % columns), -2.5 * (i // columns)
+        pos = {title: (x + offset_x, y + offset_y) for title, (x, y) in positions.items()}
 
-    x_values = [pos[k][0] for k in graph_nx.nodes]
-    y_values = [pos[k][1] for k in graph_nx.nodes]
-    labels = list(graph_nx.nodes)
+        for title in titles:
+            x_values.append(pos[title][0])
+            y_values.append(pos[title][1])
+            labels.append(title)
+            colours.append(possible_colours[community])
 
-    kinds = [graph_nx.nodes[k]['kind'] for k in graph_nx.nodes]
+        for title1, title2, weight in edges:
+            edge_points.append((pos[title1], pos[title2]))
+            edge_weights.append(weight)
 
-    # Generating the colours
-    possible_colours = generate_color_scheme(graph)
-    colours = [possible_colours[kind] for kind in kinds]
+    traces = edge_traces(edge_points, edge_weights)
+    traces.append(Scattergl(x=x_values,
+                            y=y_values,
+                            mode='markers',
+                            name='nodes',
+                            marker={"symbol": 'circle-dot', "size": 10, "color": colours,
+                                    "line": {"color": 'rgb(50,50,50)', "width": 0.5}},
+                            text=labels,
+                            hovertemplate='%{text}',
+                            hoverlabel={'namelength': 0}
+                            ))
+    return traces
+
+
+def edge_traces(edge_points: list[tuple[tuple[float, float], tuple[float, float]]], edge_weights: list[float],
+                num_widths: int = 3) -> list[Scattergl]:
+    """Return the traces drawing the given edges, with the edges split into num_widths groups of
+    increasing weight, each drawn with a wider line than the previous one."""
+    if not edge_points:
+        return []
 
-    trace4 = Scatter(x=x_values,
-                     y=y_values,
-                     mode='markers',
-                     name='nodes',
-                     marker={"symbol": 'circle-dot', "size": 10, "color": colours,
-                             "line": {"color": 'rgb(50,50,50)', "width": 0.5}},
-                     text=labels,
-                     hovertemplate='%{text}',
-                     hoverlabel={'namelength': 0}
-                     )
+    bounds = np.quantile(edge_weights, np.linspace(0, 1, num_widths + 1)[1:-1])
+    groups = np.searchsorted(bounds, edge_weights, side='right').tolist()
+    traces = []
+    for group in range(num_widths):
+        x_values, y_values = [], []
+        for (start, end), edge_group in zip(edge_points, groups):
+            if edge_group == group:
+                x_values += [start[0], end[0], None]
+                y_values += [start[1], end[1], None]
 
-    return [trace4]
+        if x_values:
+            traces.append(Scattergl(x=x_values,
+                                    y=y_values,
+                                    mode='lines',
+                                    name='edges',
+                                    line={"color": 'rgba(125,125,125,0.4)', "width": 0.5 + group},
+                                    hoverinfo='none'
+                                    ))
+    return traces
 
 
 def visualize_weighted_graph(graph: movie_class.Network,
                              movies: list[str],
                              layout: str = 'spring_layout',
-                             output_file: str = '') -> None:
+                             output_file: str = '',
+                             layout_cache: LayoutCache | None = None) -> None:
     """Use plotly and networkx to visualize the given weighted graph.
 
     Optional arguments:
         - layout: which graph layout algorithm to use
-        - max_vertices: the maximum number of vertices that can appear in the graph
         - output_file: a filename to save the plotly image to (rather than displaying
-            in your web browser)
+            in your web browser). A filename ending in .html is saved as a self-contained web page.
+        - layout_cache: the cache of community layouts to use
     """
 
-    data = setup_graph(graph, movies, layout)
+    data = setup_graph(graph, movies, layout, layout_cache)
     draw_graph(data, output_file)
 
 
@@ -113,8 +246,8 @@ def draw_graph(data: list, output_file: str = '') -> None:
 
     Optional arguments:
         - output_file: a filename to save the plotly image to (rather than displaying
-            in your web browser)
-        - weight_positions: weights to draw on edges for a weighted graph
+            in your web browser). A filename ending in .html is saved as a self-contained web page
+            that includes plotly.js, so it can be opened without an internet connection.
     """
 
     fig = Figure(data=data)
@@ -124,6 +257,8 @@ def draw_graph(data: list, output_file: str = '') -> None:
 
     if output_file == '':
         fig.show()
+    elif output_file.endswith('.html'):
+        fig.write_html(output_file, include_plotlyjs=True)
     else:
         fig.write_image(output_file)
 
@@ -131,9 +266,10 @@ def draw_graph(data: list, output_file: str = '') -> None:
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['movie_class', 'networkx', 'plotly.graph_objs',
-                          'colorsys'],  # the names (strs) of imported modules
-        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        # the names (strs) of imported modules
+        'extra-imports': ['movie_class', 'networkx', 'numpy', 'plotly.graph_objs',
+                          'colorsys', 'hashlib', 'json', 'math', 'os', 'tempfile'],
+        'allowed-io': ['LayoutCache.get_positions'],  # the names (strs) of functions that call print/open/input
         'max-line-length': 120
     })
 